@@ -39,3 +39,152 @@ def resolve_ollama_base_url() -> str:
 OLLAMA_BASE_URL = resolve_ollama_base_url()
 OLLAMA_CHAT_URL = f"{OLLAMA_BASE_URL}/api/chat"
 OLLAMA_TAGS_URL = f"{OLLAMA_BASE_URL}/api/tags"
+
+
+def _env_int(key: str, default: int) -> int:
+    """Read an integer env var, falling back to default when unset or invalid."""
+    raw_value = os.getenv(key)
+    if raw_value is None or not raw_value.strip():
+        return default
+    try:
+        return int(raw_value)
+    except ValueError:
+        return default
+
+
+def _env_bool(key: str, default: bool) -> bool:
+    """Read a boolean env var ("1", "true", "yes", "on"), falling back to default when unset."""
+    raw_value = os.getenv(key)
+    if raw_value is None or not raw_value.strip():
+        return default
+    return raw_value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Maximum Hamming distance (of 64 bits) for a perceptual-hash match to be served
+# from the image analysis cache. 0 disables near-duplicate lookup.
+IMAGE_CACHE_NEAR_DUPLICATE_DISTANCE = _env_int("IMAGE_CACHE_NEAR_DUPLICATE_DISTANCE", 6)
+
+# In-process hot tier in front of the SQLite image analysis cache
+IMAGE_CACHE_L1_MAX_ENTRIES = _env_int("IMAGE_CACHE_L1_MAX_ENTRIES", 256)
+IMAGE_CACHE_L1_MAX_BYTES = _env_int("IMAGE_CACHE_L1_MAX_BYTES", 32 * 1024 * 1024)
+
+# Size bounds for the SQLite image analysis cache. Rows beyond either limit are
+# evicted in small batches using the configured policy ("lru" or "lfu").
+IMAGE_CACHE_MAX_ENTRIES = _env_int("IMAGE_CACHE_MAX_ENTRIES", 20000)
+IMAGE_CACHE_MAX_BYTES = _env_int("IMAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+IMAGE_CACHE_EVICTION_POLICY = os.getenv("IMAGE_CACHE_EVICTION_POLICY", "lru").strip().lower()
+
+# Number of SQLite files the image analysis cache is spread over by hash prefix.
+# More shards mean less write-lock contention between uvicorn workers.
+IMAGE_CACHE_SHARDS = _env_int("IMAGE_CACHE_SHARDS", 1)
+
+# Storage behind the image analysis cache: "sqlite" (local files) or "redis"
+# (shared between backend nodes; size bounds come from the server's
+# maxmemory-policy). Falls back to sqlite if Redis is unreachable.
+IMAGE_CACHE_BACKEND = os.getenv("IMAGE_CACHE_BACKEND", "sqlite").strip().lower()
+IMAGE_CACHE_REDIS_URL = os.getenv("IMAGE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+IMAGE_CACHE_REDIS_PREFIX = os.getenv("IMAGE_CACHE_REDIS_PREFIX", "anclora:image-cache")
+
+# How long past its TTL a cached image analysis is still served (while one
+# background refresh re-runs it), and the shorter TTL given to results that
+# came from a fallback model so the primary model gets another chance sooner.
+IMAGE_CACHE_STALE_WHILE_REVALIDATE_SECONDS = _env_int("IMAGE_CACHE_STALE_WHILE_REVALIDATE_SECONDS", 7 * 86400)
+IMAGE_CACHE_FALLBACK_TTL_SECONDS = _env_int("IMAGE_CACHE_FALLBACK_TTL_SECONDS", 86400)
+
+# Optional CLIP image embeddings for /api/images/similar. Vectors are stored as a
+# float16 matrix next to the analysis cache and saved every FLUSH_EVERY new images.
+IMAGE_EMBEDDINGS_ENABLED = _env_bool("IMAGE_EMBEDDINGS_ENABLED", False)
+IMAGE_EMBEDDING_MODEL = os.getenv("IMAGE_EMBEDDING_MODEL", "openai/clip-vit-base-patch32")
+IMAGE_EMBEDDING_DEVICE = os.getenv("IMAGE_EMBEDDING_DEVICE", "cpu")
+IMAGE_EMBEDDING_FLUSH_EVERY = _env_int("IMAGE_EMBEDDING_FLUSH_EVERY", 32)
+
+# Images sent to Ollama vision models are fitted to the model's native input
+# size and re-encoded as JPEG first. VISION_IMAGE_MAX_SIDES overrides the
+# built-in per-model sizes ("llava=672,qwen3-vl=1024", matched as name
+# prefixes); other models use VISION_IMAGE_MAX_SIDE.
+VISION_IMAGE_PREPROCESS = _env_bool("VISION_IMAGE_PREPROCESS", True)
+VISION_IMAGE_MAX_SIDE = _env_int("VISION_IMAGE_MAX_SIDE", 1024)
+VISION_IMAGE_MAX_SIDES = os.getenv("VISION_IMAGE_MAX_SIDES", "")
+VISION_IMAGE_QUALITY = _env_int("VISION_IMAGE_QUALITY", 85)
+
+# Palette, lighting, composition and EXIF fields of the image context are
+# computed locally (NumPy, a few ms) while the vision model runs.
+IMAGE_PREANALYSIS_ENABLED = _env_bool("IMAGE_PREANALYSIS_ENABLED", True)
+IMAGE_PALETTE_COLORS = _env_int("IMAGE_PALETTE_COLORS", 5)
+
+# Last-resort CLIP fallback when no Ollama vision model answers: loaded on first
+# use, released after IDLE_SECONDS unused (0 keeps it resident); label-bank text
+# embeddings are persisted on disk. LABELS_DIR adds/replaces <category>.txt lists.
+CLIP_FALLBACK_MODEL = os.getenv("CLIP_FALLBACK_MODEL", "openai/clip-vit-large-patch14")
+CLIP_FALLBACK_DEVICE = os.getenv("CLIP_FALLBACK_DEVICE", "cpu")
+CLIP_FALLBACK_IDLE_SECONDS = _env_int("CLIP_FALLBACK_IDLE_SECONDS", 900)
+CLIP_FALLBACK_LABELS_DIR = os.getenv("CLIP_FALLBACK_LABELS_DIR", "")
+
+# /api/images/analyze-batch: vision-model analyses run at once per batch (the
+# request may ask for more, up to MAX_CONCURRENCY), and input limits for
+# uploaded files and zip archives (uncompressed bytes, zip bomb guard).
+IMAGE_BATCH_CONCURRENCY = _env_int("IMAGE_BATCH_CONCURRENCY", 2)
+IMAGE_BATCH_MAX_CONCURRENCY = _env_int("IMAGE_BATCH_MAX_CONCURRENCY", 8)
+IMAGE_BATCH_MAX_FILES = _env_int("IMAGE_BATCH_MAX_FILES", 500)
+IMAGE_BATCH_MAX_BYTES = _env_int("IMAGE_BATCH_MAX_BYTES", 1024 * 1024 * 1024)
+
+# Shared async HTTP client for Ollama: one keep-alive connection pool per
+# process, with per-operation timeouts in seconds (generations on CPU-only
+# hosts can take minutes; model listings should answer almost instantly).
+OLLAMA_MAX_CONNECTIONS = _env_int("OLLAMA_MAX_CONNECTIONS", 32)
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = _env_int("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", 16)
+OLLAMA_CONNECT_TIMEOUT_SECONDS = _env_int("OLLAMA_CONNECT_TIMEOUT_SECONDS", 5)
+OLLAMA_TAGS_TIMEOUT_SECONDS = _env_int("OLLAMA_TAGS_TIMEOUT_SECONDS", 5)
+OLLAMA_CHAT_TIMEOUT_SECONDS = _env_int("OLLAMA_CHAT_TIMEOUT_SECONDS", 300)
+OLLAMA_VISION_TIMEOUT_SECONDS = _env_int("OLLAMA_VISION_TIMEOUT_SECONDS", 300)
+
+# Installed (/api/tags) and loaded (/api/ps) Ollama models are polled in the
+# background and reused for this many seconds; connection errors drop them.
+OLLAMA_REGISTRY_TTL_SECONDS = _env_int("OLLAMA_REGISTRY_TTL_SECONDS", 30)
+
+# Latency-aware model routing: rolling window of calls kept per model, circuit
+# breaker thresholds (consecutive failures, or error rate once MIN_SAMPLES calls
+# were seen) and how long an open circuit skips the model, models tried per
+# request, and per-attempt timeouts of MULTIPLIER x the model's p95 latency
+# (never below MIN_TIMEOUT_SECONDS nor above the operation's timeout; the last
+# candidate always gets the full timeout).
+MODEL_ROUTER_WINDOW = _env_int("MODEL_ROUTER_WINDOW", 100)
+MODEL_ROUTER_MIN_SAMPLES = _env_int("MODEL_ROUTER_MIN_SAMPLES", 5)
+MODEL_ROUTER_FAILURE_THRESHOLD = _env_int("MODEL_ROUTER_FAILURE_THRESHOLD", 3)
+MODEL_ROUTER_ERROR_RATE_PERCENT = _env_int("MODEL_ROUTER_ERROR_RATE_PERCENT", 50)
+MODEL_ROUTER_OPEN_SECONDS = _env_int("MODEL_ROUTER_OPEN_SECONDS", 60)
+MODEL_ROUTER_MAX_ATTEMPTS = _env_int("MODEL_ROUTER_MAX_ATTEMPTS", 3)
+MODEL_ROUTER_TIMEOUT_MULTIPLIER = _env_int("MODEL_ROUTER_TIMEOUT_MULTIPLIER", 4)
+MODEL_ROUTER_MIN_TIMEOUT_SECONDS = _env_int("MODEL_ROUTER_MIN_TIMEOUT_SECONDS", 30)
+
+# Hedged requests (opt-in): when a model shows no first token after its p95 time
+# to first token (never below MIN_DELAY_SECONDS; DEFAULT_DELAY_SECONDS until
+# MODEL_ROUTER_MIN_SAMPLES were measured), the next candidate is started as well,
+# the first good answer wins and the other request is cancelled. Extra requests
+# are capped at BUDGET_PERCENT of all requests, with up to BUDGET_BURST banked.
+OLLAMA_HEDGING_ENABLED = _env_bool("OLLAMA_HEDGING_ENABLED", False)
+OLLAMA_HEDGE_MIN_DELAY_SECONDS = _env_int("OLLAMA_HEDGE_MIN_DELAY_SECONDS", 2)
+OLLAMA_HEDGE_DEFAULT_DELAY_SECONDS = _env_int("OLLAMA_HEDGE_DEFAULT_DELAY_SECONDS", 30)
+OLLAMA_HEDGE_BUDGET_PERCENT = _env_int("OLLAMA_HEDGE_BUDGET_PERCENT", 10)
+OLLAMA_HEDGE_BUDGET_BURST = _env_int("OLLAMA_HEDGE_BUDGET_BURST", 3)
+
+# Primary vision model of the image analyzer (preloaded with the top text model).
+OLLAMA_VISION_MODEL = os.getenv("OLLAMA_VISION_MODEL", "Llava:latest")
+
+# keep_alive sent with every Ollama request (how long the model stays loaded
+# afterwards: "10m", "2h", "-1" forever, "0" unload now). OLLAMA_KEEP_ALIVE is
+# the default (empty: Ollama's own, 5 minutes); OLLAMA_KEEP_ALIVE_MODELS
+# overrides it per model ("qwen3-vl=2h,mistral=30m", matched as name prefixes).
+# Preloaded models get OLLAMA_RESIDENCY_KEEP_ALIVE during residency hours.
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "")
+OLLAMA_KEEP_ALIVE_MODELS = os.getenv("OLLAMA_KEEP_ALIVE_MODELS", "")
+OLLAMA_RESIDENCY_KEEP_ALIVE = os.getenv("OLLAMA_RESIDENCY_KEEP_ALIVE", "15m")
+
+# Models loaded at startup: "auto" (OLLAMA_VISION_MODEL and the top prompt
+# optimizer model), a comma-separated list, or empty to disable. During
+# residency hours (local time, "08:00-20:00" on ISO weekdays "1-5"; empty hours
+# means always) they are re-sent every REFRESH_SECONDS (0 disables the refresh).
+OLLAMA_PRELOAD_MODELS = os.getenv("OLLAMA_PRELOAD_MODELS", "auto")
+OLLAMA_RESIDENCY_HOURS = os.getenv("OLLAMA_RESIDENCY_HOURS", "08:00-20:00")
+OLLAMA_RESIDENCY_WEEKDAYS = os.getenv("OLLAMA_RESIDENCY_WEEKDAYS", "1-5")
+OLLAMA_RESIDENCY_REFRESH_SECONDS = _env_int("OLLAMA_RESIDENCY_REFRESH_SECONDS", 240)
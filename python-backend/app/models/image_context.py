@@ -7,6 +7,16 @@ from typing import List, Dict, Optional, Literal
 from pydantic import BaseModel, Field, ConfigDict
 from datetime import datetime
 
+# Filled in by ImageAnalyzer when nothing derived the field from the image yet;
+# they describe no image, so full-text search does not index them
+PENDING_SETTING = "Scene setting to be determined from image context"
+PENDING_MOOD = "Mood/atmosphere to be analyzed"
+PENDING_STYLE = "Visual style to be identified"
+PENDING_COMPOSITION = "Composition analysis pending"
+PENDING_LIGHTING = "Lighting analysis pending"
+DEFAULT_SEMANTIC_TAGS = ("analyzed", "vision-model")
+PLACEHOLDER_TEXT = frozenset({PENDING_SETTING, PENDING_MOOD, PENDING_STYLE, PENDING_COMPOSITION, PENDING_LIGHTING})
+
 
 class ImageContext(BaseModel):
     """Complete image context with structured visual analysis"""
@@ -111,6 +121,10 @@ class AnalysisMetadata(BaseModel):
         default=False,
         description="Whether a fallback model was used instead of primary"
     )
+    time_to_first_token_seconds: Optional[float] = Field(
+        default=None,
+        description="Time until the first generated token was streamed (streaming analyses only)"
+    )
 
 
 class ImageAnalysisResponse(BaseModel):
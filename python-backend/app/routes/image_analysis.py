@@ -3,15 +3,31 @@ FastAPI routes for image analysis
 Endpoints for CLIP-based image analysis and prompt generation
 """
 
+import asyncio
 import logging
-from typing import Optional
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+import math
+import mimetypes
+import time
+import zipfile
+from pathlib import PurePosixPath
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
 from fastapi.responses import StreamingResponse
 import json
 import io
-from PIL import Image
-
+from PIL import Image, UnidentifiedImageError
+
+from app.config import (
+    IMAGE_BATCH_CONCURRENCY,
+    IMAGE_BATCH_MAX_BYTES,
+    IMAGE_BATCH_MAX_CONCURRENCY,
+    IMAGE_BATCH_MAX_FILES,
+)
+from app.services.cache_backend import SEARCH_FIELDS
 from app.services.image_analyzer import ImageAnalyzer
+from app.services.image_cache import AnalysisVariant
+from app.services.model_fallback import ImageSecurityValidator
+from app.services.ollama_client import ClientDisconnected, run_until_disconnected
 
 router = APIRouter(prefix="/api/images", tags=["images"])
 logger = logging.getLogger(__name__)
@@ -25,8 +41,17 @@ except Exception as e:
     analyzer = None
 
 
+def shutdown_analyzer():
+    """Flush buffered cache writes and release connections on app shutdown"""
+    if analyzer and analyzer.embeddings:
+        analyzer.embeddings.close()
+    if analyzer and analyzer.cache:
+        analyzer.cache.close()
+
+
 @router.post("/analyze")
 async def analyze_image(
+    request: Request,
     image: UploadFile = File(...),
     user_prompt: Optional[str] = Form(default=""),
     deep_thinking: Optional[str] = Form(default="false"),
@@ -60,13 +85,17 @@ async def analyze_image(
         # Convert deep_thinking string to boolean
         deep_thinking_bool = deep_thinking.lower() == "true" if isinstance(deep_thinking, str) else deep_thinking
 
-        # Analyze image with full pipeline (validation, cache, fallback)
-        result = analyzer.analyze_image(
-            image_bytes=contents,
-            content_type=image.content_type,
-            user_prompt=user_prompt.strip() if user_prompt else None,
-            deep_thinking=deep_thinking_bool,
-            language=language
+        # Analyze image with full pipeline (validation, cache, fallback);
+        # the model call is cancelled if the client disconnects meanwhile
+        result = await run_until_disconnected(
+            analyzer.analyze_image(
+                image_bytes=contents,
+                content_type=image.content_type,
+                user_prompt=user_prompt.strip() if user_prompt else None,
+                deep_thinking=deep_thinking_bool,
+                language=language
+            ),
+            request.is_disconnected,
         )
 
         if not result.success:
@@ -75,6 +104,8 @@ async def analyze_image(
         # Return new extended schema
         return result
 
+    except ClientDisconnected:
+        raise HTTPException(status_code=499, detail="Client closed request")
     except HTTPException:
         raise
     except Exception as e:
@@ -86,55 +117,137 @@ async def analyze_image(
 async def analyze_image_stream(
     image: UploadFile = File(...),
     user_prompt: Optional[str] = Form(default=""),
-    deep_thinking: bool = Form(default=False)
+    deep_thinking: bool = Form(default=False),
+    language: Optional[str] = Form(default="es")
 ):
     """
     Streaming version of image analysis
     Returns updates as Server-Sent Events (SSE)
 
-    Better UX: shows "Analyzing..." then results progressively
+    Events (data: JSON with a "status" field):
+    - analyzing / generating: progress messages
+    - token: next chunk of the prompt as the vision model produces it
+    - complete: the full ImageAnalysisResponse (also written to the cache);
+      metadata.time_to_first_token_seconds tells how long the first token took
+    - error: error message
+
+    Closing the connection stops the generation on Ollama.
     """
 
     if not analyzer:
         raise HTTPException(status_code=500, detail="Image analyzer not initialized")
 
+    contents = await image.read()
+
     async def generate():
-        try:
-            contents = await image.read()
+        yield f"data: {json.dumps({'status': 'analyzing', 'message': 'Analyzing image...'})}\n\n"
+        async for event in analyzer.analyze_image_stream(
+            image_bytes=contents,
+            content_type=image.content_type,
+            user_prompt=user_prompt.strip() if user_prompt else None,
+            deep_thinking=deep_thinking,
+            language=language
+        ):
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
 
-            # Validate
-            if len(contents) > 20 * 1024 * 1024:
-                yield f"data: {json.dumps({'status': 'error', 'error': 'Image too large'})}\n\n"
-                return
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        # Keep reverse proxies from buffering tokens
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-            # Send: analyzing...
-            yield f"data: {json.dumps({'status': 'analyzing', 'message': 'Analyzing image...'})}\n\n"
 
-            # Visual analysis
-            image_obj = Image.open(io.BytesIO(contents))
-            visual_analysis = analyzer._analyze_visual_elements(image_obj)
+_ARCHIVE_IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff"}
 
-            yield f"data: {json.dumps({'status': 'analyzed', 'analysis': visual_analysis})}\n\n"
 
-            # Refinement
-            yield f"data: {json.dumps({'status': 'generating', 'message': 'Generating prompt...'})}\n\n"
+def _read_zip_images(data: bytes) -> List[Tuple[str, bytes, Optional[str]]]:
+    """
+    Image entries of a zip archive as (filename, bytes, content_type)
 
-            prompt = analyzer._generate_prompt(
-                visual_analysis=visual_analysis,
-                user_input=user_prompt.strip() if user_prompt else None,
-                deep_thinking=deep_thinking
+    Non-image files and macOS resource forks are skipped. Entries over the
+    per-image size limit are returned empty so they are reported as invalid
+    without being decompressed.
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="archive is not a valid zip file")
+
+    with archive:
+        entries = [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and PurePosixPath(info.filename).suffix.lower() in _ARCHIVE_IMAGE_SUFFIXES
+            and not info.filename.startswith("__MACOSX/")
+            and not PurePosixPath(info.filename).name.startswith("._")
+        ]
+        if len(entries) > IMAGE_BATCH_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"Too many images (max {IMAGE_BATCH_MAX_FILES})")
+        if sum(info.file_size for info in entries) > IMAGE_BATCH_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Archive too large once uncompressed")
+
+        return [
+            (
+                info.filename,
+                archive.read(info) if info.file_size <= ImageSecurityValidator.MAX_FILE_SIZE else b"",
+                mimetypes.guess_type(info.filename)[0],
             )
+            for info in entries
+        ]
 
-            yield f"data: {json.dumps({'status': 'complete', 'generatedPrompt': prompt})}\n\n"
 
-        except Exception as e:
-            logger.error(f"Error in stream: {str(e)}")
-            yield f"data: {json.dumps({'status': 'error', 'error': str(e)})}\n\n"
+@router.post("/analyze-batch")
+async def analyze_image_batch(
+    images: List[UploadFile] = File(default=[]),
+    archive: Optional[UploadFile] = File(default=None),
+    user_prompt: Optional[str] = Form(default=""),
+    deep_thinking: Optional[str] = Form(default="false"),
+    language: Optional[str] = Form(default="es"),
+    concurrency: int = Form(default=IMAGE_BATCH_CONCURRENCY)
+):
+    """
+    Analyze many images in one request, streaming results as NDJSON
+
+    Parameters:
+    - images: Image files (repeat the field), and/or
+    - archive: A zip file of images
+    - user_prompt, deep_thinking, language: Analysis variant, as in /analyze
+    - concurrency: Simultaneous vision-model analyses (capped server-side)
+
+    Each line is {"type": "result", "index", "filename", "image_hash",
+    "duplicate_of", ...ImageAnalysisResponse} in completion order: cached
+    images first, duplicates within the batch reuse the first copy's result.
+    The last line is {"type": "summary", ...} with the counts.
+    """
+
+    if not analyzer:
+        raise HTTPException(status_code=500, detail="Image analyzer not initialized")
+
+    items = [(image.filename, await image.read(), image.content_type) for image in images]
+    if archive is not None:
+        items += await asyncio.to_thread(_read_zip_images, await archive.read())
+    if not items:
+        raise HTTPException(status_code=400, detail="Upload images or a zip archive")
+    if len(items) > IMAGE_BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"Too many images (max {IMAGE_BATCH_MAX_FILES})")
+
+    deep_thinking_bool = deep_thinking.lower() == "true" if isinstance(deep_thinking, str) else bool(deep_thinking)
+
+    async def generate():
+        async for line in analyzer.analyze_batch(
+            items,
+            user_prompt=user_prompt.strip() if user_prompt else None,
+            deep_thinking=deep_thinking_bool,
+            language=language,
+            concurrency=min(max(concurrency, 1), IMAGE_BATCH_MAX_CONCURRENCY)
+        ):
+            yield json.dumps(line, ensure_ascii=False) + "\n"
 
     return StreamingResponse(
         generate(),
-        media_type="text/event-stream",
-        headers={"Cache-Control": "no-cache"}
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
@@ -179,7 +292,7 @@ async def analyze_image_detailed(
             raise HTTPException(status_code=400, detail="Invalid image format")
 
         # Perform complete analysis
-        result = analyzer.analyze_image(
+        result = await analyzer.analyze_image(
             image_bytes=contents,
             user_prompt=user_prompt.strip() if user_prompt else None,
             deep_thinking=deep_thinking
@@ -265,6 +378,201 @@ async def analyze_image_detailed(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/similar")
+async def find_similar_images(
+    image: Optional[UploadFile] = File(default=None),
+    image_hash: Optional[str] = Form(default=None),
+    top_k: int = Form(default=10),
+    min_score: float = Form(default=0.0),
+    language: Optional[str] = Form(default="es"),
+    deep_thinking: Optional[str] = Form(default="false"),
+    user_prompt: Optional[str] = Form(default="")
+):
+    """
+    Finds previously analyzed images that look like the given one
+
+    Vectorized top-k cosine search over the CLIP embeddings of analyzed images,
+    joined with their cached analysis for the requested variant so existing
+    prompts can be reused without running the vision model.
+
+    Parameters:
+    - image: Query image (or pass image_hash of an already indexed image)
+    - image_hash: MD5 of an indexed image
+    - top_k: Number of results (1-100). Default: 10
+    - min_score: Minimum cosine similarity (-1 to 1). Default: 0
+    - language, deep_thinking, user_prompt: Variant of the cached analysis to attach
+
+    Returns:
+    - query_hash: Hash of the query image
+    - results: image_hash, score and, when cached, image_context and metadata
+    - indexed_images: Size of the embedding index
+    """
+
+    if not analyzer:
+        raise HTTPException(status_code=500, detail="Image analyzer not initialized")
+    if not analyzer.embeddings:
+        raise HTTPException(status_code=501, detail="Image embeddings not enabled (IMAGE_EMBEDDINGS_ENABLED)")
+    if image is None and not image_hash:
+        raise HTTPException(status_code=400, detail="Provide an image or an image_hash")
+
+    try:
+        contents = await image.read() if image is not None else None
+        if contents is not None:
+            if len(contents) > 20 * 1024 * 1024:
+                raise HTTPException(status_code=413, detail="Image too large (max 20MB)")
+
+            # Same checks as /analyze (MIME type, size, file signature)
+            is_valid, error_msg = analyzer.security_validator.validate_upload(
+                contents, image.content_type or "image/jpeg"
+            )
+            if not is_valid:
+                raise HTTPException(status_code=400, detail=error_msg)
+
+            # Validate it's a readable image
+            try:
+                Image.open(io.BytesIO(contents))
+            except Exception:
+                raise HTTPException(status_code=400, detail="Invalid image format")
+
+        # Encoding runs the CLIP model; keep it off the event loop
+        query_hash, matches = await asyncio.to_thread(
+            analyzer.embeddings.similar,
+            image_bytes=contents,
+            image_hash=image_hash.strip().lower() if image_hash else None,
+            top_k=max(1, min(top_k, 100)),
+        )
+        matches = [(match_hash, score) for match_hash, score in matches if score >= min_score]
+
+        variant = AnalysisVariant(
+            language=language or "es",
+            deep_thinking=deep_thinking.lower() == "true" if isinstance(deep_thinking, str) else bool(deep_thinking),
+            user_prompt=user_prompt.strip() if user_prompt else None,
+        )
+        cached = analyzer.cache.get_by_hashes([match_hash for match_hash, _ in matches], variant)
+
+        results = []
+        for match_hash, score in matches:
+            entry = {"image_hash": match_hash, "score": round(score, 4), "cached": match_hash in cached}
+            if match_hash in cached:
+                context, metadata = cached[match_hash]
+                entry["image_context"] = context
+                entry["metadata"] = metadata
+            results.append(entry)
+
+        return {
+            "success": True,
+            "query_hash": query_hash,
+            "results": results,
+            "indexed_images": len(analyzer.embeddings.index)
+        }
+
+    except HTTPException:
+        raise
+    except KeyError:
+        raise HTTPException(status_code=404, detail="image_hash is not in the embedding index")
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        # Passed the header checks but could not be decoded by the encoder
+        raise HTTPException(status_code=400, detail=f"Invalid image format: {e}")
+    except Exception as e:
+        logger.error(f"Error in /similar: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/search")
+async def search_analyses(
+    q: str,
+    page: int = 1,
+    page_size: int = 20,
+    fields: Optional[str] = None,
+    language: Optional[str] = None,
+    deep_thinking: bool = False,
+    user_prompt: Optional[str] = None,
+    include_analysis: bool = False
+):
+    """
+    Full-text search over previously analyzed images
+
+    Matches every word of q (as a prefix, accent-insensitive) against the
+    brief_caption, semantic_tags, mood and style of cached analyses, ranked by
+    bm25 in SQLite. Each image appears once, with its best-matching variant.
+
+    Parameters:
+    - q: Search words
+    - page, page_size: 1-based page and its size (max 100)
+    - fields: Comma-separated subset of brief_caption,semantic_tags,mood,style (others: 400)
+    - language, deep_thinking, user_prompt: Only analyses of this variant (when language is set)
+    - include_analysis: Attach the full cached image_context and metadata of each hit
+
+    Returns:
+    - total, pages: Matching images and page count
+    - results: image_hash, score and the indexed fields (plus the analysis if requested)
+    """
+
+    if not analyzer or not analyzer.cache:
+        raise HTTPException(status_code=501, detail="Cache not enabled")
+    if not analyzer.cache.supports_search:
+        raise HTTPException(status_code=501, detail="The configured cache backend has no search index")
+
+    search_in = [name.strip() for name in fields.split(",") if name.strip()] if fields else None
+    unknown = [name for name in search_in or () if name not in SEARCH_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown search fields: {', '.join(unknown)} (expected any of {', '.join(SEARCH_FIELDS)})"
+        )
+
+    try:
+        page = max(page, 1)
+        page_size = max(1, min(page_size, 100))
+        variant = AnalysisVariant(
+            language=language,
+            deep_thinking=deep_thinking,
+            user_prompt=user_prompt.strip() if user_prompt else None,
+        ) if language else None
+
+        started = time.perf_counter()
+        total, hits = analyzer.cache.search(
+            q,
+            limit=page_size,
+            offset=(page - 1) * page_size,
+            variant=variant,
+            fields=search_in,
+        )
+        took_ms = (time.perf_counter() - started) * 1000
+
+        analyses = analyzer.cache.get_by_keys([hit.cache_key for hit in hits]) if include_analysis else {}
+        results = []
+        for hit in hits:
+            entry = {
+                "image_hash": hit.image_hash,
+                "variant_key": hit.variant_key,
+                "score": round(hit.score, 4),
+                "brief_caption": hit.fields["brief_caption"],
+                "semantic_tags": [tag for tag in hit.fields["semantic_tags"].split(", ") if tag],
+                "mood": hit.fields["mood"],
+                "style": hit.fields["style"],
+                "created_at": hit.created_at
+            }
+            if hit.cache_key in analyses:
+                entry["image_context"], entry["metadata"] = analyses[hit.cache_key]
+            results.append(entry)
+
+        return {
+            "success": True,
+            "query": q,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "pages": math.ceil(total / page_size),
+            "took_ms": round(took_ms, 2),
+            "results": results
+        }
+
+    except Exception as e:
+        logger.error(f"Error in /search: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/health")
 async def health_check():
     """Health check for image analyzer service"""
@@ -278,11 +586,23 @@ async def health_check():
         "analyzer_initialized": analyzer is not None,
         "cache_enabled": analyzer.cache is not None if analyzer else False,
         "cache_stats": cache_stats,
+        "embeddings_enabled": analyzer.embeddings is not None if analyzer else False,
+        "embedding_stats": analyzer.embeddings.get_stats() if analyzer and analyzer.embeddings else {},
+        "vision_input": analyzer.fallback_manager.vision_input_stats.as_dict() if analyzer else {},
+        "ollama_client": analyzer.client.get_stats() if analyzer else {},
+        "model_registry": analyzer.fallback_manager.registry.get_stats() if analyzer else {},
+        "time_to_first_token": analyzer.time_to_first_token.as_dict() if analyzer else {},
+        "preanalysis": analyzer.preanalysis_time.as_dict() if analyzer else {},
+        "single_flight": analyzer.single_flight.get_stats() if analyzer else {},
+        "clip_fallback": analyzer.fallback_manager.clip_fallback.get_stats() if analyzer else {},
         "endpoints": {
             "/analyze": "Basic prompt generation with validation and caching",
-            "/analyze-stream": "Streaming analysis with SSE",
+            "/analyze-stream": "Token-streaming analysis with SSE (cached like /analyze)",
+            "/analyze-batch": "Many images or a zip, results streamed as NDJSON",
             "/analyze-detailed": "Detailed JSON for external model use",
-            "/cache-stats": "Cache performance statistics"
+            "/cache-stats": "Cache performance statistics",
+            "/similar": "Top-k visually similar analyzed images (needs IMAGE_EMBEDDINGS_ENABLED)",
+            "/search": "Ranked full-text search over cached analyses"
         }
     }
 
@@ -298,7 +618,7 @@ async def get_cache_stats():
         return {
             "status": "ok",
             "cache_stats": stats,
-            "cache_location": str(analyzer.cache.db_path)
+            "cache_location": analyzer.cache.location
         }
     except Exception as e:
         logger.error(f"Error getting cache stats: {str(e)}")
@@ -0,0 +1,54 @@
+"""
+models.py
+Rutas FastAPI para consultar los modelos de Ollama y cómo se enrutan las llamadas.
+"""
+
+import logging
+
+from fastapi import APIRouter
+
+from app.services.model_registry import get_model_registry
+from app.services.model_residency import get_model_residency
+from app.services.model_router import get_model_router
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/models", tags=["models"])
+
+
+@router.get("")
+async def list_models() -> dict:
+    """
+    Modelos instalados en Ollama (familia, tamaño, cuantización, visión) y
+    modelos cargados en memoria, según el registro compartido.
+    """
+    registry = get_model_registry()
+    await registry.ensure_fresh()
+    loaded = registry.loaded()
+    return {
+        "models": [
+            {**registry.get(name).as_dict(), "loaded": name in loaded}
+            for name in registry.names()
+        ],
+        "registry": registry.get_stats(),
+    }
+
+
+@router.get("/router")
+async def router_stats() -> dict:
+    """
+    Estado del enrutado de modelos: latencias (p50/p95), tasa de error y estado
+    del circuito de cada modelo, y las últimas decisiones de enrutado.
+    """
+    return get_model_router().get_stats()
+
+
+@router.get("/residency")
+async def model_residency() -> dict:
+    """
+    Modelos que Ollama tiene cargados ahora mismo (y hasta cuándo), los modelos
+    fijados por la precarga y la política de keep_alive aplicada a cada uno.
+    """
+    # /api/ps es barato: se consulta en el momento en lugar de esperar al TTL
+    await get_model_registry().refresh()
+    return get_model_residency().report()
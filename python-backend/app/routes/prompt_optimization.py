@@ -4,9 +4,10 @@ Rutas FastAPI para optimización de prompts usando Qwen2.5 + Ollama.
 """
 
 import logging
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 
+from app.services.ollama_client import ClientDisconnected, run_until_disconnected
 from app.services.prompt_optimizer import improve_prompt, PromptImprovement, build_fallback_improvement
 
 logger = logging.getLogger(__name__)
@@ -36,7 +37,7 @@ class PromptOptimizeResponse(BaseModel):
 
 
 @router.post("/optimize", response_model=PromptOptimizeResponse)
-async def optimize_prompt(payload: PromptOptimizeRequest) -> PromptOptimizeResponse:
+async def optimize_prompt(payload: PromptOptimizeRequest, request: Request) -> PromptOptimizeResponse:
     """
     Optimiza un prompt usando el mejor modelo disponible vía Ollama.
 
@@ -60,12 +61,16 @@ async def optimize_prompt(payload: PromptOptimizeRequest) -> PromptOptimizeRespo
             # considerando prefer_speed y target_language si se proporcionan
             selected_model = None  # Será manejado por improve_prompt
 
-        result: PromptImprovement = improve_prompt(
-            raw_prompt=payload.prompt,
-            deep_thinking=payload.deep_thinking,
-            better_prompt=payload.better_prompt,
-            model=selected_model,
-            language=payload.language,
+        # Si el cliente se desconecta, se cancela la llamada a Ollama en curso
+        result: PromptImprovement = await run_until_disconnected(
+            improve_prompt(
+                raw_prompt=payload.prompt,
+                deep_thinking=payload.deep_thinking,
+                better_prompt=payload.better_prompt,
+                model=selected_model,
+                language=payload.language,
+            ),
+            request.is_disconnected,
         )
 
         logger.info(f"Prompt optimization successful. Result: {result.improved_prompt[:100]}...")
@@ -76,6 +81,8 @@ async def optimize_prompt(payload: PromptOptimizeRequest) -> PromptOptimizeRespo
             checklist=result.checklist,
         )
 
+    except ClientDisconnected:
+        raise HTTPException(status_code=499, detail="Client closed request")
     except Exception as e:
         error_msg = f"Error al optimizar prompt: {str(e)}"
         logger.warning(f"Optimization failed, using fallback: {error_msg}")
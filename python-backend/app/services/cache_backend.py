@@ -0,0 +1,181 @@
+"""
+Storage interface behind the image analysis cache
+ImageAnalysisCache keeps the in-process concerns (hot tier, perceptual-hash
+index, hit counters, access buffering) and delegates persistence to a backend:
+the local SQLite files or a shared key-value store
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
+
+from app.models.image_context import DEFAULT_SEMANTIC_TAGS, PLACEHOLDER_TEXT
+
+# ImageContext fields covered by full-text search, in index column order
+SEARCH_FIELDS = ("brief_caption", "semantic_tags", "mood", "style")
+
+
+def search_fields(image_context: Mapping[str, Any]) -> Dict[str, str]:
+    """
+    Searchable text of an image context (model __dict__ or decoded payload);
+    placeholder values are left out so they never match a query
+    """
+    fields = {}
+    for name in SEARCH_FIELDS:
+        value = image_context.get(name) or ""
+        if isinstance(value, (list, tuple)):
+            fields[name] = ", ".join(item for item in value if item not in DEFAULT_SEMANTIC_TAGS)
+        else:
+            fields[name] = "" if value in PLACEHOLDER_TEXT else str(value)
+    return fields
+
+
+@dataclass
+class StoredAnalysis:
+    """One encoded analysis result as persisted by a backend"""
+
+    cache_key: str
+    image_hash: str
+    variant_key: str
+    image_context: bytes
+    metadata: bytes
+    codec: int
+    phash: Optional[int] = None  # unsigned 64-bit dHash
+    expires_at: Optional[str] = None  # end of the entry's own TTL; stale (not gone) afterwards
+    created_at: Optional[str] = None  # CURRENT_TIMESTAMP format, set on read
+    search_fields: Optional[Dict[str, str]] = None  # SEARCH_FIELDS text, set on write
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.image_context) + len(self.metadata)
+
+
+@dataclass
+class StoredDescription:
+    """Language-independent vision-model output shared between variants"""
+
+    description_key: str
+    image_hash: str
+    description: str
+    model_used: str
+    model_fallback_used: bool
+    created_at: Optional[str] = None
+
+
+@dataclass
+class SearchHit:
+    """One full-text search match, carrying only the indexed text"""
+
+    cache_key: str
+    image_hash: str
+    variant_key: str
+    score: float  # higher is better
+    fields: Dict[str, str]
+    created_at: Optional[str] = None
+
+
+class AnalysisCacheBackend(ABC):
+    """
+    Persistence primitives needed by ImageAnalysisCache
+
+    Keys are "<image_hash>:<suffix>" strings. Timestamps are UTC strings in
+    SQLite's CURRENT_TIMESTAMP format so they compare lexicographically.
+    """
+
+    name = "backend"
+
+    # True when the store expires entries and bounds its own size (e.g. key
+    # TTLs plus a server-side eviction policy); the cache then skips its
+    # clear_expired/evict scans
+    enforces_limits = False
+
+    # True when search() is implemented
+    supports_search = False
+
+    @abstractmethod
+    def get_many(self, cache_keys: Sequence[str]) -> Dict[str, StoredAnalysis]:
+        """Fetch the entries that exist for cache_keys"""
+
+    @abstractmethod
+    def set_many(self, entries: Sequence[StoredAnalysis]):
+        """Insert or replace entries"""
+
+    @abstractmethod
+    def delete_many(self, rows: Sequence[Tuple[str, str]]) -> Set[str]:
+        """
+        Delete (cache_key, image_hash) rows
+
+        Returns:
+            Image hashes left without any cached variant
+        """
+
+    @abstractmethod
+    def get_description(self, description_key: str) -> Optional[StoredDescription]:
+        """Fetch a shared description"""
+
+    @abstractmethod
+    def set_description(self, description: StoredDescription):
+        """Insert or replace a shared description"""
+
+    @abstractmethod
+    def record_access(self, rows: Sequence[Tuple[str, int, str]]):
+        """Apply buffered (accessed_at, hit_count, cache_key) hits"""
+
+    @abstractmethod
+    def image_hashes(self, variant_key: str, fresh_at: str) -> Set[str]:
+        """Hashes of images with a result for variant_key whose TTL ends after fresh_at"""
+
+    @abstractmethod
+    def phashes(self) -> Iterator[Tuple[str, int]]:
+        """(image_hash, unsigned phash) for every stored image that has one"""
+
+    def expired_batch(self, cutoff: str, limit: int) -> List[Tuple[str, str]]:
+        """Up to limit (cache_key, image_hash) rows whose expires_at is before cutoff"""
+        return []
+
+    def delete_expired_descriptions(self, cutoff: str):
+        """Drop shared descriptions created before cutoff"""
+
+    def search(
+        self,
+        query: str,
+        live_after: str,
+        limit: int,
+        offset: int = 0,
+        variant_key: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None
+    ) -> Tuple[int, List[SearchHit]]:
+        """
+        Ranked full-text search over SEARCH_FIELDS, best match per image
+
+        Args:
+            query: Plain words; every word must match (as a prefix)
+            live_after: Only entries whose expires_at is after this timestamp
+            limit: Page size
+            offset: Hits to skip
+            variant_key: Restrict to one analysis variant
+            fields: Restrict matching to these SEARCH_FIELDS
+
+        Returns:
+            Tuple of (total matching images, hits on this page)
+        """
+        raise NotImplementedError(f"The {self.name} cache backend has no full-text search")
+
+    def totals(self) -> Tuple[int, int]:
+        """(entries, serialized bytes) currently stored"""
+        return 0, 0
+
+    def eviction_candidates(self, policy: str, limit: int) -> List[Tuple[str, str, int]]:
+        """Up to limit (cache_key, image_hash, size_bytes) rows in eviction order"""
+        return []
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """
+        Aggregate storage statistics with the keys total_entries, total_accesses,
+        oldest_entry, most_recent_access, total_bytes, distinct_images and
+        shared_descriptions, plus any backend-specific extras
+        """
+
+    def close(self):
+        """Release connections"""
@@ -0,0 +1,92 @@
+"""
+Versioned storage codec for cached image analyses
+Encodes ImageContext/AnalysisMetadata as compact JSON (zlib-compressed once it
+is large enough to pay off) and decodes rows written by the current codec
+without re-running Pydantic validation (they were validated when the model
+objects were built)
+"""
+
+import json
+import zlib
+from datetime import datetime
+from typing import Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+from app.models.image_context import AnalysisMetadata, ImageContext
+
+# 0: pretty JSON text from model_dump_json(), validated on read
+# 1: compact JSON, zlib-compressed above _COMPRESS_MIN_BYTES, trusted decode
+LEGACY_CODEC = 0
+CURRENT_CODEC = 1
+
+_COMPRESSION_LEVEL = 6
+# Small payloads (e.g. AnalysisMetadata) barely shrink and would only pay the
+# decompression cost on every read
+_COMPRESS_MIN_BYTES = 512
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def encode_model(model: BaseModel) -> bytes:
+    """Serialize a model with the current codec"""
+    raw = json.dumps(
+        model.model_dump(mode="json"), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+    if len(raw) < _COMPRESS_MIN_BYTES:
+        return raw
+    return zlib.compress(raw, _COMPRESSION_LEVEL)
+
+
+def decode_payload(data, codec: int) -> dict:
+    """Stored blob as the plain dict it was encoded from"""
+    if codec == CURRENT_CODEC:
+        # Uncompressed payloads are JSON objects; zlib streams never start with "{"
+        if data[:1] != b"{":
+            data = zlib.decompress(data)
+        return json.loads(data)
+    if codec == LEGACY_CODEC:
+        return json.loads(data)
+    raise ValueError(f"Unknown cache codec version: {codec}")
+
+
+def decode_model(model_cls: Type[ModelT], data, codec: int) -> ModelT:
+    """
+    Rebuild a model from a stored blob
+
+    Rows from the current codec are trusted and built without validation;
+    anything older goes through full validation.
+    """
+    payload = decode_payload(data, codec)
+    if codec != CURRENT_CODEC:
+        return model_cls(**payload)
+
+    if model_cls is ImageContext and isinstance(payload.get("analysis_timestamp"), str):
+        payload["analysis_timestamp"] = datetime.fromisoformat(payload["analysis_timestamp"])
+    return _construct(model_cls, payload)
+
+
+def _construct(model_cls: Type[ModelT], payload: dict) -> ModelT:
+    """
+    Build a model straight from a complete field dict
+
+    encode_model() always writes every field, so the instance __dict__ can be
+    set directly; model_construct() (which fills defaults field by field) is
+    only needed if the stored fields no longer match the model.
+    """
+    if payload.keys() != model_cls.model_fields.keys():
+        return model_cls.model_construct(**payload)
+    instance = model_cls.__new__(model_cls)
+    object.__setattr__(instance, "__dict__", payload)
+    object.__setattr__(instance, "__pydantic_fields_set__", set(payload))
+    object.__setattr__(instance, "__pydantic_extra__", None)
+    object.__setattr__(instance, "__pydantic_private__", None)
+    return instance
+
+
+def decode_entry(context_data, metadata_data, codec: int) -> Tuple[ImageContext, AnalysisMetadata]:
+    """Decode both halves of a cached analysis row"""
+    return (
+        decode_model(ImageContext, context_data, codec),
+        decode_model(AnalysisMetadata, metadata_data, codec),
+    )
@@ -0,0 +1,337 @@
+"""
+Resident CLIP fallback for image descriptions
+Last link of the vision fallback chain: one CLIP model is loaded on first use
+and kept resident while it is needed, and the text embeddings of its label bank
+are computed once and persisted next to the cache, so describing an image costs
+one image encode plus a matrix product per label category
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from app.config import (
+    CLIP_FALLBACK_DEVICE,
+    CLIP_FALLBACK_IDLE_SECONDS,
+    CLIP_FALLBACK_LABELS_DIR,
+    CLIP_FALLBACK_MODEL,
+)
+from app.services.ollama_client import LatencyStats
+
+try:
+    import torch
+    from transformers import CLIPModel, CLIPProcessor
+except ImportError:  # optional, only needed when the fallback is reached
+    torch = None
+    CLIPModel = CLIPProcessor = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent.parent / "cache" / "clip_labels"
+
+# Texts encoded per forward pass while building the label bank
+_TEXT_BATCH = 256
+# Label rows converted to float32 per matrix-vector product
+_SCORE_BLOCK_ROWS = 8192
+
+# Built-in label bank: category -> labels. CLIP_FALLBACK_LABELS_DIR replaces a
+# category with <category>.txt (one label per line) and can add new ones
+# (e.g. the artists/flavors/mediums/movements lists of clip-interrogator).
+DEFAULT_LABELS: Dict[str, List[str]] = {
+    "subjects": [
+        "a portrait of a person", "a group of people", "a child", "a dog", "a cat", "a bird", "a horse",
+        "wild animals", "a city street", "a skyline", "a building", "an interior room", "a kitchen",
+        "an office", "a landscape", "mountains", "a beach", "the sea", "a forest", "a field of flowers",
+        "a garden", "a desert", "a snowy scene", "a river", "a lake", "a sunset sky", "a night sky",
+        "a car", "a bicycle", "a boat", "an airplane", "a train", "food on a plate", "a drink",
+        "a product on a table", "clothing", "shoes", "jewelry", "a cosmetic product", "a smartphone",
+        "a laptop", "a book", "a poster", "a logo", "text on a sign", "a chart or diagram",
+        "a screenshot of an app", "an abstract pattern", "a painting", "a sculpture", "a house",
+        "a hotel", "a swimming pool", "a restaurant", "a concert", "a sports event", "a wedding",
+        "a celebration", "a workspace", "a pair of hands",
+    ],
+    "mediums": [
+        "a photograph", "a studio photograph", "a product photograph", "an aerial photograph",
+        "a black and white photograph", "a polaroid photo", "a film photograph", "a digital painting",
+        "an oil painting", "a watercolor painting", "an acrylic painting", "a pencil sketch",
+        "a charcoal drawing", "an ink drawing", "a vector illustration", "a flat illustration",
+        "a 3d render", "an isometric render", "pixel art", "a comic book panel", "an anime drawing",
+        "a collage", "a poster design", "a screenshot", "a mosaic",
+    ],
+    "movements": [
+        "minimalism", "photorealism", "hyperrealism", "impressionism", "expressionism", "surrealism",
+        "pop art", "art deco", "art nouveau", "bauhaus", "cubism", "abstract art", "street art",
+        "baroque", "romanticism", "renaissance", "brutalism", "futurism", "cyberpunk", "vaporwave",
+        "retro", "vintage", "scandinavian design", "mid-century modern", "documentary photography",
+    ],
+    "flavors": [
+        "highly detailed", "sharp focus", "soft focus", "shallow depth of field", "bokeh",
+        "wide angle", "close-up", "macro", "symmetrical", "rule of thirds", "minimalist composition",
+        "golden hour", "blue hour", "natural light", "studio lighting", "dramatic lighting",
+        "backlit", "soft light", "harsh shadows", "neon lights", "candlelight", "overcast",
+        "vibrant colors", "muted colors", "pastel colors", "monochrome", "high contrast", "warm tones",
+        "cool tones", "earthy tones", "clean background", "white background", "cluttered",
+        "cinematic", "moody", "dreamy", "serene", "energetic", "elegant", "luxurious", "cozy", "rustic",
+        "modern", "futuristic", "nostalgic", "playful", "professional", "editorial", "commercial",
+        "lifestyle", "fashion", "travel", "texture", "geometric", "organic shapes", "motion blur",
+        "long exposure", "grainy", "glossy", "matte",
+    ],
+}
+
+# Labels taken per category when composing the description
+_TOP_PER_CATEGORY = {"subjects": 1, "mediums": 1, "movements": 1, "artists": 1, "flavors": 4}
+
+
+def _load_labels(labels_dir: str) -> Dict[str, List[str]]:
+    labels = {category: list(values) for category, values in DEFAULT_LABELS.items()}
+    if labels_dir:
+        for path in sorted(Path(labels_dir).glob("*.txt")):
+            values = [line.strip() for line in path.read_text(encoding="utf-8", errors="ignore").splitlines()]
+            values = list(dict.fromkeys(value for value in values if value))
+            if values:
+                labels[path.stem] = values
+    return labels
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class ClipLabelFallback:
+    """
+    CLIP zero-shot labeling against a precomputed label bank
+
+    The model is loaded lazily and kept resident; after idle_seconds without
+    use it is released again (like the TTS/STT/image models in main.py, CUDA
+    memory is handed back). The label embeddings are stored as float16 in
+    <cache_dir>/<model>.npz and reused while the model and labels match.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        model_name: str = CLIP_FALLBACK_MODEL,
+        device: str = CLIP_FALLBACK_DEVICE,
+        idle_seconds: int = CLIP_FALLBACK_IDLE_SECONDS,
+        labels_dir: str = CLIP_FALLBACK_LABELS_DIR
+    ):
+        """
+        Args:
+            cache_dir: Directory for the persisted label embeddings
+            model_name: Hugging Face CLIP checkpoint
+            device: torch device for the model ("cpu", "cuda")
+            idle_seconds: Release the model after this long unused (0 keeps it loaded)
+            labels_dir: Optional directory of <category>.txt label lists
+        """
+        self.cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR)
+        self.model_name = model_name
+        self.device = device
+        self.idle_seconds = idle_seconds
+        self.labels_dir = labels_dir
+        self._model = None
+        self._processor = None
+        self._labels: Optional[Dict[str, List[str]]] = None
+        self._embeddings: Dict[str, np.ndarray] = {}
+        self._bank_source = ""
+        self._lock = threading.RLock()
+        self._last_used = 0.0
+        self._idle_timer: Optional[threading.Timer] = None
+        self._loads = 0
+        self._load_seconds = 0.0
+        self.latency = LatencyStats()
+
+    @property
+    def available(self) -> bool:
+        return CLIPModel is not None
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def bank_path(self) -> Path:
+        return self.cache_dir / (self.model_name.replace("/", "__") + ".npz")
+
+    def _load_model(self):
+        if self._model is None:
+            if not self.available:
+                raise RuntimeError("CLIP fallback not available: torch and transformers are required")
+            started = time.perf_counter()
+            logger.info(f"Loading CLIP fallback model {self.model_name} on {self.device}")
+            self._processor = CLIPProcessor.from_pretrained(self.model_name)
+            self._model = CLIPModel.from_pretrained(self.model_name).to(self.device).eval()
+            self._loads += 1
+            self._load_seconds = time.perf_counter() - started
+
+    def _digest(self, labels: Dict[str, List[str]]) -> str:
+        payload = json.dumps({"model": self.model_name, "labels": labels}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _read_bank(self, digest: str) -> Optional[Dict[str, np.ndarray]]:
+        if not self.bank_path.exists():
+            return None
+        try:
+            with np.load(self.bank_path) as stored:
+                if str(stored["digest"]) != digest:
+                    logger.info("Stored CLIP label bank is from another model or label set; rebuilding")
+                    return None
+                return {key[len("emb_"):]: stored[key] for key in stored.files if key.startswith("emb_")}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable CLIP label bank {self.bank_path}: {e}")
+            return None
+
+    def _write_bank(self, digest: str, embeddings: Dict[str, np.ndarray]):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.bank_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as file:
+            np.savez(file, digest=np.array(digest), **{f"emb_{key}": value for key, value in embeddings.items()})
+        os.replace(tmp_path, self.bank_path)
+
+    def _encode_texts(self, texts: List[str]) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), _TEXT_BATCH):
+            inputs = self._processor(
+                text=texts[start:start + _TEXT_BATCH], padding=True, truncation=True, return_tensors="pt"
+            ).to(self.device)
+            with torch.inference_mode():
+                batches.append(self._model.get_text_features(**inputs).float().cpu().numpy())
+        return _normalize(np.concatenate(batches)).astype(np.float16)
+
+    def _load_bank(self):
+        """Label embeddings from disk, or computed with the model and saved"""
+        if self._labels is not None:
+            return
+        labels = _load_labels(self.labels_dir)
+        digest = self._digest(labels)
+        embeddings = self._read_bank(digest)
+        if embeddings is None or set(embeddings) != set(labels):
+            self._load_model()
+            started = time.perf_counter()
+            embeddings = {category: self._encode_texts(values) for category, values in labels.items()}
+            self._write_bank(digest, embeddings)
+            self._bank_source = "computed"
+            logger.info(
+                f"Computed CLIP label bank ({sum(map(len, labels.values()))} labels) "
+                f"in {time.perf_counter() - started:.1f}s, saved to {self.bank_path}"
+            )
+        else:
+            self._bank_source = "disk"
+        self._labels = labels
+        self._embeddings = embeddings
+
+    def precompute(self) -> Dict[str, int]:
+        """Build (or validate) the persisted label bank; returns labels per category"""
+        with self._lock:
+            self._load_bank()
+            return {category: len(values) for category, values in self._labels.items()}
+
+    def _encode_image(self, image_bytes: bytes) -> np.ndarray:
+        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        inputs = self._processor(images=image, return_tensors="pt").to(self.device)
+        with torch.inference_mode():
+            features = self._model.get_image_features(**inputs)
+        return _normalize(features.float().cpu().numpy()[0])
+
+    @staticmethod
+    def _top(matrix: np.ndarray, vector: np.ndarray, count: int) -> List[int]:
+        scores = np.concatenate([
+            matrix[start:start + _SCORE_BLOCK_ROWS].astype(np.float32) @ vector
+            for start in range(0, len(matrix), _SCORE_BLOCK_ROWS)
+        ])
+        count = min(count, len(scores))
+        top = np.argpartition(-scores, count - 1)[:count]
+        return top[np.argsort(-scores[top])].tolist()
+
+    def describe(self, image_bytes: bytes) -> str:
+        """
+        Describe an image as a comma-separated prompt of its best-matching labels
+
+        Raises:
+            RuntimeError: When torch/transformers are not installed
+        """
+        started = time.perf_counter()
+        with self._lock:
+            self._load_model()
+            self._load_bank()
+            vector = self._encode_image(image_bytes)
+            picked = {}
+            for category, matrix in self._embeddings.items():
+                rows = self._top(matrix, vector, _TOP_PER_CATEGORY.get(category, 1))
+                picked[category] = [self._labels[category][row] for row in rows]
+            self._last_used = time.monotonic()
+            self._schedule_release()
+
+        parts = []
+        for category in ("subjects", "mediums", "movements"):
+            parts.extend(picked.pop(category, []))
+        parts.extend(f"by {artist}" for artist in picked.pop("artists", []))
+        parts.extend(picked.pop("flavors", []))
+        for labels in picked.values():
+            parts.extend(labels)
+
+        self.latency.record(time.perf_counter() - started)
+        return ", ".join(parts)
+
+    def _schedule_release(self):
+        if self.idle_seconds <= 0:
+            return
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+        self._idle_timer = threading.Timer(self.idle_seconds, self._release_if_idle)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _release_if_idle(self):
+        with self._lock:
+            if time.monotonic() - self._last_used >= self.idle_seconds:
+                self.unload()
+
+    def unload(self):
+        """Release the model; the label embeddings stay in memory"""
+        with self._lock:
+            if self._model is None:
+                return
+            logger.info(f"Releasing idle CLIP fallback model {self.model_name}")
+            self._model = None
+            self._processor = None
+            if torch is not None and torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def get_stats(self) -> dict:
+        return {
+            "available": self.available,
+            "model": self.model_name,
+            "device": self.device,
+            "loaded": self.loaded,
+            "loads": self._loads,
+            "last_load_seconds": round(self._load_seconds, 2),
+            "idle_seconds": self.idle_seconds,
+            "label_bank": str(self.bank_path),
+            "label_bank_source": self._bank_source or None,
+            "labels": {category: len(values) for category, values in (self._labels or {}).items()},
+            "describe": self.latency.as_dict(),
+        }
+
+
+_fallbacks: Dict[str, ClipLabelFallback] = {}
+_fallbacks_lock = threading.Lock()
+
+
+def get_clip_fallback(cache_dir: Optional[Path] = None) -> ClipLabelFallback:
+    """Process-wide CLIP fallback for a label-bank directory, so the model is loaded once"""
+    key = str(Path(cache_dir or DEFAULT_CACHE_DIR).resolve())
+    with _fallbacks_lock:
+        fallback = _fallbacks.get(key)
+        if fallback is None:
+            fallback = _fallbacks[key] = ClipLabelFallback(Path(key))
+        return fallback
@@ -0,0 +1,184 @@
+"""
+Hedged model calls
+When the running attempt has not produced its first token within a delay
+derived from the model's observed p95 time to first token, the next candidate
+is started alongside it; the first good answer wins and the other request is
+cancelled (closing its connection stops the generation in Ollama). A budget
+caps how many extra requests hedging may add.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Sequence, Tuple, TypeVar
+
+from app.config import OLLAMA_HEDGE_BUDGET_BURST, OLLAMA_HEDGE_BUDGET_PERCENT
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# attempt(model, first_token) runs one call; it sets first_token when the model
+# starts answering (attempts that return at their first token need not)
+Attempt = Callable[[str, asyncio.Event], Awaitable[T]]
+
+
+class HedgeBudget:
+    """
+    Token bucket limiting hedges to a share of requests
+
+    Every request deposits percent/100 of a token (up to burst tokens) and
+    every hedge spends one, so over time hedges add at most percent% extra
+    load, with room for a short burst after a quiet period.
+    """
+
+    def __init__(self, percent: int = OLLAMA_HEDGE_BUDGET_PERCENT, burst: int = OLLAMA_HEDGE_BUDGET_BURST):
+        self.ratio = max(percent, 0) / 100
+        self.burst = max(burst, 1)
+        self._balance = float(self.burst)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.denied = 0
+        self.backup_wins = 0
+
+    def deposit(self):
+        with self._lock:
+            self.requests += 1
+            self._balance = min(self._balance + self.ratio, self.burst)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._balance >= 1:
+                self._balance -= 1
+                self.hedges += 1
+                return True
+            self.denied += 1
+            return False
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "budget_percent": round(self.ratio * 100),
+                "burst": self.burst,
+                "balance": round(self._balance, 2),
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "denied": self.denied,
+                "backup_wins": self.backup_wins,
+            }
+
+
+@dataclass
+class _Running:
+    model: str
+    first_token: asyncio.Event
+    started: float
+    hedge: bool
+
+
+class AllCandidatesFailed(Exception):
+    """Every candidate failed; errors maps model -> exception (last one is also the cause)"""
+
+    def __init__(self, errors: Dict[str, BaseException]):
+        super().__init__("; ".join(f"{model}: {error}" for model, error in errors.items()) or "no candidates")
+        self.errors = errors
+
+
+async def race_candidates(
+    candidates: Sequence[str],
+    attempt: Attempt,
+    hedge_delay: Optional[Callable[[str], float]] = None,
+    budget: Optional[HedgeBudget] = None,
+    discard: Optional[Callable[[T], Awaitable[None]]] = None
+) -> Tuple[T, str]:
+    """
+    Try candidates in order, hedging slow attempts with the next one
+
+    Without hedge_delay this is a plain sequential fallback. With it, an
+    attempt that shows no first token after hedge_delay(model) seconds gets
+    the next candidate started next to it (if the budget allows); a failed
+    attempt is followed by the next candidate once nothing else is running.
+    discard releases a result that succeeded but lost the race (an open
+    stream that finished in the same step as the winner).
+
+    Returns:
+        (result, model) of the first attempt that succeeded
+
+    Raises:
+        AllCandidatesFailed: When every attempt failed
+    """
+    if budget is not None:
+        budget.deposit()
+    pending: Dict["asyncio.Task[T]", _Running] = {}
+    errors: Dict[str, BaseException] = {}
+    next_index = 0
+    newest: Optional[_Running] = None
+    hedging = hedge_delay is not None
+
+    def launch(hedge: bool = False):
+        nonlocal next_index, newest
+        model = candidates[next_index]
+        next_index += 1
+        newest = _Running(model, asyncio.Event(), time.monotonic(), hedge)
+        pending[asyncio.ensure_future(attempt(model, newest.first_token))] = newest
+
+    if candidates:
+        launch()
+    try:
+        while pending:
+            timeout = None
+            waiters = set(pending)
+            first_token_wait = None
+            if hedging and next_index < len(candidates) and not newest.first_token.is_set():
+                timeout = max(newest.started + hedge_delay(newest.model) - time.monotonic(), 0)
+                first_token_wait = asyncio.ensure_future(newest.first_token.wait())
+                waiters.add(first_token_wait)
+
+            done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if first_token_wait is not None:
+                first_token_wait.cancel()
+
+            winner = None
+            for task in done:
+                running = pending.pop(task, None)
+                if running is None:
+                    continue
+                error = task.exception()
+                if error is not None:
+                    errors[running.model] = error
+                    logger.warning(f"Attempt with {running.model} failed: {error}")
+                elif winner is None:
+                    winner = (task, running)
+                elif discard is not None:
+                    await discard(task.result())
+            if winner is not None:
+                task, running = winner
+                if running.hedge and budget is not None:
+                    budget.backup_wins += 1
+                if pending:
+                    logger.info(f"{running.model} answered first; cancelling {[r.model for r in pending.values()]}")
+                return task.result(), running.model
+
+            if not pending and next_index < len(candidates):
+                launch()
+            elif not done and next_index < len(candidates):
+                # Hedge delay elapsed without a first token
+                if budget is None or budget.try_spend():
+                    logger.info(
+                        f"No first token from {newest.model} after "
+                        f"{time.monotonic() - newest.started:.1f}s; hedging with {candidates[next_index]}"
+                    )
+                    launch(hedge=True)
+                else:
+                    logger.info(f"Hedge budget exhausted; waiting for {newest.model}")
+                    hedging = False
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    raise AllCandidatesFailed(errors) from (list(errors.values())[-1] if errors else None)
@@ -5,18 +5,38 @@ Uses Qwen3-VL:8b for superior vision understanding
 Includes caching, fallback models, and security validation
 """
 
-import base64
+import asyncio
 import logging
 import time
 from pathlib import Path
-from typing import Optional
-
-import requests
-
-from app.config import OLLAMA_BASE_URL
-from app.models.image_context import ImageContext, AnalysisMetadata, ImageAnalysisResponse
-from app.services.image_cache import ImageAnalysisCache
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from app.config import (
+    IMAGE_BATCH_CONCURRENCY,
+    IMAGE_CACHE_FALLBACK_TTL_SECONDS,
+    IMAGE_EMBEDDINGS_ENABLED,
+    IMAGE_PREANALYSIS_ENABLED,
+    OLLAMA_BASE_URL,
+    OLLAMA_VISION_MODEL,
+)
+from app.models.image_context import (
+    DEFAULT_SEMANTIC_TAGS,
+    PENDING_COMPOSITION,
+    PENDING_LIGHTING,
+    PENDING_MOOD,
+    PENDING_SETTING,
+    PENDING_STYLE,
+    ImageContext,
+    AnalysisMetadata,
+    ImageAnalysisResponse,
+)
+from app.services.clip_fallback import get_clip_fallback
+from app.services.image_cache import AnalysisVariant, ImageAnalysisCache
+from app.services.image_embeddings import ImageEmbeddingService
+from app.services.image_preanalysis import PreAnalysis, preanalyze
 from app.services.model_fallback import ModelFallbackManager, ImageSecurityValidator
+from app.services.ollama_client import LatencyStats, get_ollama_client
+from app.services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -27,10 +47,11 @@ class ImageAnalyzer:
     def __init__(
         self,
         ollama_host: Optional[str] = None,
-        vision_model: str = "Llava:latest",
+        vision_model: str = OLLAMA_VISION_MODEL,
         refinement_model: str = "mistral:latest",
         enable_cache: bool = True,
-        cache_dir: Optional[Path] = None
+        cache_dir: Optional[Path] = None,
+        enable_embeddings: bool = IMAGE_EMBEDDINGS_ENABLED
     ):
         """
         Initialize ImageAnalyzer with Qwen3-VL for vision analysis
@@ -41,6 +62,7 @@ class ImageAnalyzer:
             refinement_model: Ollama model to use for prompt refinement (e.g., mistral:latest)
             enable_cache: Enable caching of analysis results
             cache_dir: Directory for cache storage
+            enable_embeddings: Embed analyzed images for similarity search (needs the cache)
         """
         try:
             base_host = (ollama_host or OLLAMA_BASE_URL).rstrip("/")
@@ -48,12 +70,34 @@ class ImageAnalyzer:
             self.ollama_chat_url = f"{base_host}/api/chat"
             self.vision_model = vision_model
             self.refinement_model = refinement_model
+            self.client = get_ollama_client(base_host)
+            # Loop the analyses run on; stale-entry refreshes are scheduled onto it
+            self._loop: Optional[asyncio.AbstractEventLoop] = None
+            # Time from request start to the first streamed vision-model token
+            self.time_to_first_token = LatencyStats()
+            # Duration of the local palette/lighting/composition/EXIF pass
+            self.preanalysis_time = LatencyStats()
+            # Identical analyses requested while one is running share its result
+            self.single_flight: SingleFlight[Tuple[ImageContext, AnalysisMetadata]] = SingleFlight()
+
+            # Initialize cache; stale hits are re-analyzed in the background
+            self.cache = (
+                ImageAnalysisCache(cache_dir, refresher=self._refresh_cached_analysis)
+                if enable_cache else None
+            )
 
-            # Initialize cache
-            self.cache = ImageAnalysisCache(cache_dir) if enable_cache else None
+            # Optional CLIP embeddings of analyzed images, keyed like the cache
+            self.embeddings = (
+                ImageEmbeddingService(self.cache.cache_dir)
+                if self.cache and enable_embeddings else None
+            )
 
-            # Initialize fallback manager
-            self.fallback_manager = ModelFallbackManager(base_host)
+            # Initialize fallback manager (its CLIP label bank is stored next to the cache)
+            self.fallback_manager = ModelFallbackManager(
+                base_host,
+                client=self.client,
+                clip_fallback=get_clip_fallback(self.cache.cache_dir / "clip_labels" if self.cache else None),
+            )
 
             # Security validator
             self.security_validator = ImageSecurityValidator()
@@ -61,12 +105,13 @@ class ImageAnalyzer:
             logger.info(f"ImageAnalyzer initialized with vision_model={vision_model}, refinement_model={refinement_model}")
             logger.info(f"Ollama host: {ollama_host}")
             logger.info(f"Cache enabled: {enable_cache}")
+            logger.info(f"Image embeddings enabled: {self.embeddings is not None}")
 
         except Exception as e:
             logger.error(f"Error initializing ImageAnalyzer: {str(e)}")
             raise
 
-    def analyze_image(
+    async def analyze_image(
         self,
         image_bytes: bytes,
         content_type: Optional[str] = None,
@@ -89,6 +134,7 @@ class ImageAnalyzer:
             ImageAnalysisResponse with complete analysis or error
         """
         start_time = time.time()
+        self._loop = asyncio.get_running_loop()
 
         try:
             if not language:
@@ -96,74 +142,24 @@ class ImageAnalyzer:
 
             # 1. SECURITY VALIDATION
             is_valid, error_msg = self.security_validator.validate_upload(image_bytes, content_type or "image/jpeg")
+            variant = AnalysisVariant(language=language, deep_thinking=deep_thinking, user_prompt=user_prompt)
             if not is_valid:
                 logger.warning(f"Security validation failed: {error_msg}")
-                return ImageAnalysisResponse(
-                    success=False,
-                    error=error_msg,
-                    metadata=AnalysisMetadata(
-                        model_used="none",
-                        language=language,
-                        deep_thinking=deep_thinking,
-                        processing_time_seconds=time.time() - start_time,
-                        confidence_score=0
-                    )
-                )
+                return self._error_response(error_msg, variant, start_time, model_used="none")
 
-            # 2. CHECK CACHE
+            # 2. CHECK CACHE (keyed by image + analysis variant)
             if self.cache:
-                cached_result = self.cache.get(image_bytes)
+                cached_result = self.cache.get(image_bytes, variant)
                 if cached_result:
-                    context, metadata = cached_result
-                    processing_time = time.time() - start_time
-
-                    return ImageAnalysisResponse(
-                        success=True,
-                        image_context=context,
-                        metadata=AnalysisMetadata(
-                            model_used=metadata.model_used,
-                            language=metadata.language,
-                            deep_thinking=metadata.deep_thinking,
-                            processing_time_seconds=processing_time,
-                            confidence_score=1.0
-                        ),
-                        user_input=user_prompt,
-                        cached=True
-                    )
-
-            # 3. CONVERT TO BASE64
-            base64_image = base64.b64encode(image_bytes).decode("utf-8")
-
-            # 4. GENERATE ANALYSIS WITH FALLBACK
-            generated_prompt, model_used, is_fallback = self.fallback_manager.analyze_with_fallback(
-                base64_image=base64_image,
-                user_prompt=user_prompt,
-                primary_model=self.vision_model,
-                language=language,
-                deep_thinking=deep_thinking,
-            )
+                    if self.embeddings:
+                        self.embeddings.index_async(image_bytes)
+                    return self._cached_response(cached_result, variant, start_time)
 
-            # 5. BUILD IMAGE CONTEXT (Extended schema)
-            image_context = self._build_extended_context(
-                generated_prompt=generated_prompt,
-                user_prompt=user_prompt,
-                language=language,
-                deep_thinking=deep_thinking
-            )
-
-            # 6. CACHE RESULT
-            processing_time = time.time() - start_time
-            metadata = AnalysisMetadata(
-                model_used=model_used,
-                language=language,
-                deep_thinking=deep_thinking,
-                processing_time_seconds=processing_time,
-                confidence_score=0.8 if is_fallback else 1.0,
-                model_fallback_used=is_fallback
-            )
-
-            if self.cache:
-                self.cache.set(image_bytes, image_context, metadata)
+            # 3. COALESCE WITH AN IDENTICAL ANALYSIS ALREADY IN FLIGHT (double clicks,
+            # teammates uploading the same asset): followers await the leader's result
+            image_context, metadata = await self._analyze_coalesced(image_bytes, variant, start_time)
+            if self.embeddings:
+                self.embeddings.index_async(image_bytes)
 
             return ImageAnalysisResponse(
                 success=True,
@@ -175,50 +171,432 @@ class ImageAnalyzer:
 
         except Exception as e:
             logger.error(f"Error analyzing image: {str(e)}", exc_info=True)
-            processing_time = time.time() - start_time
+            variant = AnalysisVariant(language=language or "es", deep_thinking=deep_thinking, user_prompt=user_prompt)
+            return self._error_response(str(e), variant, start_time)
 
-            return ImageAnalysisResponse(
-                success=False,
-                error=str(e),
-                metadata=AnalysisMetadata(
-                    model_used="error",
-                    language=language or "es",
+    async def analyze_batch(
+        self,
+        images: Sequence[Tuple[str, bytes, Optional[str]]],
+        user_prompt: Optional[str] = None,
+        deep_thinking: bool = False,
+        language: Optional[str] = None,
+        concurrency: int = IMAGE_BATCH_CONCURRENCY
+    ) -> AsyncIterator[dict]:
+        """
+        Analyze many images with the same variant, yielding results as they finish
+
+        Identical images are analyzed once, the cache is checked for all of
+        them in one backend round trip, and only the misses go to the vision
+        model, at most `concurrency` at a time (still coalesced with identical
+        /analyze requests in flight).
+
+        Args:
+            images: (filename, image_bytes, content_type) tuples
+            concurrency: Maximum simultaneous vision-model analyses
+
+        Yields:
+            {"type": "result", "index", "filename", "image_hash", "duplicate_of",
+            **ImageAnalysisResponse} per input image (cache hits first, then in
+            completion order), then one {"type": "summary", ...} line
+        """
+        start_time = time.time()
+        self._loop = asyncio.get_running_loop()
+        variant = AnalysisVariant(language=language or "es", deep_thinking=deep_thinking, user_prompt=user_prompt)
+        summary = {"total": len(images), "duplicates": 0, "cached": 0, "analyzed": 0, "failed": 0}
+
+        def result_line(index: int, response: ImageAnalysisResponse, image_hash=None, duplicate_of=None) -> dict:
+            return {
+                "type": "result",
+                "index": index,
+                "filename": images[index][0],
+                "image_hash": image_hash,
+                "duplicate_of": duplicate_of,
+                **response.model_dump(mode="json"),
+            }
+
+        # Inputs sharing an image hash are answered together, by the first one
+        groups: Dict[str, List[int]] = {}
+        for index, (_, image_bytes, content_type) in enumerate(images):
+            is_valid, error_msg = self.security_validator.validate_upload(image_bytes, content_type or "image/jpeg")
+            if not is_valid:
+                summary["failed"] += 1
+                yield result_line(index, self._error_response(error_msg, variant, start_time, model_used="none"))
+                continue
+            image_hash = ImageAnalysisCache.compute_image_hash(image_bytes)
+            if image_hash in groups:
+                summary["duplicates"] += 1
+            groups.setdefault(image_hash, []).append(index)
+
+        def group_lines(image_hash: str, response: ImageAnalysisResponse):
+            first, *rest = groups[image_hash]
+            yield result_line(first, response, image_hash)
+            for index in rest:
+                yield result_line(index, response, image_hash, duplicate_of=first)
+
+        def image_of(image_hash: str) -> bytes:
+            return images[groups[image_hash][0]][1]
+
+        hashes = list(groups)
+        cached = (
+            self.cache.get_many([(image_of(image_hash), variant) for image_hash in hashes])
+            if self.cache else [None] * len(hashes)
+        )
+        misses = []
+        for image_hash, cached_result in zip(hashes, cached):
+            if cached_result is None:
+                misses.append(image_hash)
+                continue
+            summary["cached"] += len(groups[image_hash])
+            if self.embeddings:
+                self.embeddings.index_async(image_of(image_hash), image_hash)
+            for line in group_lines(image_hash, self._cached_response(cached_result, variant, start_time)):
+                yield line
+
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def analyze(image_hash: str) -> Tuple[str, ImageAnalysisResponse]:
+            async with semaphore:
+                started = time.time()
+                try:
+                    image_context, metadata = await self._analyze_coalesced(image_of(image_hash), variant, started)
+                except Exception as e:
+                    logger.error(f"Error analyzing batch image {image_hash[:8]}: {str(e)}")
+                    return image_hash, self._error_response(str(e), variant, started)
+                return image_hash, ImageAnalysisResponse(
+                    success=True,
+                    image_context=image_context,
+                    metadata=metadata,
+                    user_input=user_prompt,
+                    cached=False
+                )
+
+        tasks = [asyncio.ensure_future(analyze(image_hash)) for image_hash in misses]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                image_hash, response = await next_done
+                if response.success:
+                    summary["analyzed"] += 1
+                    if self.embeddings:
+                        self.embeddings.index_async(image_of(image_hash), image_hash)
+                else:
+                    summary["failed"] += len(groups[image_hash])
+                for line in group_lines(image_hash, response):
+                    yield line
+        finally:
+            # Client gone or generator closed early: stop the remaining analyses
+            for task in tasks:
+                task.cancel()
+
+        yield {"type": "summary", **summary, "processing_time_seconds": round(time.time() - start_time, 3)}
+
+    async def _analyze_coalesced(
+        self,
+        image_bytes: bytes,
+        variant: AnalysisVariant,
+        start_time: float
+    ) -> Tuple[ImageContext, AnalysisMetadata]:
+        """_analyze_uncached, shared with identical analyses already in flight"""
+        cache_key = ImageAnalysisCache.compute_cache_key(ImageAnalysisCache.compute_image_hash(image_bytes), variant)
+        image_context, metadata = await self.single_flight.run(
+            cache_key, lambda: self._analyze_uncached(image_bytes, variant, start_time)
+        )
+        return image_context, metadata.model_copy(update={"processing_time_seconds": time.time() - start_time})
+
+    @staticmethod
+    def _cached_response(
+        cached_result: Tuple[ImageContext, AnalysisMetadata],
+        variant: AnalysisVariant,
+        start_time: float
+    ) -> ImageAnalysisResponse:
+        context, metadata = cached_result
+        return ImageAnalysisResponse(
+            success=True,
+            image_context=context,
+            metadata=AnalysisMetadata(
+                model_used=metadata.model_used,
+                language=metadata.language,
+                deep_thinking=metadata.deep_thinking,
+                processing_time_seconds=time.time() - start_time,
+                confidence_score=1.0
+            ),
+            user_input=variant.user_prompt,
+            cached=True
+        )
+
+    @staticmethod
+    def _error_response(
+        error: str,
+        variant: AnalysisVariant,
+        start_time: float,
+        model_used: str = "error"
+    ) -> ImageAnalysisResponse:
+        return ImageAnalysisResponse(
+            success=False,
+            error=error,
+            metadata=AnalysisMetadata(
+                model_used=model_used,
+                language=variant.language,
+                deep_thinking=variant.deep_thinking,
+                processing_time_seconds=time.time() - start_time,
+                confidence_score=0
+            )
+        )
+
+    async def _analyze_uncached(
+        self,
+        image_bytes: bytes,
+        variant: AnalysisVariant,
+        start_time: float,
+        reuse_description: bool = True
+    ) -> Tuple[ImageContext, AnalysisMetadata]:
+        """
+        Run the vision model for a validated image and store the result
+
+        Args:
+            image_bytes: Image file bytes
+            variant: Analysis parameters (language, deep thinking, user prompt)
+            start_time: time.time() when the request started
+            reuse_description: Use a description another variant already produced
+
+        Returns:
+            Tuple of (ImageContext, AnalysisMetadata)
+        """
+        language = variant.language
+        deep_thinking = variant.deep_thinking
+        user_prompt = variant.user_prompt
+
+        # Local pre-analysis runs in a worker thread while the model generates
+        preanalysis_task = self._start_preanalysis(image_bytes)
+        try:
+            # 4. REUSE THE LANGUAGE-INDEPENDENT DESCRIPTION IF ANOTHER VARIANT PRODUCED IT
+            shared_description = (
+                self.cache.get_description(image_bytes, variant) if self.cache and reuse_description else None
+            )
+            if shared_description:
+                generated_prompt, model_used, is_fallback = shared_description
+            else:
+                # 5-6. GENERATE ANALYSIS WITH FALLBACK (the image is resized and
+                # re-encoded for the selected model before base64)
+                generated_prompt, model_used, is_fallback = await self.fallback_manager.analyze_with_fallback(
+                    image_bytes=image_bytes,
+                    user_prompt=user_prompt,
+                    primary_model=self.vision_model,
+                    language=language,
                     deep_thinking=deep_thinking,
-                    processing_time_seconds=processing_time,
-                    confidence_score=0
                 )
+                if self.cache:
+                    self.cache.set_description(image_bytes, variant, generated_prompt, model_used, is_fallback)
+
+            preanalysis = await self._finish_preanalysis(preanalysis_task)
+        finally:
+            if preanalysis_task is not None and not preanalysis_task.done():
+                preanalysis_task.cancel()
+
+        return self._store_analysis(
+            image_bytes, variant, generated_prompt, model_used, is_fallback, start_time, preanalysis=preanalysis
+        )
+
+    def _start_preanalysis(self, image_bytes: bytes) -> Optional["asyncio.Task[PreAnalysis]"]:
+        """Start the local context pass in a worker thread (None when disabled)"""
+        if not IMAGE_PREANALYSIS_ENABLED:
+            return None
+        return asyncio.ensure_future(asyncio.to_thread(preanalyze, image_bytes))
+
+    async def _finish_preanalysis(self, task: Optional["asyncio.Task[PreAnalysis]"]) -> Optional[PreAnalysis]:
+        """Await the local context pass; failures fall back to the placeholder fields"""
+        if task is None:
+            return None
+        try:
+            preanalysis = await task
+        except Exception as e:
+            logger.warning(f"Image pre-analysis failed: {e}")
+            return None
+        self.preanalysis_time.record(preanalysis.seconds)
+        return preanalysis
+
+    def _store_analysis(
+        self,
+        image_bytes: bytes,
+        variant: AnalysisVariant,
+        generated_prompt: str,
+        model_used: str,
+        is_fallback: bool,
+        start_time: float,
+        time_to_first_token: Optional[float] = None,
+        preanalysis: Optional[PreAnalysis] = None
+    ) -> Tuple[ImageContext, AnalysisMetadata]:
+        """Build the context and metadata for a generated description and cache them"""
+        language = variant.language
+        deep_thinking = variant.deep_thinking
+        user_prompt = variant.user_prompt
+
+        # 7. BUILD IMAGE CONTEXT (Extended schema)
+        image_context = self._build_extended_context(
+            generated_prompt=generated_prompt,
+            user_prompt=user_prompt,
+            language=language,
+            deep_thinking=deep_thinking,
+            preanalysis=preanalysis
+        )
+
+        # 8. CACHE RESULT (fallback-model results expire sooner so the primary model gets another go)
+        processing_time = time.time() - start_time
+        metadata = AnalysisMetadata(
+            model_used=model_used,
+            language=language,
+            deep_thinking=deep_thinking,
+            processing_time_seconds=processing_time,
+            confidence_score=0.8 if is_fallback else 1.0,
+            model_fallback_used=is_fallback,
+            time_to_first_token_seconds=time_to_first_token
+        )
+
+        if self.cache:
+            self.cache.set(
+                image_bytes,
+                variant,
+                image_context,
+                metadata,
+                ttl_seconds=IMAGE_CACHE_FALLBACK_TTL_SECONDS if is_fallback else None,
+            )
+
+        return image_context, metadata
+
+    async def analyze_image_stream(
+        self,
+        image_bytes: bytes,
+        content_type: Optional[str] = None,
+        user_prompt: Optional[str] = None,
+        deep_thinking: bool = False,
+        language: Optional[str] = None
+    ) -> AsyncIterator[dict]:
+        """
+        Streaming variant of analyze_image
+
+        Yields SSE-ready events: {"status": "generating"}, one
+        {"status": "token", "token": ...} per chunk the vision model streams,
+        then {"status": "complete", **ImageAnalysisResponse} once the result is
+        cached, or {"status": "error", "error": ...}. Cache hits complete
+        straight away. The time to the first token goes into the response
+        metadata and into time_to_first_token.
+        """
+        start_time = time.time()
+        self._loop = asyncio.get_running_loop()
+        language = language or "es"
+
+        try:
+            is_valid, error_msg = self.security_validator.validate_upload(image_bytes, content_type or "image/jpeg")
+            if not is_valid:
+                logger.warning(f"Security validation failed: {error_msg}")
+                yield {"status": "error", "error": error_msg}
+                return
+
+            variant = AnalysisVariant(language=language, deep_thinking=deep_thinking, user_prompt=user_prompt)
+            cached_result = self.cache.get(image_bytes, variant) if self.cache else None
+            if cached_result:
+                if self.embeddings:
+                    self.embeddings.index_async(image_bytes)
+                response = self._cached_response(cached_result, variant, start_time)
+                yield {"status": "complete", **response.model_dump(mode="json")}
+                return
+
+            yield {"status": "generating", "message": "Generating prompt..."}
+
+            preanalysis_task = self._start_preanalysis(image_bytes)
+            try:
+                time_to_first_token = None
+                shared_description = self.cache.get_description(image_bytes, variant) if self.cache else None
+                if shared_description:
+                    generated_prompt, model_used, is_fallback = shared_description
+                    time_to_first_token = time.time() - start_time
+                    yield {"status": "token", "token": generated_prompt}
+                else:
+                    chunks = []
+                    async for text, model_used, is_fallback in self.fallback_manager.stream_with_fallback(
+                        image_bytes=image_bytes,
+                        user_prompt=user_prompt,
+                        primary_model=self.vision_model,
+                        language=language,
+                        deep_thinking=deep_thinking,
+                    ):
+                        if time_to_first_token is None:
+                            time_to_first_token = time.time() - start_time
+                            self.time_to_first_token.record(time_to_first_token)
+                            logger.info(f"First token from {model_used} after {time_to_first_token * 1000:.0f} ms")
+                        chunks.append(text)
+                        yield {"status": "token", "token": text}
+                    generated_prompt = "".join(chunks).strip()
+                    if self.cache:
+                        self.cache.set_description(image_bytes, variant, generated_prompt, model_used, is_fallback)
+
+                preanalysis = await self._finish_preanalysis(preanalysis_task)
+            finally:
+                if preanalysis_task is not None and not preanalysis_task.done():
+                    preanalysis_task.cancel()
+
+            image_context, metadata = self._store_analysis(
+                image_bytes, variant, generated_prompt, model_used, is_fallback, start_time, time_to_first_token,
+                preanalysis=preanalysis
+            )
+            if self.embeddings:
+                self.embeddings.index_async(image_bytes)
+
+            response = ImageAnalysisResponse(
+                success=True,
+                image_context=image_context,
+                metadata=metadata,
+                user_input=user_prompt,
+                cached=False
             )
+            yield {"status": "complete", **response.model_dump(mode="json")}
+
+        except Exception as e:
+            logger.error(f"Error in streaming image analysis: {str(e)}", exc_info=True)
+            yield {"status": "error", "error": str(e)}
+
+    def _refresh_cached_analysis(self, image_bytes: bytes, variant: AnalysisVariant):
+        """Re-analyze a stale cache entry (runs on the cache's refresh thread)"""
+        refresh = self._analyze_uncached(image_bytes, variant, time.time(), reuse_description=False)
+        if self._loop is not None and self._loop.is_running():
+            # Share the app loop's connection pool; this thread just waits for it
+            asyncio.run_coroutine_threadsafe(refresh, self._loop).result()
+        else:
+            asyncio.run(refresh)
 
     def _build_extended_context(
         self,
         generated_prompt: str,
         user_prompt: Optional[str] = None,
         language: str = "es",
-        deep_thinking: bool = False
+        deep_thinking: bool = False,
+        preanalysis: Optional[PreAnalysis] = None
     ) -> ImageContext:
         """
         Build extended ImageContext from generated prompt
-        Parses and structures the analysis into detailed fields
+        Parses and structures the analysis into detailed fields; palette,
+        colors, lighting, composition and technical details come from the
+        local pre-analysis when available
         """
         # Extract key elements from the generated prompt
         # This is a basic implementation - can be enhanced with NLP
         lines = generated_prompt.split('\n')
+        local = preanalysis or PreAnalysis()
 
         return ImageContext(
             brief_caption=lines[0] if lines else "Image analysis",
             detailed_description=generated_prompt,
             objects=[],  # Could parse from prompt
             people=[],   # Could parse from prompt
-            setting="Scene setting to be determined from image context",
-            mood="Mood/atmosphere to be analyzed",
-            style="Visual style to be identified",
-            colors=[],   # Could parse from prompt
+            setting=PENDING_SETTING,
+            mood=PENDING_MOOD,
+            style=PENDING_STYLE,
+            colors=local.colors,
             text_in_image="",
-            composition="Composition analysis pending",
-            lighting="Lighting analysis pending",
-            technical_details={},
-            palette_hex=[],
-            semantic_tags=["analyzed", "vision-model"],
+            composition=local.composition or PENDING_COMPOSITION,
+            lighting=local.lighting or PENDING_LIGHTING,
+            technical_details=local.technical_details,
+            palette_hex=local.palette_hex,
+            semantic_tags=list(DEFAULT_SEMANTIC_TAGS),
             generative_prompt=generated_prompt,
             adapted_prompts={
                 "campaign": self._adapt_prompt_for_mode(generated_prompt, "campaign"),
@@ -250,155 +628,3 @@ class ImageAnalyzer:
         if instruction:
             return f"{base_prompt}\n\n[{mode.upper()} MODE]: {instruction}"
         return base_prompt
-
-    def _generate_prompt_with_vision(
-        self,
-        base64_image: str,
-        user_input: Optional[str] = None,
-        deep_thinking: bool = False,
-        language: str = "es"
-    ) -> str:
-        """
-        Generates prompt using Qwen3-VL vision model
-
-        Args:
-            base64_image: Image in base64 format
-            user_input: Optional user input
-            deep_thinking: If True, requests more detailed analysis
-            language: Output language (es, en, fr, etc.)
-        """
-        try:
-            # Build language-specific system message
-            language_instructions = {
-                "es": """Eres un experto en análisis de imágenes y creación de prompts detallados para generar imágenes similares.
-Responde SIEMPRE en ESPAÑOL, sin excepción.
-Tu tarea es analizar CUIDADOSAMENTE cada elemento visual de la imagen y crear un prompt extremadamente detallado.
-El prompt debe capturar todos los aspectos visuales específicos: sujetos exactos, estilos, colores, composición, iluminación, atmósfera, texturas, materiales, fondos y ambiente.""",
-                "en": """You are an expert in image analysis and detailed prompt creation for generating similar images.
-Always respond in ENGLISH, without exception.
-Your task is to analyze CAREFULLY each visual element in the image and create an extremely detailed prompt.
-The prompt must capture all specific visual aspects: exact subjects, styles, colors, composition, lighting, atmosphere, textures, materials, backgrounds and environment.""",
-                "fr": """Vous êtes un expert en analyse d'images et en création de prompts détaillés pour générer des images similaires.
-Répondez TOUJOURS en FRANÇAIS, sans exception.
-Votre tâche est d'analyser ATTENTIVEMENT chaque élément visuel de l'image et de créer un prompt extrêmement détaillé.
-Le prompt doit capturer tous les aspects visuels spécifiques: sujets exacts, styles, couleurs, composition, éclairage, atmosphère, textures, matériaux, arrière-plans et environnement.""",
-                "de": """Sie sind ein Experte für Bildanalyse und detaillierte Prompt-Erstellung zum Generieren ähnlicher Bilder.
-Antworten Sie IMMER auf DEUTSCH, ohne Ausnahme.
-Ihre Aufgabe ist es, jedes visuelle Element im Bild SORGFÄLTIG zu analysieren und einen äußerst detaillierten Prompt zu erstellen.
-Der Prompt muss alle spezifischen visuellen Aspekte erfassen: genaue Themen, Stile, Farben, Komposition, Beleuchtung, Atmosphäre, Texturen, Materialien, Hintergründe und Umgebung.""",
-                "it": """Sei un esperto nell'analisi di immagini e nella creazione di prompt dettagliati per generare immagini simili.
-Rispondi SEMPRE in ITALIANO, senza eccezioni.
-Il tuo compito è analizzare ATTENTAMENTE ogni elemento visivo dell'immagine e creare un prompt estremamente dettagliato.
-Il prompt deve catturare tutti gli aspetti visivi specifici: soggetti esatti, stili, colori, composizione, illuminazione, atmosfera, texture, materiali, sfondi e ambiente.""",
-                "pt": """Você é um especialista em análise de imagens e criação de prompts detalhados para gerar imagens similares.
-Responda SEMPRE em PORTUGUÊS, sem exceção.
-Sua tarefa é analisar CUIDADOSAMENTE cada elemento visual da imagem e criar um prompt extremamente detalhado.
-O prompt deve capturar todos os aspectos visuais específicos: temas exatos, estilos, cores, composição, iluminação, atmosfera, texturas, materiais, fundos e ambiente.""",
-                "ja": """あなたは画像分析と、同様の画像を生成するための詳細なプロンプト作成の専門家です。
-常に日本語で応答してください。例外はありません。
-あなたのタスクは、画像の各視覚要素を注意深く分析し、非常に詳細なプロンプトを作成することです。
-プロンプトは、すべての具体的な視覚的側面を捉える必要があります：正確な被写体、スタイル、色、構成、照明、雰囲気、テクスチャ、材料、背景と環境。""",
-                "zh": """您是图像分析和详细提示创建的专家，用于生成相似的图像。
-始终用中文回复，没有例外。
-您的任务是仔细分析图像中的每个视觉元素，并创建一个极其详细的提示。
-提示必须捕捉所有特定的视觉方面：确切的对象、风格、颜色、构图、照明、气氛、纹理、材料、背景和环境。""",
-                "ar": """أنت خبير في تحليل الصور وإنشاء رموز مفصلة لتوليد صور مشابهة.
-رد دائما باللغة العربية، بدون استثناء.
-مهمتك هي تحليل كل عنصر بصري في الصورة بعناية وإنشاء رمز مفصل للغاية.
-يجب أن يعكس الرمز جميع الجوانب البصرية المحددة: الموضوعات الدقيقة والأنماط والألوان والتكوين والإضاءة والأجواء والملمس والمواد والخلفيات والبيئة."""
-            }
-
-            system_msg = language_instructions.get(language, language_instructions["es"])
-
-            # Build user message with two-stage approach: first analyze, then create prompt
-            if deep_thinking:
-                user_msg = f"""Sigue estos pasos EXACTAMENTE:
-
-PASO 1: Describe exhaustivamente TODOS los elementos visuales que ves en la imagen:
-- Objetos principales y secundarios
-- Colores específicos y gradientes
-- Estilos artísticos y técnicas
-- Composición y perspectiva
-- Iluminación y sombras
-- Texturas y materiales
-- Atmósfera y mood
-- Fondos y ambiente
-- Perspectiva y profundidad
-
-PASO 2: Basándote en tu análisis, crea un PROMPT EXTREMADAMENTE DETALLADO para generar una imagen idéntica.
-
-{f'El usuario sugiere que incluyas: {user_input}' if user_input else ''}
-
-El prompt final debe ser muy extenso (mínimo 300 palabras), extremadamente específico y listo para usar en un generador de imágenes profesional.
-NO resumas ni simplifiques - SÉ EXHAUSTIVO en todos los detalles."""
-            else:
-                user_msg = f"""Sigue estos pasos EXACTAMENTE:
-
-PASO 1: Identifica y describe los elementos visuales clave en la imagen:
-- Sujetos principales
-- Colores dominantes
-- Estilo artístico
-- Composición
-- Iluminación principal
-- Atmósfera
-- Ambiente/contexto
-
-PASO 2: Crea un PROMPT DETALLADO basado en tu análisis para generar una imagen similar.
-
-{f'El usuario sugiere que incluyas: {user_input}' if user_input else ''}
-
-El prompt debe ser completo, específico y suficientemente detallado para un generador de imágenes profesional."""
-
-            # Log image data size for debugging
-            logger.info(f"Image data size: {len(base64_image)} characters ({len(base64_image) / 1024:.1f} KB)")
-            logger.info(f"Calling Qwen3-VL at {self.ollama_chat_url} with language={language}, deep_thinking={deep_thinking}")
-
-            # Call Ollama Qwen3-VL with improved payload
-            payload = {
-                "model": self.vision_model,
-                "messages": [
-                    {"role": "system", "content": system_msg},
-                    {
-                        "role": "user",
-                        "content": user_msg,
-                        "images": [base64_image]
-                    }
-                ],
-                "stream": False,
-                "options": {
-                    "temperature": 0.7 if deep_thinking else 0.5,
-                    "top_p": 0.9,
-                    "num_predict": 2000 if deep_thinking else 1000
-                }
-            }
-
-            logger.debug(f"Payload structure: model={payload['model']}, num_messages={len(payload['messages'])}, has_image={bool(payload['messages'][1].get('images'))}")
-
-            response = requests.post(self.ollama_chat_url, json=payload, timeout=120)
-            response.raise_for_status()
-
-            response_data = response.json()
-            logger.debug(f"Response received: status={response.status_code}, has_message={('message' in response_data)}")
-
-            if "message" not in response_data:
-                logger.error(f"Unexpected response format: {response_data}")
-                raise ValueError(f"Unexpected response format: {response_data}")
-
-            prompt_text = response_data.get("message", {}).get("content", "").strip()
-
-            if not prompt_text:
-                logger.warning("Empty response from Qwen3-VL, using user input as fallback")
-                return user_input or "detailed image prompt"
-
-            logger.info(f"Generated prompt length: {len(prompt_text)} characters")
-            return prompt_text
-
-        except requests.exceptions.Timeout:
-            logger.error("Qwen3-VL request timed out after 120 seconds")
-            return user_input or "Image analysis timed out"
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f"Connection error to Ollama at {self.ollama_chat_url}: {str(e)}")
-            return user_input or "Cannot connect to image analyzer"
-        except Exception as e:
-            logger.error(f"Error generating prompt with Qwen3-VL: {str(e)}", exc_info=True)
-            return user_input or "Error analyzing image"
@@ -1,63 +1,323 @@
 """
 Image analysis cache system
-Stores and retrieves cached image analysis results using MD5 hashing
+Stores and retrieves cached image analysis results keyed by MD5 of the image
+plus the analysis variant (language, deep thinking, user prompt) in a
+pluggable backend: local SQLite files (optionally sharded) or a shared
+Redis-protocol store
 Reduces redundant API calls and improves performance
 """
 
 import hashlib
-import sqlite3
 import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 from datetime import datetime, timedelta
-import threading
 
+from app.config import (
+    IMAGE_CACHE_BACKEND,
+    IMAGE_CACHE_EVICTION_POLICY,
+    IMAGE_CACHE_L1_MAX_BYTES,
+    IMAGE_CACHE_L1_MAX_ENTRIES,
+    IMAGE_CACHE_MAX_BYTES,
+    IMAGE_CACHE_MAX_ENTRIES,
+    IMAGE_CACHE_NEAR_DUPLICATE_DISTANCE,
+    IMAGE_CACHE_REDIS_PREFIX,
+    IMAGE_CACHE_REDIS_URL,
+    IMAGE_CACHE_SHARDS,
+    IMAGE_CACHE_STALE_WHILE_REVALIDATE_SECONDS,
+)
 from app.models.image_context import ImageContext, AnalysisMetadata
+from app.services.cache_backend import (
+    AnalysisCacheBackend,
+    SearchHit,
+    StoredAnalysis,
+    StoredDescription,
+    search_fields,
+)
+from app.services.cache_codec import CURRENT_CODEC, decode_entry, encode_model
+from app.services.memory_cache import BoundedLRUCache
+from app.services.perceptual_hash import PerceptualHashIndex, compute_dhash
+from app.services.redis_cache_backend import RedisCacheBackend
+from app.services.sqlite_cache_backend import SQLiteCacheBackend
 
 logger = logging.getLogger(__name__)
 
+EVICTION_POLICIES = ("lru", "lfu")
 
-class ImageAnalysisCache:
-    """SQLite-based cache for image analysis results"""
 
-    def __init__(self, cache_dir: Path = None, max_age_days: int = 30):
+@dataclass(frozen=True)
+class AnalysisVariant:
+    """
+    Parameters that change an analysis result for the same image
+
+    The vision model is always asked for an English generative prompt, so its raw
+    description depends on deep_thinking and user_prompt but not on language;
+    description_key captures that shared part while key identifies the full result.
+    """
+
+    language: str = "es"
+    deep_thinking: bool = False
+    user_prompt: Optional[str] = None
+
+    @staticmethod
+    def _digest(*parts) -> str:
+        return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def normalized_prompt(self) -> str:
+        return " ".join((self.user_prompt or "").split())
+
+    @property
+    def key(self) -> str:
+        """Identifies the full analysis result"""
+        return self._digest(self.language or "es", bool(self.deep_thinking), self.normalized_prompt)
+
+    @property
+    def description_key(self) -> str:
+        """Identifies the language-independent vision-model description"""
+        return self._digest(bool(self.deep_thinking), self.normalized_prompt)
+
+
+class AccessTracker:
+    """
+    Write-behind buffer for cache hit metadata
+
+    Hits are aggregated in memory per key (latest access time, hit count) and
+    written in one batched transaction when the buffer reaches max_pending keys,
+    every flush_interval_seconds, or on close().
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[List[Tuple[str, int, str]]], None],
+        flush_interval_seconds: float = 5.0,
+        max_pending: int = 256
+    ):
+        """
+        Args:
+            flush_fn: Persists a batch of (accessed_at, hit_count, key) rows
+            flush_interval_seconds: Maximum time a hit stays buffered
+            max_pending: Number of distinct buffered keys that triggers an early flush
+        """
+        self._flush_fn = flush_fn
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_pending = max_pending
+        self._pending: Dict[str, List] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="cache-access-flush", daemon=True)
+        self._thread.start()
+
+    def record(self, key: str):
+        """Buffer one hit for key"""
+        accessed_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = [accessed_at, 1]
+            else:
+                entry[0] = accessed_at
+                entry[1] += 1
+            should_flush = len(self._pending) >= self.max_pending
+        if should_flush:
+            self._wakeup.set()
+
+    def discard(self, key: str):
+        """Drop buffered hits for a key that is being deleted"""
+        with self._lock:
+            self._pending.pop(key, None)
+
+    @property
+    def pending(self) -> int:
+        """Number of keys with buffered hits"""
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """
+        Write all buffered hits in a single transaction
+
+        Returns:
+            Number of keys flushed
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            rows = [(accessed_at, count, key) for key, (accessed_at, count) in batch.items()]
+            try:
+                self._flush_fn(rows)
+            except Exception as e:
+                logger.warning(f"Error flushing cache access metadata ({len(rows)} keys): {e}")
+                return 0
+            return len(rows)
+
+    def _run(self):
+        """Background loop: flush on interval or when woken by a full buffer"""
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval_seconds)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the background thread and flush what is left"""
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout=self.flush_interval_seconds + 1)
+        self.flush()
+
+
+class ImageAnalysisCache:
+    """
+    Cache for image analysis results
+
+    A bounded in-memory LRU tier (L1) holds ready-built (ImageContext,
+    AnalysisMetadata) tuples for hot entries in front of the storage backend
+    (L2). Reads go through L1, writes go to both, deletions and expiry
+    invalidate L1. Objects returned from get() are shared with L1 and must be
+    treated as read-only.
+
+    Every entry carries its own TTL. Once it runs out the entry is stale: for
+    stale_while_revalidate_seconds more it is still served, and the first read
+    schedules one background refresh per image and variant through the
+    refresher callback. Past that window it is a miss and gets deleted.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path = None,
+        max_age_days: int = 30,
+        access_flush_interval_seconds: float = 5.0,
+        access_flush_max_pending: int = 256,
+        near_duplicate_distance: int = IMAGE_CACHE_NEAR_DUPLICATE_DISTANCE,
+        l1_max_entries: int = IMAGE_CACHE_L1_MAX_ENTRIES,
+        l1_max_bytes: int = IMAGE_CACHE_L1_MAX_BYTES,
+        max_entries: int = IMAGE_CACHE_MAX_ENTRIES,
+        max_bytes: int = IMAGE_CACHE_MAX_BYTES,
+        eviction_policy: str = IMAGE_CACHE_EVICTION_POLICY,
+        eviction_batch_size: int = 200,
+        eviction_check_every: int = 50,
+        shards: int = IMAGE_CACHE_SHARDS,
+        backend: Optional[AnalysisCacheBackend] = None,
+        stale_while_revalidate_seconds: int = IMAGE_CACHE_STALE_WHILE_REVALIDATE_SECONDS,
+        refresher: Optional[Callable[[bytes, AnalysisVariant], None]] = None,
+        refresh_workers: int = 1
+    ):
         """
         Initialize the image analysis cache
 
         Args:
             cache_dir: Directory to store cache database (default: ./cache)
-            max_age_days: Maximum age of cached results before expiration
+            max_age_days: Default TTL of cached results (set() can override it per entry)
+            access_flush_interval_seconds: How often buffered hit metadata is written
+            access_flush_max_pending: Buffered keys that trigger an early flush
+            near_duplicate_distance: Max perceptual-hash Hamming distance served as a
+                near-duplicate hit (0 disables near-duplicate lookup)
+            l1_max_entries: Entries kept in the in-memory hot tier (0 disables it)
+            l1_max_bytes: Approximate serialized bytes kept in the hot tier
+            max_entries: Maximum rows kept on disk (0 = unbounded)
+            max_bytes: Maximum serialized bytes kept on disk (0 = unbounded)
+            eviction_policy: "lru" (oldest accessed_at) or "lfu" (lowest access_count)
+            eviction_batch_size: Rows deleted per short write transaction
+            eviction_check_every: Writes between automatic limit checks
+            shards: Number of SQLite files entries are spread over by image hash
+                prefix (SQLite backend only)
+            backend: Storage backend; defaults to the one selected by
+                IMAGE_CACHE_BACKEND ("sqlite" or "redis")
+            stale_while_revalidate_seconds: How long past its TTL an entry is still
+                served while it is refreshed (0 disables stale serving)
+            refresher: Re-runs the analysis for (image_bytes, variant) and stores it
+                with set(); without one, stale entries are served until they expire
+            refresh_workers: Background threads running refreshes
         """
         self.cache_dir = cache_dir or Path(__file__).parent.parent.parent / "cache"
         self.cache_dir.mkdir(exist_ok=True)
-        self.db_path = self.cache_dir / "image_analysis_cache.db"
         self.max_age_days = max_age_days
-        self._lock = threading.Lock()
-
-        # Initialize database
-        self._init_db()
-        logger.info(f"ImageAnalysisCache initialized at {self.db_path}")
-
-    def _init_db(self):
-        """Create database tables if they don't exist"""
+        self.stale_while_revalidate_seconds = max(stale_while_revalidate_seconds, 0)
+        self.refresher = refresher
+        self.near_duplicate_distance = near_duplicate_distance
+        if eviction_policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {eviction_policy}")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.eviction_policy = eviction_policy
+        self.eviction_batch_size = eviction_batch_size
+        self.eviction_check_every = eviction_check_every
+        self._writes_since_eviction = 0
+        self._evicted = 0
+        self._eviction_lock = threading.Lock()
+        self.backend = backend or self._create_backend(shards)
+        self._phash_index = PerceptualHashIndex()
+        self._l1 = BoundedLRUCache(max_entries=l1_max_entries, max_bytes=l1_max_bytes)
+        self._l1_hits = 0
+        self._l2_hits = 0
+        self._exact_hits = 0
+        self._near_hits = 0
+        self._misses = 0
+        self._description_hits = 0
+        self._stale_hits = 0
+        self._refreshes = 0
+        self._refresh_failures = 0
+        self._refreshing: Set[str] = set()
+        self._refresh_lock = threading.Lock()
+        self._refresh_pool = ThreadPoolExecutor(
+            max_workers=max(refresh_workers, 1), thread_name_prefix="cache-refresh"
+        )
+
+        self._load_phash_index()
+        self._access_tracker = AccessTracker(
+            self._flush_access,
+            flush_interval_seconds=access_flush_interval_seconds,
+            max_pending=access_flush_max_pending,
+        )
+        logger.info(f"ImageAnalysisCache initialized at {self.location} ({self.backend.name} backend)")
+
+    def _create_backend(self, shards: int) -> AnalysisCacheBackend:
+        """Build the configured backend, falling back to local SQLite if Redis is unusable"""
+        if IMAGE_CACHE_BACKEND == "redis":
+            try:
+                return RedisCacheBackend.from_url(
+                    IMAGE_CACHE_REDIS_URL,
+                    ttl_seconds=self.default_ttl_seconds,
+                    stale_seconds=self.stale_while_revalidate_seconds,
+                    prefix=IMAGE_CACHE_REDIS_PREFIX,
+                )
+            except Exception as e:
+                logger.error(f"Redis cache backend unavailable ({e}); using local SQLite cache")
+        elif IMAGE_CACHE_BACKEND != "sqlite":
+            logger.warning(f"Unknown IMAGE_CACHE_BACKEND '{IMAGE_CACHE_BACKEND}'; using sqlite")
+        return SQLiteCacheBackend(self.cache_dir, shards=shards, default_ttl_seconds=self.default_ttl_seconds)
+
+    @property
+    def default_ttl_seconds(self) -> int:
+        return self.max_age_days * 86400
+
+    @property
+    def location(self) -> str:
+        """Human-readable location of the backing store"""
+        return getattr(self.backend, "location", self.backend.name)
+
+    @property
+    def db_paths(self) -> List[Path]:
+        """Local database files (empty for non-SQLite backends)"""
+        return list(getattr(self.backend, "db_paths", []))
+
+    def _load_phash_index(self):
+        """Rebuild the in-memory BK-tree from stored perceptual hashes"""
+        index = PerceptualHashIndex()
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
-                    CREATE TABLE IF NOT EXISTS analysis_cache (
-                        image_hash TEXT PRIMARY KEY,
-                        image_context JSON NOT NULL,
-                        metadata JSON NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        accessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        access_count INTEGER DEFAULT 1
-                    )
-                """)
-                conn.commit()
-                logger.debug("Cache database initialized")
+            for image_hash, phash in self.backend.phashes():
+                index.add(image_hash, phash)
         except Exception as e:
-            logger.error(f"Error initializing cache database: {e}")
-            raise
+            logger.warning(f"Could not load perceptual hash index: {e}")
+        self._phash_index = index
+        logger.debug(f"Perceptual hash index loaded with {len(index)} entries")
 
     @staticmethod
     def compute_image_hash(image_bytes: bytes) -> str:
@@ -72,146 +332,494 @@ class ImageAnalysisCache:
         """
         return hashlib.md5(image_bytes).hexdigest()
 
-    def get(self, image_bytes: bytes) -> Optional[tuple]:
+    @staticmethod
+    def compute_cache_key(image_hash: str, variant: AnalysisVariant) -> str:
+        """Row key for one analysis variant of one image"""
+        return f"{image_hash}:{variant.key}"
+
+    def get(self, image_bytes: bytes, variant: AnalysisVariant) -> Optional[tuple]:
         """
         Retrieve cached analysis result
 
+        Looks up the exact MD5 first and, on a miss, the closest image within
+        near_duplicate_distance (by perceptual hash) that has a result for the
+        same analysis variant. A near-duplicate result is served with
+        image_hash set to the requested image's hash.
+
         Args:
             image_bytes: Raw image data to look up
+            variant: Analysis parameters the result must match
 
         Returns:
             Tuple of (ImageContext, AnalysisMetadata) or None if not found/expired
         """
         image_hash = self.compute_image_hash(image_bytes)
 
+        found = self._lookup(self.compute_cache_key(image_hash, variant))
+        if found is not None:
+            self._exact_hits += 1
+            logger.info(f"Cache hit for hash {image_hash[:8]}")
+            return self._serve(found, image_bytes, variant)
+
+        if self.near_duplicate_distance > 0 and len(self._phash_index):
+            phash = compute_dhash(image_bytes)
+            matches = self._phash_index.within(phash, self.near_duplicate_distance) if phash is not None else []
+            # Closest first; a nearer image may lack this variant while a farther one has it
+            for distance, near_hash in matches:
+                if near_hash == image_hash:
+                    continue
+                found = self._lookup(self.compute_cache_key(near_hash, variant))
+                if found is not None:
+                    self._near_hits += 1
+                    logger.info(
+                        f"Near-duplicate cache hit for hash {image_hash[:8]} -> {near_hash[:8]} "
+                        f"(distance {distance})"
+                    )
+                    (context, metadata), stale = found
+                    # The hot tier shares the cached object, so the hash is set on a copy
+                    context = context.model_copy(update={"image_hash": image_hash})
+                    # A stale near-duplicate is refreshed for the requested image
+                    return self._serve(((context, metadata), stale), image_bytes, variant)
+
+        self._misses += 1
+        return None
+
+    def _serve(self, found: Tuple[tuple, bool], image_bytes: bytes, variant: AnalysisVariant) -> tuple:
+        """Return a looked-up result, scheduling a refresh if it is stale"""
+        result, stale = found
+        if stale:
+            self._stale_hits += 1
+            self._schedule_refresh(image_bytes, variant)
+        return result
+
+    def _schedule_refresh(self, image_bytes: bytes, variant: AnalysisVariant):
+        """Queue one background re-analysis per image and variant"""
+        if self.refresher is None:
+            return
+        cache_key = self.compute_cache_key(self.compute_image_hash(image_bytes), variant)
+        with self._refresh_lock:
+            if cache_key in self._refreshing:
+                return
+            self._refreshing.add(cache_key)
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute(
-                    "SELECT image_context, metadata, created_at FROM analysis_cache WHERE image_hash = ?",
-                    (image_hash,)
-                )
-                row = cursor.fetchone()
+            self._refresh_pool.submit(self._run_refresh, cache_key, image_bytes, variant)
+        except RuntimeError:
+            # Executor already shut down (cache closing)
+            with self._refresh_lock:
+                self._refreshing.discard(cache_key)
 
-                if not row:
-                    return None
+    def _run_refresh(self, cache_key: str, image_bytes: bytes, variant: AnalysisVariant):
+        try:
+            logger.info(f"Refreshing stale cache entry {cache_key[:8]}")
+            self.refresher(image_bytes, variant)
+            self._refreshes += 1
+        except Exception as e:
+            self._refresh_failures += 1
+            logger.warning(f"Background refresh failed for {cache_key[:8]}: {e}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(cache_key)
 
-                image_context_data, metadata_data, created_at = row
+    def get_many(self, items: Sequence[Tuple[bytes, AnalysisVariant]]) -> List[Optional[tuple]]:
+        """
+        Exact-match lookup for several images in one backend round trip
 
-                # Check if result is expired
-                created_dt = datetime.fromisoformat(created_at)
-                if datetime.utcnow() - created_dt > timedelta(days=self.max_age_days):
-                    self._delete(image_hash)
-                    logger.info(f"Cache expired for hash {image_hash[:8]}")
-                    return None
+        Near-duplicate matching is not attempted; callers can fall back to get()
+        for the misses they care about.
 
-                # Update access metadata
-                self._update_access(image_hash)
+        Returns:
+            One (ImageContext, AnalysisMetadata) tuple or None per item, in order
+        """
+        cache_keys = [
+            self.compute_cache_key(self.compute_image_hash(image_bytes), variant)
+            for image_bytes, variant in items
+        ]
+        results = self._lookup_many(cache_keys)
+
+        found = []
+        scheduled = set()
+        for (image_bytes, variant), cache_key in zip(items, cache_keys):
+            if cache_key not in results:
+                self._misses += 1
+                found.append(None)
+                continue
+            self._exact_hits += 1
+            result, stale = results[cache_key]
+            if stale and cache_key not in scheduled:
+                scheduled.add(cache_key)
+                self._serve(results[cache_key], image_bytes, variant)
+            found.append(result)
+        return found
+
+    def get_by_hashes(self, image_hashes: Sequence[str], variant: AnalysisVariant) -> Dict[str, tuple]:
+        """
+        Cached results for images known only by hash (e.g. similarity search hits)
 
-                # Deserialize
-                context_dict = json.loads(image_context_data)
-                metadata_dict = json.loads(metadata_data)
+        Without the image bytes stale entries cannot be refreshed; they are
+        returned as they are. Exact-hit and miss counters are left untouched.
 
-                context = ImageContext(**context_dict)
-                metadata = AnalysisMetadata(**metadata_dict)
+        Returns:
+            image_hash -> (ImageContext, AnalysisMetadata) for the images with a result
+        """
+        cache_keys = {self.compute_cache_key(image_hash, variant): image_hash for image_hash in image_hashes}
+        return {
+            cache_keys[cache_key]: result
+            for cache_key, (result, _) in self._lookup_many(list(cache_keys)).items()
+        }
+
+    def _lookup_many(self, cache_keys: Sequence[str]) -> Dict[str, Tuple[tuple, bool]]:
+        """Batched _lookup: hot tier first, then one backend round trip for the rest"""
+        results: Dict[str, Tuple[tuple, bool]] = {}
+        missing = []
+        for cache_key in dict.fromkeys(cache_keys):
+            result = self._l1.get(cache_key)
+            if result is not None:
+                self._l1_hits += 1
+                self._update_access(cache_key)
+                results[cache_key] = (result, False)
+            else:
+                missing.append(cache_key)
+
+        if missing:
+            try:
+                stored = self.backend.get_many(missing)
+            except Exception as e:
+                logger.error(f"Error retrieving cache batch: {e}")
+                stored = {}
+            for cache_key, entry in stored.items():
+                loaded = self._load(entry)
+                if loaded is not None:
+                    self._l2_hits += 1
+                    results[cache_key] = loaded
+        return results
+
+    def _lookup(self, cache_key: str) -> Optional[Tuple[tuple, bool]]:
+        """
+        Read through the hot tier into the backend
 
-                logger.info(f"Cache hit for hash {image_hash[:8]}")
-                return (context, metadata)
+        Returns:
+            Tuple of (result, stale) or None; L1 only holds fresh entries
+        """
+        result = self._l1.get(cache_key)
+        if result is not None:
+            self._l1_hits += 1
+            self._update_access(cache_key)
+            return result, False
+
+        found = self._get_by_key(cache_key)
+        if found is not None:
+            self._l2_hits += 1
+        return found
+
+    def _expires_at(self, entry: StoredAnalysis) -> datetime:
+        """End of the entry's TTL (rows without one use the cache-wide max age)"""
+        if entry.expires_at:
+            return datetime.fromisoformat(entry.expires_at)
+        return datetime.fromisoformat(entry.created_at) + timedelta(seconds=self.default_ttl_seconds)
+
+    def _is_expired(self, created_at: str) -> bool:
+        return datetime.utcnow() - datetime.fromisoformat(created_at) > timedelta(days=self.max_age_days)
+
+    def _get_by_key(self, cache_key: str) -> Optional[Tuple[tuple, bool]]:
+        """Load, expire-check and deserialize the entry for cache_key"""
+        try:
+            entry = self.backend.get_many([cache_key]).get(cache_key)
+            if entry is None:
+                return None
+            return self._load(entry)
 
         except Exception as e:
             logger.error(f"Error retrieving cache: {e}")
             return None
 
+    def _load(self, entry: StoredAnalysis) -> Optional[Tuple[tuple, bool]]:
+        """
+        Expire-check and deserialize a stored entry, promoting fresh ones into L1
+
+        Returns:
+            Tuple of (result, stale) or None if the entry is past its stale window
+        """
+        try:
+            fresh_seconds = (self._expires_at(entry) - datetime.utcnow()).total_seconds()
+
+            # Past the TTL and the stale-while-revalidate window: a real miss
+            if fresh_seconds < -self.stale_while_revalidate_seconds:
+                self._delete(entry.cache_key, entry.image_hash)
+                logger.info(f"Cache expired for key {entry.cache_key[:8]}")
+                return None
+
+            # Buffer access metadata; written behind by the AccessTracker
+            self._update_access(entry.cache_key)
+
+            # Deserialize (rows from the current codec skip re-validation)
+            result = decode_entry(entry.image_context, entry.metadata, entry.codec)
+            stale = fresh_seconds <= 0
+            if not stale:
+                # Only until the TTL ends, so stale reads reach L2 and trigger a refresh
+                self._l1.put(entry.cache_key, result, size=entry.size_bytes, ttl_seconds=fresh_seconds)
+            return result, stale
+
+        except Exception as e:
+            logger.error(f"Error decoding cache entry: {e}")
+            return None
+
     def set(
         self,
         image_bytes: bytes,
+        variant: AnalysisVariant,
         image_context: ImageContext,
-        metadata: AnalysisMetadata
+        metadata: AnalysisMetadata,
+        ttl_seconds: Optional[int] = None
     ) -> bool:
         """
         Store analysis result in cache
 
         Args:
             image_bytes: Raw image data
+            variant: Analysis parameters the result was produced with
             image_context: Analysis result
             metadata: Metadata about the analysis
+            ttl_seconds: How long the entry stays fresh (default: max_age_days)
 
         Returns:
             True if successful, False otherwise
         """
-        image_hash = self.compute_image_hash(image_bytes)
+        return self.set_many([(image_bytes, variant, image_context, metadata)], ttl_seconds=ttl_seconds) == 1
+
+    def set_many(
+        self,
+        entries: Iterable[Tuple[bytes, AnalysisVariant, ImageContext, AnalysisMetadata]],
+        ttl_seconds: Optional[int] = None
+    ) -> int:
+        """
+        Store several analysis results in a single backend write
 
+        Args:
+            entries: (image_bytes, variant, image_context, metadata) tuples
+            ttl_seconds: How long the entries stay fresh (default: max_age_days)
+
+        Returns:
+            Number of entries stored (0 if the write failed)
+        """
+        ttl_seconds = self.default_ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = self._timestamp(datetime.utcnow() + timedelta(seconds=ttl_seconds))
         try:
-            # Update image_hash in context for reference
-            image_context.image_hash = image_hash
+            stored = []
+            hot_entries = []
+            for image_bytes, variant, image_context, metadata in entries:
+                image_hash = self.compute_image_hash(image_bytes)
+
+                # Update image_hash in context for reference
+                image_context.image_hash = image_hash
+
+                entry = StoredAnalysis(
+                    cache_key=self.compute_cache_key(image_hash, variant),
+                    image_hash=image_hash,
+                    variant_key=variant.key,
+                    image_context=encode_model(image_context),
+                    metadata=encode_model(metadata),
+                    codec=CURRENT_CODEC,
+                    phash=compute_dhash(image_bytes),
+                    expires_at=expires_at,
+                    search_fields=search_fields(vars(image_context)),
+                )
+                stored.append(entry)
+                hot_entries.append((entry.cache_key, (image_context, metadata), entry.size_bytes))
 
-            context_json = image_context.model_dump_json()
-            metadata_json = metadata.model_dump_json()
+            if not stored:
+                return 0
 
-            with self._lock:
-                with sqlite3.connect(self.db_path) as conn:
-                    conn.execute(
-                        """
-                        INSERT OR REPLACE INTO analysis_cache
-                        (image_hash, image_context, metadata, created_at, accessed_at, access_count)
-                        VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 1)
-                        """,
-                        (image_hash, context_json, metadata_json)
-                    )
-                    conn.commit()
+            self.backend.set_many(stored)
 
-            logger.info(f"Cached analysis for hash {image_hash[:8]}")
-            return True
+            for entry in stored:
+                if entry.phash is not None:
+                    self._phash_index.add(entry.image_hash, entry.phash)
+
+            for cache_key, result, size_bytes in hot_entries:
+                self._l1.put(cache_key, result, size=size_bytes, ttl_seconds=ttl_seconds)
+
+            if len(stored) == 1:
+                logger.info(f"Cached analysis for hash {stored[0].image_hash[:8]} (variant {stored[0].variant_key[:8]})")
+            else:
+                logger.info(f"Cached {len(stored)} analyses in one write")
+            self._maybe_evict(len(stored))
+            return len(stored)
 
         except Exception as e:
             logger.error(f"Error storing cache: {e}")
-            return False
+            return 0
 
-    def _update_access(self, image_hash: str):
-        """Update access metadata when cache is hit"""
+    def cached_image_hashes(self, variant: AnalysisVariant) -> Set[str]:
+        """
+        Hashes of all images with a fresh (not stale) result for variant
+
+        Lets bulk jobs skip work with one query instead of a lookup per image.
+        """
         try:
-            with self._lock:
-                with sqlite3.connect(self.db_path) as conn:
-                    conn.execute(
-                        """
-                        UPDATE analysis_cache
-                        SET accessed_at = CURRENT_TIMESTAMP,
-                            access_count = access_count + 1
-                        WHERE image_hash = ?
-                        """,
-                        (image_hash,)
-                    )
-                    conn.commit()
+            return self.backend.image_hashes(variant.key, self._timestamp(datetime.utcnow()))
+        except Exception as e:
+            logger.error(f"Error listing cached image hashes: {e}")
+            return set()
+
+    @property
+    def supports_search(self) -> bool:
+        return self.backend.supports_search
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        variant: Optional[AnalysisVariant] = None,
+        fields: Optional[Sequence[str]] = None
+    ) -> Tuple[int, List[SearchHit]]:
+        """
+        Full-text search over caption, tags, mood and style of cached analyses
+
+        Ranking and paging run in the backend; only the page of hits (with their
+        indexed text) comes back. Stale entries are still searchable.
+
+        Args:
+            query: Words to match (prefixes; all must match)
+            limit: Page size
+            offset: Hits to skip
+            variant: Only analyses produced with these parameters
+            fields: Only match in these fields (see SEARCH_FIELDS)
+
+        Returns:
+            Tuple of (total matching images, hits best first)
+
+        Raises:
+            NotImplementedError: The backend has no search index (see supports_search)
+        """
+        live_after = self._timestamp(datetime.utcnow() - timedelta(seconds=self.stale_while_revalidate_seconds))
+        return self.backend.search(
+            query,
+            live_after,
+            limit=limit,
+            offset=offset,
+            variant_key=variant.key if variant else None,
+            fields=fields,
+        )
+
+    def get_by_keys(self, cache_keys: Sequence[str]) -> Dict[str, tuple]:
+        """Cached results for known cache keys (e.g. search hits); counters as get_by_hashes"""
+        return {cache_key: result for cache_key, (result, _) in self._lookup_many(cache_keys).items()}
+
+    def get_description(self, image_bytes: bytes, variant: AnalysisVariant) -> Optional[Tuple[str, str, bool]]:
+        """
+        Retrieve the shared vision-model description for an image
+
+        Lets a new language reuse the expensive model output produced for another
+        language with the same deep_thinking/user_prompt combination.
+
+        Returns:
+            Tuple of (description, model_used, model_fallback_used) or None
+        """
+        description_key = f"{self.compute_image_hash(image_bytes)}:{variant.description_key}"
+        try:
+            stored = self.backend.get_description(description_key)
+            if stored is None or self._is_expired(stored.created_at):
+                return None
+            self._description_hits += 1
+            logger.info(f"Shared description hit for key {description_key[:8]}")
+            return stored.description, stored.model_used, stored.model_fallback_used
+        except Exception as e:
+            logger.error(f"Error retrieving cached description: {e}")
+            return None
+
+    def set_description(
+        self,
+        image_bytes: bytes,
+        variant: AnalysisVariant,
+        description: str,
+        model_used: str,
+        model_fallback_used: bool
+    ) -> bool:
+        """
+        Store the language-independent vision-model description
+
+        Returns:
+            True if successful, False otherwise
+        """
+        image_hash = self.compute_image_hash(image_bytes)
+        try:
+            self.backend.set_description(StoredDescription(
+                description_key=f"{image_hash}:{variant.description_key}",
+                image_hash=image_hash,
+                description=description,
+                model_used=model_used,
+                model_fallback_used=model_fallback_used,
+            ))
+            return True
         except Exception as e:
-            logger.warning(f"Error updating cache access metadata: {e}")
+            logger.error(f"Error storing cached description: {e}")
+            return False
+
+    def _update_access(self, cache_key: str):
+        """Record a cache hit without touching the backend"""
+        self._access_tracker.record(cache_key)
+
+    def _flush_access(self, rows: List[Tuple[str, int, str]]):
+        """Persist a batch of buffered hits"""
+        self.backend.record_access(rows)
+        logger.debug(f"Flushed access metadata for {len(rows)} cache entries")
 
-    def _delete(self, image_hash: str):
+    def _delete(self, cache_key: str, image_hash: str):
         """Delete a cache entry"""
         try:
-            with self._lock:
-                with sqlite3.connect(self.db_path) as conn:
-                    conn.execute("DELETE FROM analysis_cache WHERE image_hash = ?", (image_hash,))
-                    conn.commit()
+            self._delete_batch([(cache_key, image_hash)])
         except Exception as e:
             logger.warning(f"Error deleting cache entry: {e}")
 
+    @staticmethod
+    def _timestamp(moment: datetime) -> str:
+        """Format like SQLite's CURRENT_TIMESTAMP so string comparisons order correctly"""
+        return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+    def _delete_batch(self, rows: List[Tuple[str, str]]):
+        """
+        Delete (cache_key, image_hash) rows from the backend and local tiers
+
+        Images left without any variant also lose their shared descriptions and
+        their perceptual-hash index entry.
+        """
+        orphaned = self.backend.delete_many(rows)
+
+        for cache_key, _ in rows:
+            self._access_tracker.discard(cache_key)
+            self._l1.invalidate(cache_key)
+        for image_hash in orphaned:
+            self._phash_index.remove(image_hash)
+
     def clear_expired(self) -> int:
         """
-        Remove all expired cache entries
+        Remove all expired cache entries in small batches
+
+        Entries are only removed once their stale-while-revalidate window has
+        passed too. Backends that expire entries themselves (key TTLs) only get
+        the local hot tier purged.
 
         Returns:
             Number of entries deleted
         """
         try:
-            cutoff_date = (datetime.utcnow() - timedelta(days=self.max_age_days)).isoformat()
-
-            with self._lock:
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.execute(
-                        "DELETE FROM analysis_cache WHERE created_at < ?",
-                        (cutoff_date,)
-                    )
-                    conn.commit()
-                    deleted = cursor.rowcount
+            now = datetime.utcnow()
+            expired_before = self._timestamp(now - timedelta(seconds=self.stale_while_revalidate_seconds))
+            deleted = 0
+
+            if not self.backend.enforces_limits:
+                while True:
+                    rows = self.backend.expired_batch(expired_before, self.eviction_batch_size)
+                    if not rows:
+                        break
+                    self._delete_batch(rows)
+                    deleted += len(rows)
+
+                self.backend.delete_expired_descriptions(
+                    self._timestamp(now - timedelta(days=self.max_age_days))
+                )
+            self._l1.purge_expired()
 
             logger.info(f"Cleaned {deleted} expired cache entries")
             return deleted
@@ -220,39 +828,113 @@ class ImageAnalysisCache:
             logger.error(f"Error clearing expired cache: {e}")
             return 0
 
+    def _maybe_evict(self, writes: int = 1):
+        """Check the size limits every eviction_check_every writes"""
+        self._writes_since_eviction += writes
+        if self._writes_since_eviction >= self.eviction_check_every:
+            self._writes_since_eviction = 0
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Enforce max_entries/max_bytes using the configured policy
+
+        Victims are picked through the accessed_at / access_count indexes and
+        deleted eviction_batch_size rows per transaction, so the write lock is only
+        held briefly even when a large backlog has to go. Backends that bound
+        their own size (e.g. Redis maxmemory-policy) are left alone.
+
+        Returns:
+            Number of entries evicted
+        """
+        if self.backend.enforces_limits or (self.max_entries <= 0 and self.max_bytes <= 0):
+            return 0
+        if not self._eviction_lock.acquire(blocking=False):
+            return 0  # another thread is already evicting
+
+        try:
+            # Victim order depends on accessed_at/access_count, so persist buffered hits first
+            self._access_tracker.flush()
+            entries, total_bytes = self.backend.totals()
+            excess_entries = entries - self.max_entries if self.max_entries > 0 else 0
+            excess_bytes = total_bytes - self.max_bytes if self.max_bytes > 0 else 0
+
+            evicted = 0
+            while excess_entries > 0 or excess_bytes > 0:
+                candidates = self.backend.eviction_candidates(self.eviction_policy, self.eviction_batch_size)
+                if not candidates:
+                    break
+
+                victims = []
+                for cache_key, image_hash, size_bytes in candidates:
+                    if excess_entries <= 0 and excess_bytes <= 0:
+                        break
+                    victims.append((cache_key, image_hash))
+                    excess_entries -= 1
+                    excess_bytes -= size_bytes
+
+                self._delete_batch(victims)
+                evicted += len(victims)
+
+            if evicted:
+                self._evicted += evicted
+                logger.info(f"Evicted {evicted} cache entries ({self.eviction_policy})")
+            return evicted
+
+        except Exception as e:
+            logger.error(f"Error evicting cache entries: {e}")
+            return 0
+        finally:
+            self._eviction_lock.release()
+
+    def _lookup_stats(self) -> dict:
+        """In-process hit/miss counters since startup"""
+        lookups = self._exact_hits + self._near_hits + self._misses
+        hits = self._exact_hits + self._near_hits
+        return {
+            "exact_hits": self._exact_hits,
+            "near_hits": self._near_hits,
+            "misses": self._misses,
+            "l1_hits": self._l1_hits,
+            "l2_hits": self._l2_hits,
+            "l1_entries": len(self._l1),
+            "l1_bytes": self._l1.total_bytes,
+            "shared_description_hits": self._description_hits,
+            "stale_hits": self._stale_hits,
+            "background_refreshes": self._refreshes,
+            "background_refresh_failures": self._refresh_failures,
+            "refreshes_in_flight": len(self._refreshing),
+            "stale_while_revalidate_seconds": self.stale_while_revalidate_seconds,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "near_duplicate_distance": self.near_duplicate_distance,
+            "phash_indexed_entries": len(self._phash_index),
+            "evicted_entries": self._evicted,
+            "eviction_policy": self.eviction_policy,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "backend": self.backend.name,
+        }
+
     def get_stats(self) -> dict:
-        """Get cache statistics"""
+        """Get cache statistics, aggregated by the backend (e.g. over all shards)"""
+        # Include hits still sitting in the write-behind buffer
+        self._access_tracker.flush()
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute(
-                    """
-                    SELECT
-                        COUNT(*) as total_entries,
-                        SUM(access_count) as total_accesses,
-                        AVG(access_count) as avg_accesses,
-                        MIN(created_at) as oldest_entry,
-                        MAX(accessed_at) as most_recent_access
-                    FROM analysis_cache
-                    """
-                )
-                row = cursor.fetchone()
-
-                if row:
-                    return {
-                        "total_entries": row[0] or 0,
-                        "total_accesses": row[1] or 0,
-                        "avg_accesses_per_entry": round(row[2] or 0, 2),
-                        "oldest_entry": row[3],
-                        "most_recent_access": row[4]
-                    }
-                return {
-                    "total_entries": 0,
-                    "total_accesses": 0,
-                    "avg_accesses_per_entry": 0,
-                    "oldest_entry": None,
-                    "most_recent_access": None
-                }
+            stats = self.backend.stats()
+            total_entries = stats["total_entries"]
+            stats["avg_accesses_per_entry"] = (
+                round(stats["total_accesses"] / total_entries, 2) if total_entries else 0
+            )
+            return {**stats, **self._lookup_stats()}
 
         except Exception as e:
             logger.error(f"Error getting cache stats: {e}")
-            return {}
+            return self._lookup_stats()
+
+    def close(self):
+        """Flush buffered access metadata and close backend connections"""
+        # Pending refreshes are dropped; running ones finish before the backend closes
+        self._refresh_pool.shutdown(wait=True, cancel_futures=True)
+        self._access_tracker.close()
+        self._l1.clear()
+        self.backend.close()
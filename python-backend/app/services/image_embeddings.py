@@ -0,0 +1,363 @@
+"""
+Image embeddings for semantic similarity search over analyzed images
+A CPU-friendly CLIP image encoder produces L2-normalized vectors that are kept
+in a compact float16 matrix with an image-hash id map, so visually similar
+assets can reuse existing analyses and prompts instead of re-running the
+vision model
+"""
+
+import io
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.config import (
+    IMAGE_EMBEDDING_DEVICE,
+    IMAGE_EMBEDDING_FLUSH_EVERY,
+    IMAGE_EMBEDDING_MODEL,
+)
+from app.services.image_cache import ImageAnalysisCache
+
+try:
+    import torch
+    from transformers import CLIPModel, CLIPProcessor
+except ImportError:  # optional, only needed when IMAGE_EMBEDDINGS_ENABLED
+    torch = None
+    CLIPModel = CLIPProcessor = None
+
+logger = logging.getLogger(__name__)
+
+# Rows converted to float32 per matrix-vector product during search; bounds the
+# temporary memory while still letting BLAS do the work
+_SEARCH_BLOCK_ROWS = 8192
+
+
+class ClipImageEncoder:
+    """Lazily loaded CLIP image tower returning L2-normalized float32 vectors"""
+
+    def __init__(self, model_name: str = IMAGE_EMBEDDING_MODEL, device: str = IMAGE_EMBEDDING_DEVICE):
+        self.model_name = model_name
+        self.device = device
+        self._model = None
+        self._processor = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return CLIPModel is not None
+
+    def _load(self):
+        if self._model is None:
+            if not self.available:
+                raise RuntimeError("torch and transformers are required for image embeddings")
+            logger.info(f"Loading image embedding model {self.model_name} on {self.device}")
+            self._processor = CLIPProcessor.from_pretrained(self.model_name)
+            self._model = CLIPModel.from_pretrained(self.model_name).to(self.device).eval()
+
+    def encode(self, images: Sequence[bytes]) -> np.ndarray:
+        """
+        Embed a batch of images
+
+        Returns:
+            (len(images), dim) float32 array of unit vectors
+        """
+        pil_images = [Image.open(io.BytesIO(image_bytes)).convert("RGB") for image_bytes in images]
+        with self._lock:
+            self._load()
+            inputs = self._processor(images=pil_images, return_tensors="pt").to(self.device)
+            with torch.inference_mode():
+                features = self._model.get_image_features(**inputs)
+        vectors = features.float().cpu().numpy()
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class EmbeddingIndex:
+    """
+    Float16 embedding matrix with an image-hash id map
+
+    Stored as <path>.npy (the matrix) and <path>.json (model name and row ids).
+    Rows are unit vectors, so cosine similarity is a single matrix-vector
+    product. Several processes may share the files: save() merges rows other
+    processes wrote since this one loaded them.
+    """
+
+    def __init__(self, path: Path, model_name: str):
+        """
+        Args:
+            path: File path without suffix for the matrix and id map
+            model_name: Encoder the vectors come from; a stored index built with
+                another model is discarded
+        """
+        self.path = Path(path)
+        self.model_name = model_name
+        self._matrix = np.zeros((0, 0), dtype=np.float16)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._dirty = 0
+        self._lock = threading.RLock()
+        self._load()
+
+    @property
+    def _matrix_path(self) -> Path:
+        return self.path.with_suffix(".npy")
+
+    @property
+    def _ids_path(self) -> Path:
+        return self.path.with_suffix(".json")
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, image_hash: str) -> bool:
+        return image_hash in self._rows
+
+    @property
+    def dim(self) -> int:
+        return self._matrix.shape[1]
+
+    @property
+    def dirty(self) -> int:
+        """Rows added or replaced since the last save"""
+        return self._dirty
+
+    def _read_files(self) -> Optional[Tuple[np.ndarray, List[str]]]:
+        """Stored (matrix, ids), or None if missing, unreadable or from another model"""
+        if not self._matrix_path.exists() or not self._ids_path.exists():
+            return None
+        try:
+            meta = json.loads(self._ids_path.read_text(encoding="utf-8"))
+            matrix = np.load(self._matrix_path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable embedding index {self.path}: {e}")
+            return None
+        ids = meta.get("ids", [])
+        if meta.get("model") != self.model_name or matrix.ndim != 2 or matrix.shape[0] != len(ids):
+            logger.warning(f"Ignoring embedding index {self.path} built for {meta.get('model')}")
+            return None
+        return matrix.astype(np.float16, copy=False), ids
+
+    def _load(self):
+        stored = self._read_files()
+        if stored:
+            self._matrix, self._ids = stored
+            self._rows = {image_hash: row for row, image_hash in enumerate(self._ids)}
+            logger.info(f"Loaded {len(self._ids)} image embeddings from {self._matrix_path}")
+
+    def add_many(self, image_hashes: Sequence[str], vectors: np.ndarray):
+        """
+        Insert or replace the vectors of image_hashes (rows of vectors)
+
+        A hash repeated within the batch keeps its last vector. The new matrix
+        is built before the id map changes, so a failure leaves the index as it was.
+        """
+        vectors = np.asarray(vectors, dtype=np.float16)
+        if vectors.ndim != 2 or vectors.shape[0] != len(image_hashes):
+            raise ValueError(f"Expected {len(image_hashes)} embedding rows, got shape {vectors.shape}")
+        batch = dict(zip(image_hashes, range(len(image_hashes))))
+        with self._lock:
+            if self._ids and vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} != index dimension {self.dim}")
+
+            added = [image_hash for image_hash in batch if image_hash not in self._rows]
+            replaced = [image_hash for image_hash in batch if image_hash in self._rows]
+            matrix = self._matrix if self._ids else np.zeros((0, vectors.shape[1]), dtype=np.float16)
+            matrix = np.concatenate([matrix, vectors[[batch[image_hash] for image_hash in added]]])
+            if replaced:
+                matrix[[self._rows[image_hash] for image_hash in replaced]] = (
+                    vectors[[batch[image_hash] for image_hash in replaced]]
+                )
+
+            self._matrix = matrix
+            for image_hash in added:
+                self._rows[image_hash] = len(self._ids)
+                self._ids.append(image_hash)
+            self._dirty += len(batch)
+
+    def get(self, image_hash: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._rows.get(image_hash)
+            return None if row is None else self._matrix[row].astype(np.float32)
+
+    def search(self, query: np.ndarray, top_k: int = 10, exclude: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        """
+        Top-k cosine similarity search
+
+        Args:
+            query: Unit vector of the index dimension
+            top_k: Number of results
+            exclude: Image hashes to leave out (e.g. the query image itself)
+
+        Returns:
+            (image_hash, score) pairs, best first
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        with self._lock:
+            if not self._ids or top_k <= 0:
+                return []
+
+            scores = np.empty(len(self._ids), dtype=np.float32)
+            for start in range(0, len(self._ids), _SEARCH_BLOCK_ROWS):
+                block = self._matrix[start:start + _SEARCH_BLOCK_ROWS].astype(np.float32)
+                scores[start:start + len(block)] = block @ query
+
+            for image_hash in exclude:
+                row = self._rows.get(image_hash)
+                if row is not None:
+                    scores[row] = -np.inf
+
+            k = min(top_k, len(scores))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [(self._ids[row], float(scores[row])) for row in best if np.isfinite(scores[row])]
+
+    def save(self):
+        """Write the matrix and id map atomically, merging rows stored by other processes"""
+        with self._lock:
+            stored = self._read_files()
+            if stored:
+                matrix, ids = stored
+                missing = [
+                    row for row, image_hash in enumerate(ids)
+                    if image_hash not in self._rows
+                ]
+                if missing and matrix.shape[1] == self.dim:
+                    self.add_many([ids[row] for row in missing], matrix[missing])
+            if not self._ids and not stored:
+                return
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            matrix_tmp = self._matrix_path.with_suffix(f".{os.getpid()}.tmp.npy")
+            ids_tmp = self._ids_path.with_suffix(f".{os.getpid()}.tmp")
+            np.save(matrix_tmp, self._matrix)
+            ids_tmp.write_text(
+                json.dumps({"model": self.model_name, "dim": self.dim, "ids": self._ids}),
+                encoding="utf-8",
+            )
+            os.replace(matrix_tmp, self._matrix_path)
+            os.replace(ids_tmp, self._ids_path)
+            self._dirty = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._matrix.nbytes
+
+
+class ImageEmbeddingService:
+    """
+    Embeds analyzed images in the background and answers similarity queries
+
+    Vectors are keyed by the same MD5 image hash as the analysis cache, so a
+    search result can be joined with cached analyses for any variant.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        encoder: Optional[ClipImageEncoder] = None,
+        flush_every: int = IMAGE_EMBEDDING_FLUSH_EVERY
+    ):
+        """
+        Args:
+            cache_dir: Directory holding image_embeddings.npy/.json
+            encoder: Image encoder (default: CLIP model from IMAGE_EMBEDDING_MODEL)
+            flush_every: Save the index after this many new vectors
+        """
+        self.encoder = encoder or ClipImageEncoder()
+        self.index = EmbeddingIndex(Path(cache_dir) / "image_embeddings", self.encoder.model_name)
+        self.flush_every = max(flush_every, 1)
+        self._pending: Set[str] = set()
+        self._pending_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-embed")
+        self._embedded = 0
+        self._failures = 0
+
+    def index_async(self, image_bytes: bytes, image_hash: Optional[str] = None):
+        """Queue an image for embedding unless it is already indexed or queued"""
+        image_hash = image_hash or ImageAnalysisCache.compute_image_hash(image_bytes)
+        if image_hash in self.index:
+            return
+        with self._pending_lock:
+            if image_hash in self._pending:
+                return
+            self._pending.add(image_hash)
+        try:
+            self._pool.submit(self._index_one, image_hash, image_bytes)
+        except RuntimeError:
+            # Executor already shut down (service closing)
+            with self._pending_lock:
+                self._pending.discard(image_hash)
+
+    def _index_one(self, image_hash: str, image_bytes: bytes):
+        try:
+            self.index_many([(image_hash, image_bytes)])
+        except Exception as e:
+            self._failures += 1
+            logger.warning(f"Failed to embed image {image_hash[:8]}: {e}")
+        finally:
+            with self._pending_lock:
+                self._pending.discard(image_hash)
+
+    def index_many(self, images: Sequence[Tuple[str, bytes]]) -> int:
+        """Embed (image_hash, image_bytes) pairs synchronously in one batch"""
+        if not images:
+            return 0
+        vectors = self.encoder.encode([image_bytes for _, image_bytes in images])
+        self.index.add_many([image_hash for image_hash, _ in images], vectors)
+        self._embedded += len(images)
+        if self.index.dirty >= self.flush_every:
+            self.index.save()
+        return len(images)
+
+    def similar(
+        self,
+        image_bytes: Optional[bytes] = None,
+        image_hash: Optional[str] = None,
+        top_k: int = 10
+    ) -> Tuple[Optional[str], List[Tuple[str, float]]]:
+        """
+        Find indexed images similar to an uploaded image or an indexed image hash
+
+        Returns:
+            Tuple of (query image hash, [(image_hash, score), ...] best first);
+            the query image itself is never part of the results
+        """
+        if image_bytes is not None:
+            image_hash = ImageAnalysisCache.compute_image_hash(image_bytes)
+            query = self.index.get(image_hash)
+            if query is None:
+                query = self.encoder.encode([image_bytes])[0]
+        elif image_hash:
+            query = self.index.get(image_hash)
+            if query is None:
+                raise KeyError(image_hash)
+        else:
+            raise ValueError("An image or an image_hash is required")
+        return image_hash, self.index.search(query, top_k, exclude=(image_hash,))
+
+    def get_stats(self) -> dict:
+        return {
+            "model": self.encoder.model_name,
+            "encoder_available": self.encoder.available,
+            "indexed_images": len(self.index),
+            "dimension": self.index.dim,
+            "matrix_bytes": self.index.size_bytes,
+            "embedded_this_session": self._embedded,
+            "embedding_failures": self._failures,
+            "pending": len(self._pending),
+        }
+
+    def close(self):
+        """Finish queued embeddings and persist the index"""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        try:
+            self.index.save()
+        except Exception as e:
+            logger.warning(f"Could not save embedding index: {e}")
@@ -0,0 +1,318 @@
+"""
+Local pre-analysis of images for the structured ImageContext fields
+Palette, lighting, composition and camera details come from vectorized NumPy
+passes over a downsampled copy of the image (plus its EXIF) in milliseconds,
+so they no longer depend on the vision model or stay as placeholders
+"""
+
+import io
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from app.config import IMAGE_PALETTE_COLORS
+
+logger = logging.getLogger(__name__)
+
+# Longest side the image is reduced to before any statistics are computed
+_ANALYSIS_SIDE = 128
+_KMEANS_ITERATIONS = 12
+
+# Reference colors for naming palette entries
+_COLOR_NAMES = {
+    "black": (20, 20, 20),
+    "charcoal": (64, 64, 64),
+    "gray": (128, 128, 128),
+    "silver": (192, 192, 192),
+    "white": (245, 245, 245),
+    "red": (200, 30, 30),
+    "maroon": (110, 20, 30),
+    "pink": (240, 150, 180),
+    "orange": (240, 130, 30),
+    "brown": (120, 75, 40),
+    "beige": (220, 200, 160),
+    "gold": (215, 170, 40),
+    "yellow": (240, 220, 50),
+    "olive": (120, 120, 40),
+    "green": (50, 150, 60),
+    "dark green": (20, 70, 35),
+    "teal": (30, 130, 130),
+    "cyan": (80, 200, 220),
+    "sky blue": (130, 190, 235),
+    "blue": (40, 80, 200),
+    "navy": (20, 30, 80),
+    "purple": (110, 50, 150),
+    "lavender": (180, 160, 220),
+    "magenta": (200, 40, 160),
+}
+_NAMES = list(_COLOR_NAMES)
+_REFERENCE = np.array([_COLOR_NAMES[name] for name in _NAMES], dtype=np.float32)
+
+# Common aspect ratios, for naming the frame
+_ASPECT_RATIOS = {"1:1": 1.0, "5:4": 1.25, "4:3": 4 / 3, "3:2": 1.5, "16:10": 1.6, "16:9": 16 / 9, "21:9": 21 / 9}
+
+_EXIF_ORIENTATION = 0x0112
+_EXIF_IFD = 0x8769
+_EXIF_TAGS = {
+    "camera_make": 0x010F,
+    "camera_model": 0x0110,
+    "software": 0x0131,
+}
+_EXIF_IFD_TAGS = {
+    "lens": 0xA434,
+    "aperture": 0x829D,
+    "exposure_time": 0x829A,
+    "iso": 0x8827,
+    "focal_length": 0x920A,
+    "captured_at": 0x9003,
+}
+
+
+@dataclass
+class PreAnalysis:
+    """ImageContext fields computed locally"""
+
+    palette_hex: List[str] = field(default_factory=list)
+    colors: List[str] = field(default_factory=list)
+    lighting: str = ""
+    composition: str = ""
+    technical_details: Dict[str, str] = field(default_factory=dict)
+    seconds: float = 0.0
+
+
+def _nearest(pixels: np.ndarray, sq_norms: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, one matrix product instead of an (n, k, 3) array
+    distances = sq_norms[:, None] - 2 * pixels @ centers.T + (centers ** 2).sum(axis=1)[None, :]
+    return distances.argmin(axis=1)
+
+
+def kmeans_palette(pixels: np.ndarray, k: int, iterations: int = _KMEANS_ITERATIONS):
+    """
+    Dominant colors of an (n, 3) float32 pixel array
+
+    k-means++ seeding with a fixed seed (results are reproducible), then Lloyd
+    iterations; each step is a matrix product plus per-channel bincounts.
+
+    Returns:
+        (centers, shares) sorted by share, largest first; clusters under 1% are dropped
+    """
+    rng = np.random.default_rng(0)
+    k = max(1, min(k, len(pixels)))
+    centers = [pixels[rng.integers(len(pixels))]]
+    closest = ((pixels - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        total = closest.sum()
+        if total <= 0:
+            break
+        centers.append(pixels[rng.choice(len(pixels), p=closest / total)])
+        closest = np.minimum(closest, ((pixels - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers, dtype=np.float32)
+
+    sq_norms = (pixels ** 2).sum(axis=1)
+    for _ in range(iterations):
+        labels = _nearest(pixels, sq_norms, centers)
+        counts = np.bincount(labels, minlength=len(centers))
+        sums = np.stack(
+            [np.bincount(labels, weights=pixels[:, channel], minlength=len(centers)) for channel in range(3)],
+            axis=1,
+        )
+        updated = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers).astype(np.float32)
+        converged = np.abs(updated - centers).max() < 0.5
+        centers = updated
+        if converged:
+            break
+
+    labels = _nearest(pixels, sq_norms, centers)
+    shares = np.bincount(labels, minlength=len(centers)) / len(pixels)
+    order = [index for index in np.argsort(-shares) if shares[index] >= 0.01]
+    return centers[order], shares[order]
+
+
+def _color_name(rgb: np.ndarray) -> str:
+    # Weighted RGB distance ("redmean"), a cheap approximation of perceived difference
+    mean_red = (_REFERENCE[:, 0] + rgb[0]) / 2
+    diff = _REFERENCE - rgb
+    distance = (2 + mean_red / 256) * diff[:, 0] ** 2 + 4 * diff[:, 1] ** 2 + (2 + (255 - mean_red) / 256) * diff[:, 2] ** 2
+    return _NAMES[int(distance.argmin())]
+
+
+def _describe_lighting(rgb: np.ndarray) -> str:
+    luminance = rgb @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+    mean = float(luminance.mean()) / 255
+    contrast = float(luminance.std()) / 255
+    shadows = float((luminance < 16).mean())
+    highlights = float((luminance > 239).mean())
+
+    if mean < 0.3:
+        key = "Low-key (dark) lighting"
+    elif mean > 0.7:
+        key = "High-key (bright) lighting"
+    else:
+        key = "Evenly exposed lighting"
+    if contrast > 0.28:
+        contrast_label = "high contrast"
+    elif contrast < 0.12:
+        contrast_label = "soft, low contrast"
+    else:
+        contrast_label = "moderate contrast"
+
+    red, _, blue = rgb.reshape(-1, 3).mean(axis=0)
+    if red - blue > 12:
+        temperature = "warm"
+    elif blue - red > 12:
+        temperature = "cool"
+    else:
+        temperature = "neutral"
+
+    description = (
+        f"{key}, {contrast_label}, {temperature} tones "
+        f"(mean luminance {mean:.0%}, contrast {contrast:.2f})"
+    )
+    clipped = []
+    if shadows > 0.05:
+        clipped.append(f"{shadows:.0%} crushed shadows")
+    if highlights > 0.05:
+        clipped.append(f"{highlights:.0%} blown highlights")
+    return description + (f"; {', '.join(clipped)}" if clipped else "")
+
+
+def _describe_composition(gray: np.ndarray, width: int, height: int) -> str:
+    ratio = width / height if height else 1.0
+    if abs(ratio - 1) < 0.03:
+        orientation = "square"
+    else:
+        orientation = "landscape" if ratio > 1 else "portrait"
+    wide = max(ratio, 1 / ratio) if ratio else 1.0
+    aspect_name, aspect_value = min(_ASPECT_RATIOS.items(), key=lambda item: abs(item[1] - wide))
+    aspect = aspect_name if abs(aspect_value - wide) < 0.05 else f"{wide:.2f}:1"
+    if ratio < 1:
+        aspect = ":".join(reversed(aspect.split(":")))
+
+    if gray.shape[0] < 2 or gray.shape[1] < 2:
+        # A single row or column has no 2-D gradient to locate detail in
+        return f"{orientation.capitalize()} frame ({aspect})"
+
+    # Saliency hint: gradient energy, where edges and detail concentrate
+    gy, gx = np.gradient(gray)
+    energy = np.hypot(gx, gy)
+    total = energy.sum()
+    if total <= 0:
+        return f"{orientation.capitalize()} frame ({aspect}), flat image without a distinct focal area"
+
+    rows, cols = energy.shape
+    cy = float((energy.sum(axis=1) * np.arange(rows)).sum() / total) / max(rows - 1, 1)
+    cx = float((energy.sum(axis=0) * np.arange(cols)).sum() / total) / max(cols - 1, 1)
+    vertical = "upper" if cy < 1 / 3 else "lower" if cy > 2 / 3 else "middle"
+    horizontal = "left" if cx < 1 / 3 else "right" if cx > 2 / 3 else "center"
+    position = "center" if (vertical, horizontal) == ("middle", "center") else f"{vertical} {horizontal}"
+
+    # Share of the detail inside the central ninth: high means one subject, low means spread out
+    central = energy[rows // 3: 2 * rows // 3, cols // 3: 2 * cols // 3].sum() / total
+    thirds = min(abs(cx - t) for t in (1 / 3, 2 / 3)) < 0.08 or min(abs(cy - t) for t in (1 / 3, 2 / 3)) < 0.08
+    # Detail mirrored left to right lands where detail already is
+    symmetry = 1 - float(np.abs(energy - energy[:, ::-1]).sum()) / (2 * total)
+
+    notes = [f"visual weight in the {position}"]
+    if central > 0.3:
+        notes.append("centered subject")
+    elif central < 0.1:
+        notes.append("detail spread across the frame")
+    if thirds:
+        notes.append("focal point near a rule-of-thirds line")
+    if symmetry > 0.8:
+        notes.append("near-symmetrical left to right")
+    return f"{orientation.capitalize()} frame ({aspect}), " + ", ".join(notes)
+
+
+def _format_exif(name: str, value) -> Optional[str]:
+    try:
+        if name == "aperture":
+            return f"f/{float(value):.1f}"
+        if name == "exposure_time":
+            seconds = float(value)
+            return f"1/{round(1 / seconds)} s" if 0 < seconds < 1 else f"{seconds:g} s"
+        if name == "iso":
+            return f"ISO {value[0] if isinstance(value, tuple) else value}"
+        if name == "focal_length":
+            return f"{float(value):g} mm"
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    text = str(value).strip("\x00 ").strip()
+    return text or None
+
+
+def _technical_details(image: Image.Image, width: int, height: int, image_bytes: bytes) -> Dict[str, str]:
+    details = {
+        "width": str(width),
+        "height": str(height),
+        "megapixels": f"{width * height / 1e6:.1f}",
+        "format": image.format or "unknown",
+        "color_mode": image.mode,
+        "file_size_kb": f"{len(image_bytes) / 1024:.0f}",
+    }
+    exif = image.getexif()
+    sources = [(_EXIF_TAGS, exif), (_EXIF_IFD_TAGS, exif.get_ifd(_EXIF_IFD))]
+    for tags, values in sources:
+        for name, tag in tags.items():
+            if tag in values:
+                formatted = _format_exif(name, values[tag])
+                if formatted:
+                    details[name] = formatted
+    return details
+
+
+def preanalyze(image_bytes: bytes, palette_size: int = IMAGE_PALETTE_COLORS) -> PreAnalysis:
+    """
+    Compute palette, colors, lighting, composition and technical details
+
+    Args:
+        image_bytes: Original upload
+        palette_size: Number of dominant colors to extract
+
+    Returns:
+        PreAnalysis (empty fields if the image cannot be decoded)
+    """
+    started = time.perf_counter()
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        width, height = image.size
+        if image.getexif().get(_EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+            # Rotated 90 degrees on display; describe the frame as it is shown
+            width, height = height, width
+        technical_details = _technical_details(image, width, height, image_bytes)
+        if image.format == "JPEG":
+            # Decode at reduced DCT scale; statistics only need a small copy
+            image.draft("RGB", (_ANALYSIS_SIDE * 2, _ANALYSIS_SIDE * 2))
+        small = ImageOps.exif_transpose(image)
+        if small.mode in ("RGBA", "LA") or (small.mode == "P" and "transparency" in small.info):
+            rgba = small.convert("RGBA")
+            small = Image.new("RGB", rgba.size, (255, 255, 255))
+            small.paste(rgba, mask=rgba.getchannel("A"))
+        small = small.convert("RGB")
+        small.thumbnail((_ANALYSIS_SIDE, _ANALYSIS_SIDE), Image.Resampling.BILINEAR)
+        rgb = np.asarray(small, dtype=np.float32)
+    except Exception as e:
+        logger.debug(f"Pre-analysis could not decode image: {e}")
+        return PreAnalysis(seconds=time.perf_counter() - started)
+
+    centers, shares = kmeans_palette(rgb.reshape(-1, 3), palette_size)
+    palette_hex = ["#{:02x}{:02x}{:02x}".format(*np.clip(np.rint(center), 0, 255).astype(int)) for center in centers]
+    colors = []
+    for center, share in zip(centers, shares):
+        name = _color_name(center)
+        if not any(entry.startswith(f"{name} (") for entry in colors):
+            colors.append(f"{name} ({share:.0%})")
+
+    gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    return PreAnalysis(
+        palette_hex=palette_hex,
+        colors=colors,
+        lighting=_describe_lighting(rgb.reshape(-1, 3)),
+        composition=_describe_composition(gray, width, height),
+        technical_details=technical_details,
+        seconds=time.perf_counter() - started,
+    )
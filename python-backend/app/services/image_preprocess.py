@@ -0,0 +1,180 @@
+"""
+Vision-model input preparation
+Vision models downsample every image to their native resolution anyway, so
+uploads are decoded at reduced scale (JPEG draft mode), resized to the target
+model's input size and re-encoded as compact JPEG before base64, instead of
+shipping the original (up to 50 MB) in the JSON body
+"""
+
+import io
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps
+
+from app.config import VISION_IMAGE_MAX_SIDE, VISION_IMAGE_MAX_SIDES, VISION_IMAGE_QUALITY
+
+logger = logging.getLogger(__name__)
+
+# Longest side each model family actually looks at, matched as a case-insensitive
+# name prefix (longest prefix wins): LLaVA 1.6 tiles 336px crops up to 672px,
+# Llama 3.2 Vision uses up to 2x2 tiles of 560px, Qwen-VL has a dynamic
+# resolution where ~1024px keeps the visual token count reasonable.
+DEFAULT_MODEL_MAX_SIDES: Dict[str, int] = {
+    "llava-phi": 336,
+    "llava": 672,
+    "bakllava": 672,
+    "llama3.2-vision": 1120,
+    "qwen": 1024,
+    "gemma3": 896,
+    "moondream": 378,
+    "minicpm-v": 1344,
+}
+
+_EXIF_ORIENTATION = 0x0112
+
+
+def _parse_model_max_sides(spec: str) -> Dict[str, int]:
+    """Parse "llava=672,qwen3-vl=1024" into a prefix -> size map"""
+    sizes = {}
+    for item in spec.split(","):
+        prefix, _, size = item.partition("=")
+        if prefix.strip() and size.strip().isdigit():
+            sizes[prefix.strip().lower()] = int(size)
+    return sizes
+
+
+MODEL_MAX_SIDES: Dict[str, int] = {**DEFAULT_MODEL_MAX_SIDES, **_parse_model_max_sides(VISION_IMAGE_MAX_SIDES)}
+
+
+def max_side_for_model(model: Optional[str]) -> int:
+    """Target longest side in pixels for a vision model"""
+    name = (model or "").lower()
+    matches = [prefix for prefix in MODEL_MAX_SIDES if name.startswith(prefix)]
+    return MODEL_MAX_SIDES[max(matches, key=len)] if matches else VISION_IMAGE_MAX_SIDE
+
+
+@dataclass
+class PreparedImage:
+    """Image bytes ready for a vision model, with what preparing them saved"""
+
+    data: bytes
+    width: int
+    height: int
+    original_bytes: int
+    reencoded: bool
+    seconds: float
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - len(self.data)
+
+
+def prepare_image(image_bytes: bytes, max_side: int, quality: int = VISION_IMAGE_QUALITY) -> PreparedImage:
+    """
+    Fit an image within max_side x max_side and re-encode it as JPEG
+
+    JPEGs that already fit and need no EXIF rotation are passed through
+    untouched, as is anything whose re-encoded form would not be smaller
+    (e.g. flat-colour PNG graphics); the model downsamples those itself.
+    Undecodable input is passed through as well; the model reports the error.
+
+    Args:
+        image_bytes: Original upload
+        max_side: Longest side of the result in pixels
+        quality: JPEG quality of the re-encoded image
+
+    Returns:
+        PreparedImage with the bytes to send
+    """
+    started = time.perf_counter()
+
+    def passthrough(width: int = 0, height: int = 0) -> PreparedImage:
+        return PreparedImage(
+            data=image_bytes,
+            width=width,
+            height=height,
+            original_bytes=len(image_bytes),
+            reencoded=False,
+            seconds=time.perf_counter() - started,
+        )
+
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        width, height = image.size
+        rotated = image.getexif().get(_EXIF_ORIENTATION, 1) != 1
+        fits = max(width, height) <= max_side
+        if fits and not rotated and image.format == "JPEG":
+            return passthrough(width, height)
+
+        if image.format == "JPEG":
+            # Decode straight at the smallest DCT scale still >= max_side, far
+            # cheaper than decoding the full image and shrinking it afterwards
+            image.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            # JPEG has no alpha; flatten onto white like most viewers show it
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        image.thumbnail((max_side, max_side), Image.Resampling.BICUBIC)
+
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality)
+        data = output.getvalue()
+    except Exception as e:
+        logger.debug(f"Could not prepare image for the vision model, sending original: {e}")
+        return passthrough()
+
+    if len(data) >= len(image_bytes) and not rotated:
+        return passthrough(width, height)
+
+    return PreparedImage(
+        data=data,
+        width=image.width,
+        height=image.height,
+        original_bytes=len(image_bytes),
+        reencoded=True,
+        seconds=time.perf_counter() - started,
+    )
+
+
+class VisionInputStats:
+    """Running totals of what input preparation saved, for the stats endpoints"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._images = 0
+        self._reencoded = 0
+        self._original_bytes = 0
+        self._sent_bytes = 0
+        self._seconds = 0.0
+
+    def record(self, prepared: PreparedImage):
+        with self._lock:
+            self._images += 1
+            self._reencoded += prepared.reencoded
+            self._original_bytes += prepared.original_bytes
+            self._sent_bytes += len(prepared.data)
+            self._seconds += prepared.seconds
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            saved = self._original_bytes - self._sent_bytes
+            return {
+                "images": self._images,
+                "reencoded": self._reencoded,
+                "original_bytes": self._original_bytes,
+                "sent_bytes": self._sent_bytes,
+                # base64 inflates every byte sent by 4/3
+                "base64_bytes_saved": saved * 4 // 3,
+                "size_reduction": round(saved / self._original_bytes, 4) if self._original_bytes else 0.0,
+                "avg_prepare_ms": round(self._seconds / self._images * 1000, 2) if self._images else 0.0,
+            }
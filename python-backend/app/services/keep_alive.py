@@ -0,0 +1,150 @@
+"""
+Keep-alive policies for Ollama models
+Every chat request tells Ollama how long to keep its model loaded afterwards:
+a per-model override first, then the residency keep-alive for pinned
+(preloaded) models during residency hours, then the default
+"""
+
+import logging
+import re
+import threading
+from datetime import datetime, time as dt_time
+from typing import Dict, FrozenSet, Iterable, Optional, Union
+
+from app.config import (
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_KEEP_ALIVE_MODELS,
+    OLLAMA_RESIDENCY_HOURS,
+    OLLAMA_RESIDENCY_KEEP_ALIVE,
+    OLLAMA_RESIDENCY_WEEKDAYS,
+)
+
+logger = logging.getLogger(__name__)
+
+KeepAlive = Union[str, int]
+
+_HOURS = re.compile(r"^\s*(\d{1,2}):?(\d{2})?\s*-\s*(\d{1,2}):?(\d{2})?\s*$")
+
+
+def keep_alive_value(text: str) -> Optional[KeepAlive]:
+    """
+    "10m" -> "10m", "-1" -> -1, "" -> None
+
+    Ollama parses string keep-alives as Go durations, so bare numbers
+    (seconds, -1 for forever) have to be sent as JSON numbers
+    """
+    text = (text or "").strip()
+    if not text:
+        return None
+    return int(text) if re.fullmatch(r"-?\d+", text) else text
+
+
+def parse_keep_alive_overrides(spec: str) -> Dict[str, KeepAlive]:
+    """Parse "qwen3-vl=2h,mistral=30m" into a lowercase prefix -> keep_alive map"""
+    overrides = {}
+    for item in spec.split(","):
+        prefix, _, value = item.partition("=")
+        parsed = keep_alive_value(value)
+        if prefix.strip() and parsed is not None:
+            overrides[prefix.strip().lower()] = parsed
+    return overrides
+
+
+def _parse_weekdays(spec: str) -> FrozenSet[int]:
+    """Parse ISO weekdays ("1-5", "1,3,5"; Monday is 1); empty means every day"""
+    days = set()
+    for item in spec.split(","):
+        first, _, last = item.strip().partition("-")
+        if first.isdigit():
+            days.update(range(int(first), int(last if last.isdigit() else first) + 1))
+    return frozenset(day for day in days if 1 <= day <= 7) or frozenset(range(1, 8))
+
+
+class ResidencyHours:
+    """Local-time window ("08:00-20:00", may wrap past midnight) on some weekdays; empty hours mean always"""
+
+    def __init__(self, hours: str = OLLAMA_RESIDENCY_HOURS, weekdays: str = OLLAMA_RESIDENCY_WEEKDAYS):
+        self.weekdays = _parse_weekdays(weekdays)
+        self.start: Optional[dt_time] = None
+        self.end: Optional[dt_time] = None
+        match = _HOURS.match(hours or "")
+        if match:
+            start_hour, start_minute, end_hour, end_minute = match.groups()
+            self.start = dt_time(int(start_hour) % 24, int(start_minute or 0))
+            self.end = dt_time(int(end_hour) % 24, int(end_minute or 0))
+        elif (hours or "").strip():
+            logger.warning(f"Ignoring invalid OLLAMA_RESIDENCY_HOURS {hours!r} (expected HH:MM-HH:MM)")
+
+    def contains(self, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.now()
+        if now.isoweekday() not in self.weekdays:
+            return False
+        if self.start is None:
+            return True
+        current = now.time()
+        if self.start <= self.end:
+            return self.start <= current < self.end
+        return current >= self.start or current < self.end
+
+    def as_dict(self) -> dict:
+        return {
+            "hours": f"{self.start:%H:%M}-{self.end:%H:%M}" if self.start is not None else "always",
+            "weekdays": sorted(self.weekdays),
+            "active_now": self.contains(),
+        }
+
+
+class KeepAlivePolicy:
+    """Resolves the keep_alive sent with each request to a model"""
+
+    def __init__(
+        self,
+        default: str = OLLAMA_KEEP_ALIVE,
+        overrides: str = OLLAMA_KEEP_ALIVE_MODELS,
+        resident: str = OLLAMA_RESIDENCY_KEEP_ALIVE,
+        hours: Optional[ResidencyHours] = None
+    ):
+        self.default = keep_alive_value(default)
+        self.overrides = parse_keep_alive_overrides(overrides)
+        self.resident = keep_alive_value(resident)
+        self.hours = hours or ResidencyHours()
+        self._pinned: FrozenSet[str] = frozenset()
+        self._lock = threading.Lock()
+
+    def pin(self, models: Iterable[str]):
+        """Models kept resident (the preloaded ones)"""
+        with self._lock:
+            self._pinned = frozenset(model.lower() for model in models if model)
+
+    def is_pinned(self, model: str) -> bool:
+        return model.lower() in self._pinned
+
+    def for_model(self, model: str, now: Optional[datetime] = None) -> Optional[KeepAlive]:
+        """keep_alive for a request to model, or None to leave Ollama's default"""
+        name = (model or "").lower()
+        matches = [prefix for prefix in self.overrides if name.startswith(prefix)]
+        if matches:
+            return self.overrides[max(matches, key=len)]
+        if name in self._pinned and self.resident is not None and self.hours.contains(now):
+            return self.resident
+        return self.default
+
+    def as_dict(self) -> dict:
+        return {
+            "default": self.default,
+            "overrides": dict(self.overrides),
+            "resident": self.resident,
+            "pinned": sorted(self._pinned),
+            "residency_hours": self.hours.as_dict(),
+        }
+
+
+_policy: Optional[KeepAlivePolicy] = None
+
+
+def get_keep_alive_policy() -> KeepAlivePolicy:
+    """Process-wide keep-alive policy (from the OLLAMA_KEEP_ALIVE* settings)"""
+    global _policy
+    if _policy is None:
+        _policy = KeepAlivePolicy()
+    return _policy
@@ -1,15 +1,27 @@
 """
 Fallback models for image analysis
 Provides graceful degradation when primary model is unavailable
-Supports: Qwen3-VL -> LLaVA -> CLIP Interrogator
+Supports: Qwen3-VL -> LLaVA (routed by latency and health, optionally hedged) -> CLIP Interrogator
 """
 
+import asyncio
 import base64
 import logging
-import requests
-from typing import Optional, Tuple
-
-from app.config import OLLAMA_BASE_URL
+import time
+from typing import AsyncIterator, List, Optional, Tuple
+
+from app.config import (
+    MODEL_ROUTER_MAX_ATTEMPTS,
+    OLLAMA_BASE_URL,
+    OLLAMA_VISION_TIMEOUT_SECONDS,
+    VISION_IMAGE_PREPROCESS,
+)
+from app.services.clip_fallback import ClipLabelFallback, get_clip_fallback
+from app.services.hedging import AllCandidatesFailed
+from app.services.image_preprocess import VisionInputStats, max_side_for_model, prepare_image
+from app.services.model_registry import ModelRegistry, get_model_registry
+from app.services.model_router import ModelRouter, get_model_router, group_by_tier
+from app.services.ollama_client import OllamaClient, get_ollama_client
 
 logger = logging.getLogger(__name__)
 
@@ -17,51 +29,82 @@ logger = logging.getLogger(__name__)
 class ModelFallbackManager:
     """Manages fallback chain for vision models"""
 
-    def __init__(self, ollama_host: Optional[str] = None):
+    def __init__(
+        self,
+        ollama_host: Optional[str] = None,
+        preprocess_images: bool = VISION_IMAGE_PREPROCESS,
+        client: Optional[OllamaClient] = None,
+        clip_fallback: Optional[ClipLabelFallback] = None,
+        registry: Optional[ModelRegistry] = None,
+        router: Optional[ModelRouter] = None
+    ):
         """
         Initialize fallback manager
 
         Args:
             ollama_host: Ollama server host
+            preprocess_images: Fit images to each model's input size before sending
+            client: Shared Ollama client (default: the process-wide one for ollama_host)
+            clip_fallback: Resident CLIP labeler used when no vision model answers
+            registry: Shared model registry (default: the process-wide one for ollama_host)
+            router: Latency/circuit-breaker router (default: the process-wide one for ollama_host)
         """
         base_host = (ollama_host or OLLAMA_BASE_URL).rstrip("/")
         self.ollama_host = base_host
         self.ollama_chat_url = f"{base_host}/api/chat"
         self.ollama_tags_url = f"{base_host}/api/tags"
-        self._available_models = None
-
-    def get_available_vision_models(self) -> list:
+        self.client = client or get_ollama_client(base_host)
+        self.clip_fallback = clip_fallback or get_clip_fallback()
+        self.registry = registry or get_model_registry(base_host)
+        self.router = router or get_model_router(base_host)
+        self.preprocess_images = preprocess_images
+        self.vision_input_stats = VisionInputStats()
+
+    async def get_available_vision_models(self) -> list:
         """
         Get list of available vision models from Ollama
 
         Returns:
-            List of available model names
+            List of available model names (from the shared model registry)
         """
-        if self._available_models is not None:
-            return self._available_models
-
-        try:
-            response = requests.get(self.ollama_tags_url, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-
-            models = data.get("models", [])
-            vision_models = [
-                m["name"] for m in models
-                if any(x in m["name"].lower() for x in ["qwen", "llava", "llama-vision"])
-            ]
-
-            self._available_models = vision_models
-            logger.info(f"Found {len(vision_models)} available vision models: {vision_models}")
-            return vision_models
+        await self.registry.ensure_fresh()
+        return self.registry.vision_names()
+
+    # Preferred fallbacks within a quality tier while their latency is unknown:
+    # Llava first (faster), then Qwen models, then Llama vision
+    FALLBACK_ORDER = [
+        "Llava:latest",
+        "llava:latest",
+        "llava:13b",
+        "llava-phi",
+        "qwen3-vl:8b",
+        "llama3.2-vision",
+    ]
+
+    async def vision_candidates(self, primary: str = "qwen3-vl:8b") -> List[str]:
+        """
+        Vision models to try for an analysis, in order
 
-        except Exception as e:
-            logger.warning(f"Could not fetch available models: {e}")
-            return []
+        The primary model comes first when installed. The other installed vision
+        models follow grouped by quality tier (parameter count); the router
+        orders each tier by measured latency and leaves out models behind an
+        open circuit. At most MODEL_ROUTER_MAX_ATTEMPTS models are returned.
+        """
+        available = await self.get_available_vision_models()
+        preferred = {name: index for index, name in enumerate(self.FALLBACK_ORDER)}
+        fallbacks = sorted(
+            (name for name in available if name != primary),
+            key=lambda name: preferred.get(name, len(preferred)),
+        )
+        tiers = [[primary] if primary in available else []] + group_by_tier(fallbacks, self.registry)
+        candidates = self.router.rank(tiers, purpose="vision")[:MODEL_ROUTER_MAX_ATTEMPTS]
+        if not candidates:
+            logger.error(f"No vision models available. Available: {available}")
+        return candidates
 
-    def select_fallback_model(self, primary: str = "qwen3-vl:8b") -> Tuple[str, bool]:
+    async def select_fallback_model(self, primary: str = "qwen3-vl:8b") -> Tuple[Optional[str], bool]:
         """
-        Select the best available fallback model
+        Select the best available model
 
         Args:
             primary: Primary model to try first
@@ -69,36 +112,35 @@ class ModelFallbackManager:
         Returns:
             Tuple of (model_name, is_fallback)
         """
-        available = self.get_available_vision_models()
-
-        # Try primary first
-        if primary in available:
-            logger.info(f"Using primary model: {primary}")
-            return primary, False
-
-        # Fallback order: Llava first (faster) then Qwen2.5 models, then Llama2-vision
-        fallback_order = [
-            "Llava:latest",
-            "llava:latest",
-            "llava:13b",
-            "llava-phi",
-            "qwen3-vl:8b",
-            "qwen2.5:14b",
-            "qwen2.5:7b",
-            "llama2-vision"
-        ]
-
-        for fallback in fallback_order:
-            if fallback in available:
-                logger.warning(f"Primary model {primary} not available, using fallback: {fallback}")
-                return fallback, True
-
-        logger.error(f"No vision models available. Available: {available}")
-        return None, True
-
-    def analyze_with_fallback(
+        candidates = await self.vision_candidates(primary)
+        if not candidates:
+            return None, True
+        if candidates[0] != primary:
+            logger.warning(f"Primary model {primary} not available, using fallback: {candidates[0]}")
+        return candidates[0], candidates[0] != primary
+
+    def _attempt_timeout(self, model: str, last: bool) -> float:
+        # Fail over early on a model that is far slower than usual, but give
+        # the last candidate the whole budget
+        return OLLAMA_VISION_TIMEOUT_SECONDS if last else self.router.timeout_for(model, OLLAMA_VISION_TIMEOUT_SECONDS)
+
+    def encode_for_model(self, image_bytes: bytes, model: str) -> str:
+        """Base64 payload of an image fitted to model's input size"""
+        if self.preprocess_images:
+            prepared = prepare_image(image_bytes, max_side_for_model(model))
+            self.vision_input_stats.record(prepared)
+            if prepared.reencoded:
+                logger.info(
+                    f"Prepared image for {model}: {prepared.original_bytes / 1024:.0f} KB -> "
+                    f"{len(prepared.data) / 1024:.0f} KB ({prepared.width}x{prepared.height}) "
+                    f"in {prepared.seconds * 1000:.1f} ms"
+                )
+            image_bytes = prepared.data
+        return base64.b64encode(image_bytes).decode("utf-8")
+
+    async def analyze_with_fallback(
         self,
-        base64_image: str,
+        image_bytes: bytes,
         user_prompt: Optional[str] = None,
         primary_model: str = "qwen3-vl:8b",
         language: str = "es",
@@ -107,8 +149,12 @@ class ModelFallbackManager:
         """
         Analyze image with automatic fallback
 
+        Tries the routed vision candidates in order (with hedging enabled, a
+        candidate slow to start answering races the next one), then the CLIP
+        fallback.
+
         Args:
-            base64_image: Base64 encoded image
+            image_bytes: Raw image data (prepared per model before sending)
             user_prompt: Optional user input
             primary_model: Primary model to use
             language: Output language
@@ -116,61 +162,130 @@ class ModelFallbackManager:
         Returns:
             Tuple of (prompt_text, model_used, is_fallback)
         """
-        # Select model with fallback
-        selected_model, is_fallback = self.select_fallback_model(primary_model)
+        candidates = await self.vision_candidates(primary_model)
 
-        if selected_model is None:
+        if not candidates:
             logger.error("No vision models available for fallback")
             raise RuntimeError(
                 "Image analysis unavailable with current backend or models. "
                 "Please ensure LLaVA/qwen3-vl is running on Ollama and retry."
             )
 
-        # Try to analyze with selected model
-        try:
-            logger.info(f"Calling _call_vision_model with model={selected_model}, language={language}")
-            prompt = self._call_vision_model(
-                selected_model,
+        async def attempt(model: str, first_token: asyncio.Event) -> str:
+            logger.info(f"Calling _call_vision_model with model={model}, language={language}")
+            # Decoding and resizing is CPU-bound; keep it off the event loop
+            base64_image = await asyncio.to_thread(self.encode_for_model, image_bytes, model)
+            return await self._call_vision_model(
+                model,
                 base64_image,
                 user_prompt,
                 language,
-                deep_thinking
+                deep_thinking,
+                timeout=self._attempt_timeout(model, last=model == candidates[-1]),
+                first_token=first_token
             )
+
+        try:
+            prompt, model = await self.router.race(candidates, attempt)
             logger.info(f"Success! Generated prompt length: {len(prompt)}")
-            return prompt, selected_model, is_fallback
+            return prompt, model, model != primary_model
+        except AllCandidatesFailed:
+            pass
 
-        except Exception as e:
-            logger.error(f"Error with {selected_model}: {e}", exc_info=True)
+        logger.error(f"All vision models failed: {candidates}")
+        try:
+            logger.info("Attempting CLIP Interrogator fallback...")
+            prompt = await asyncio.to_thread(self._clip_interrogator_fallback, image_bytes)
+            return prompt, "clip-interrogator", True
+        except Exception as clip_error:
+            logger.error(f"CLIP fallback also failed: {clip_error}")
+            raise RuntimeError(
+                "Image analysis failed after trying available vision models"
+            ) from clip_error
+
+    async def stream_with_fallback(
+        self,
+        image_bytes: bytes,
+        user_prompt: Optional[str] = None,
+        primary_model: str = "qwen3-vl:8b",
+        language: str = "es",
+        deep_thinking: bool = False
+    ) -> AsyncIterator[Tuple[str, str, bool]]:
+        """
+        Streaming counterpart of analyze_with_fallback
+
+        Model selection is the same. Moving on to the next candidate (and
+        finally to the CLIP fallback, returned as a single chunk) is only
+        possible while nothing has been streamed yet; a failure after the
+        first token is raised to the caller. Hedged candidates race up to
+        their first token; the stream then continues with the winner only.
+
+        Yields:
+            (text_chunk, model_used, is_fallback) tuples
+        """
+        candidates = await self.vision_candidates(primary_model)
+
+        if not candidates:
+            logger.error("No vision models available for fallback")
+            raise RuntimeError(
+                "Image analysis unavailable with current backend or models. "
+                "Please ensure LLaVA/qwen3-vl is running on Ollama and retry."
+            )
+
+        async def first_chunk(model: str, first_token: asyncio.Event) -> Tuple[str, AsyncIterator[str]]:
+            # The race is decided at the first token: that is when a stream commits to a model
+            chunks = self._stream_vision_model(
+                model, image_bytes, user_prompt, language, deep_thinking,
+                timeout=self._attempt_timeout(model, last=model == candidates[-1])
+            )
+            try:
+                return await chunks.__anext__(), chunks
+            except BaseException:
+                await chunks.aclose()
+                raise
+
+        async def discard(result: Tuple[str, AsyncIterator[str]]):
+            await result[1].aclose()
 
-            # Try next fallback
-            if is_fallback:
-                # Already on fallback, no more options
-                logger.error("All vision models failed")
+        try:
+            (text, chunks), model = await self.router.race(candidates, first_chunk, discard)
+        except AllCandidatesFailed:
+            pass
+        else:
+            is_fallback = model != primary_model
+            try:
+                yield text, model, is_fallback
+                async for text in chunks:
+                    yield text, model, is_fallback
+            except Exception as e:
+                logger.error(f"Streaming analysis with {model} failed: {e}", exc_info=True)
                 raise RuntimeError(
                     "Image analysis failed after trying available vision models"
                 ) from e
+            finally:
+                await chunks.aclose()
+            return
 
-            # Try manual CLIP fallback
-            try:
-                logger.info("Attempting CLIP Interrogator fallback...")
-                prompt = self._clip_interrogator_fallback(base64_image)
-                return prompt, "clip-interrogator", True
-            except Exception as clip_error:
-                logger.error(f"CLIP fallback also failed: {clip_error}")
-                raise RuntimeError(
-                    "Image analysis unavailable; install a vision model (llava/qwen3-vl) "
-                    "or enable CLIP Interrogator."
-                ) from clip_error
+        try:
+            logger.info("Attempting CLIP Interrogator fallback...")
+            prompt = await asyncio.to_thread(self._clip_interrogator_fallback, image_bytes)
+        except Exception as clip_error:
+            logger.error(f"CLIP fallback also failed: {clip_error}")
+            raise RuntimeError(
+                "Image analysis unavailable; install a vision model (llava/qwen3-vl) "
+                "or enable CLIP Interrogator."
+            ) from clip_error
+        yield prompt, "clip-interrogator", True
 
-    def _call_vision_model(
+    def _vision_payload(
         self,
         model: str,
         base64_image: str,
         user_prompt: Optional[str] = None,
         language: str = "es",
         deep_thinking: bool = False
-    ) -> str:
-        """Call vision model via Ollama"""
+    ) -> dict:
+        """Ollama /api/chat request for a vision analysis"""
         system_message = self._get_system_message(language, deep_thinking)
         user_instructions = (
             "Describe every relevant visual element with precise detail. "
@@ -184,7 +299,7 @@ class ModelFallbackManager:
                 f"{user_instructions}\nUsuario: {user_prompt.strip()}"
             )
 
-        payload = {
+        return {
             "model": model,
             "messages": [
                 {"role": "system", "content": system_message},
@@ -202,57 +317,88 @@ class ModelFallbackManager:
             },
         }
 
-        try:
-            response = requests.post(
-                self.ollama_chat_url,
-                json=payload,
-                timeout=300,
-            )
-            response.raise_for_status()
-        except Exception as http_error:
-            logger.error(
-                "Vision model request failed for %s: %s",
-                model,
-                http_error,
-                exc_info=True,
-            )
-            raise
+    async def _stream_vision_model(
+        self,
+        model: str,
+        image_bytes: bytes,
+        user_prompt: Optional[str] = None,
+        language: str = "es",
+        deep_thinking: bool = False,
+        timeout: float = OLLAMA_VISION_TIMEOUT_SECONDS
+    ) -> AsyncIterator[str]:
+        """Stream a vision analysis as text chunks (latency, first token and outcome go to the router)"""
+        started = time.perf_counter()
+        base64_image = await asyncio.to_thread(self.encode_for_model, image_bytes, model)
+        payload = self._vision_payload(model, base64_image, user_prompt, language, deep_thinking)
+        streamed = False
+        with self.router.track(model):
+            async for chunk in self.client.chat_stream(payload, timeout=timeout):
+                text = chunk.get("message", {}).get("content", "")
+                if text:
+                    if not streamed:
+                        self.router.record_first_token(model, time.perf_counter() - started)
+                        streamed = True
+                    yield text
+            if not streamed:
+                raise ValueError("Vision model returned empty content")
+
+    async def _call_vision_model(
+        self,
+        model: str,
+        base64_image: str,
+        user_prompt: Optional[str] = None,
+        language: str = "es",
+        deep_thinking: bool = False,
+        timeout: float = OLLAMA_VISION_TIMEOUT_SECONDS,
+        first_token: Optional[asyncio.Event] = None
+    ) -> str:
+        """
+        Call vision model via Ollama (latency and outcome are reported to the router)
 
-        data = response.json()
-        prompt_text = data.get("message", {}).get("content")
+        With hedging enabled the response is streamed, so first_token can be set
+        (and the time to first token measured) while the answer is generated.
+        """
+        payload = self._vision_payload(model, base64_image, user_prompt, language, deep_thinking)
+        started = time.perf_counter()
 
-        if not prompt_text:
-            raise ValueError("Vision model returned empty content")
+        def on_first_token():
+            self.router.record_first_token(model, time.perf_counter() - started)
+            if first_token is not None:
+                first_token.set()
+
+        with self.router.track(model):
+            try:
+                if self.router.hedging:
+                    data = await self.client.chat_collect(payload, timeout=timeout, on_first_token=on_first_token)
+                else:
+                    data = await self.client.chat(payload, timeout=timeout)
+            except Exception as http_error:
+                logger.error(
+                    "Vision model request failed for %s: %s",
+                    model,
+                    http_error,
+                    exc_info=True,
+                )
+                raise
+
+            prompt_text = data.get("message", {}).get("content")
+
+            if not prompt_text:
+                raise ValueError("Vision model returned empty content")
 
         return prompt_text
 
-    def _clip_interrogator_fallback(self, base64_image: str) -> str:
+    def _clip_interrogator_fallback(self, image_bytes: bytes) -> str:
         """
-        Fallback to CLIP Interrogator (lightweight alternative)
+        Fallback to CLIP labeling (lightweight alternative)
 
-        This requires PIL and clip-interrogator to be installed
+        Uses the resident CLIP model and its precomputed label bank: one image
+        encode plus a matrix product. Requires torch and transformers.
         """
         try:
-            from PIL import Image
-            from io import BytesIO
-            from clip_interrogator import Config, Interrogator
-
-            # Decode image
-            image_bytes = bytes.fromhex(base64_image) if base64_image.startswith('0x') else \
-                          base64.b64decode(base64_image)
-            image = Image.open(BytesIO(image_bytes)).convert("RGB")
-
-            # Run CLIP interrogation
-            cfg = Config(clip_model_name="ViT-L-14/openai")
-            interrogator = Interrogator(cfg)
-            prompt = interrogator.interrogate(image)
-
+            prompt = self.clip_fallback.describe(image_bytes)
             logger.info("CLIP Interrogator analysis successful")
             return prompt
-
-        except ImportError:
-            logger.warning("CLIP Interrogator not installed")
-            raise Exception("CLIP Interrogator not available")
         except Exception as e:
             logger.error(f"CLIP Interrogator error: {e}")
             raise
@@ -0,0 +1,275 @@
+"""
+Shared registry of the models installed on (and loaded by) an Ollama server
+/api/tags and /api/ps are polled in the background with a TTL, model metadata
+is parsed once per refresh, and the vision fallback chain and the text model
+selector read the snapshot instead of querying Ollama on every request
+"""
+
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.config import OLLAMA_REGISTRY_TTL_SECONDS
+from app.services.ollama_client import OllamaClient, get_ollama_client
+from app.services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Families/name markers of models that accept images: "clip" is the projector
+# family of LLaVA-style models, "mllama" is Llama 3.2 Vision
+_VISION_FAMILIES = {"clip", "mllama", "qwen2vl", "qwen25vl", "qwen3vl", "gemma3"}
+_VISION_NAME_MARKERS = ("llava", "-vl", "vision", "moondream", "minicpm-v", "gemma3")
+
+_PARAMETER_SIZE = re.compile(r"([\d.]+)\s*([KMBT])", re.IGNORECASE)
+_PARAMETER_SCALE = {"K": 1e-6, "M": 1e-3, "B": 1.0, "T": 1e3}
+
+
+def _parameters_billions(parameter_size: str, name: str) -> float:
+    """"7.6B" -> 7.6; falls back to the tag in the name ("qwen2.5:14b")"""
+    for text in (parameter_size, name.partition(":")[2]):
+        match = _PARAMETER_SIZE.search(text or "")
+        if match:
+            return float(match.group(1)) * _PARAMETER_SCALE[match.group(2).upper()]
+    return 0.0
+
+
+@dataclass(frozen=True)
+class ModelInfo:
+    """Installed model with the metadata Ollama reports for it"""
+
+    name: str
+    family: str
+    families: Tuple[str, ...]
+    parameter_size: str
+    parameters_billions: float
+    quantization: str
+    size_bytes: int
+    vision: bool
+    modified_at: str
+
+    @classmethod
+    def from_tags_entry(cls, entry: Dict[str, Any]) -> "ModelInfo":
+        name = entry.get("name") or entry.get("model") or ""
+        details = entry.get("details") or {}
+        family = (details.get("family") or "").lower()
+        families = tuple(f.lower() for f in (details.get("families") or [family]) if f)
+        parameter_size = details.get("parameter_size") or ""
+        lowered = name.lower()
+        return cls(
+            name=name,
+            family=family,
+            families=families,
+            parameter_size=parameter_size,
+            parameters_billions=_parameters_billions(parameter_size, lowered),
+            quantization=details.get("quantization_level") or "",
+            size_bytes=int(entry.get("size") or 0),
+            vision=bool(_VISION_FAMILIES.intersection(families)) or any(m in lowered for m in _VISION_NAME_MARKERS),
+            modified_at=entry.get("modified_at") or "",
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "family": self.family,
+            "parameter_size": self.parameter_size,
+            "quantization": self.quantization,
+            "size_bytes": self.size_bytes,
+            "vision": self.vision,
+        }
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """Model resident in Ollama's memory (/api/ps)"""
+
+    name: str
+    size_bytes: int
+    size_vram_bytes: int
+    expires_at: str
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    models: Dict[str, ModelInfo]
+    names: Tuple[str, ...]
+    vision_names: Tuple[str, ...]
+    loaded: Dict[str, LoadedModel]
+
+
+_EMPTY = _Snapshot(models={}, names=(), vision_names=(), loaded={})
+
+
+class ModelRegistry:
+    """
+    TTL-refreshed view of one Ollama server's models
+
+    Readers call ensure_fresh() (a no-op while the snapshot is younger than the
+    TTL; concurrent refreshes are coalesced) and then read the immutable
+    snapshot. start() keeps it fresh from a background task instead. A
+    connection error on any call through the shared client drops the snapshot,
+    so the next reader sees what the server really has once it is back.
+    """
+
+    def __init__(self, client: OllamaClient, ttl_seconds: int = OLLAMA_REGISTRY_TTL_SECONDS):
+        """
+        Args:
+            client: Shared client of the Ollama server
+            ttl_seconds: Maximum age of the model list before it is fetched again
+        """
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self._snapshot = _EMPTY
+        self._fetched_at = 0.0
+        self._refreshes = 0
+        self._failures = 0
+        self._invalidations = 0
+        self._last_error: Optional[str] = None
+        self._single_flight: SingleFlight[bool] = SingleFlight()
+        self._poller: Optional[asyncio.Task] = None
+        client.on_connection_error(self.invalidate)
+
+    @property
+    def fresh(self) -> bool:
+        return self._fetched_at > 0 and time.monotonic() - self._fetched_at < self.ttl_seconds
+
+    async def refresh(self) -> bool:
+        """Fetch /api/tags and /api/ps now; returns False (and empties the registry) if Ollama is unreachable"""
+        return await self._single_flight.run("refresh", self._refresh)
+
+    async def _refresh(self) -> bool:
+        tags, ps = await asyncio.gather(self.client.tags(), self.client.ps(), return_exceptions=True)
+        if isinstance(tags, BaseException):
+            self._failures += 1
+            self._last_error = str(tags) or type(tags).__name__
+            if isinstance(tags, httpx.TransportError):
+                self.invalidate()
+            logger.warning(f"Could not fetch Ollama models from {self.client.base_url}: {self._last_error}")
+            return False
+        if isinstance(ps, BaseException):
+            # Older servers have no /api/ps; the installed list is still valid
+            logger.debug(f"Could not fetch loaded Ollama models: {ps}")
+            ps = []
+
+        models = {}
+        for entry in tags:
+            info = ModelInfo.from_tags_entry(entry)
+            if info.name:
+                models[info.name] = info
+        loaded = {
+            entry.get("name", ""): LoadedModel(
+                name=entry.get("name", ""),
+                size_bytes=int(entry.get("size") or 0),
+                size_vram_bytes=int(entry.get("size_vram") or 0),
+                expires_at=entry.get("expires_at") or "",
+            )
+            for entry in ps if entry.get("name")
+        }
+        previous = set(self._snapshot.names)
+        self._snapshot = _Snapshot(
+            models=models,
+            names=tuple(models),
+            vision_names=tuple(name for name, info in models.items() if info.vision),
+            loaded=loaded,
+        )
+        self._fetched_at = time.monotonic()
+        self._refreshes += 1
+        self._last_error = None
+        if set(models) != previous:
+            logger.info(f"Ollama models at {self.client.base_url}: {list(models)} (loaded: {list(loaded)})")
+        return True
+
+    async def ensure_fresh(self):
+        """Refresh if the snapshot is older than the TTL"""
+        if not self.fresh:
+            await self.refresh()
+
+    def invalidate(self):
+        """Forget the model list (connection errors); the next reader refetches it"""
+        if self._fetched_at or self._snapshot is not _EMPTY:
+            self._invalidations += 1
+            logger.info(f"Invalidating Ollama model registry for {self.client.base_url}")
+        self._snapshot = _EMPTY
+        self._fetched_at = 0.0
+
+    def names(self) -> List[str]:
+        return list(self._snapshot.names)
+
+    def vision_names(self) -> List[str]:
+        return list(self._snapshot.vision_names)
+
+    def get(self, name: str) -> Optional[ModelInfo]:
+        return self._snapshot.models.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._snapshot.models
+
+    def loaded(self) -> Dict[str, LoadedModel]:
+        return dict(self._snapshot.loaded)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._snapshot.loaded
+
+    async def start(self):
+        """Poll Ollama every ttl_seconds from a background task on the running loop"""
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+
+    async def _poll(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Model registry refresh failed: {e}")
+            await asyncio.sleep(max(self.ttl_seconds, 1))
+
+    def get_stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "base_url": self.client.base_url,
+            "ttl_seconds": self.ttl_seconds,
+            "age_seconds": round(time.monotonic() - self._fetched_at, 1) if self._fetched_at else None,
+            "polling": self._poller is not None and not self._poller.done(),
+            "models": len(snapshot.names),
+            "vision_models": list(snapshot.vision_names),
+            "loaded_models": list(snapshot.loaded),
+            "refreshes": self._refreshes,
+            "failures": self._failures,
+            "invalidations": self._invalidations,
+            "last_error": self._last_error,
+        }
+
+
+_registries: Dict[str, ModelRegistry] = {}
+
+
+def get_model_registry(base_url: Optional[str] = None) -> ModelRegistry:
+    """Process-wide registry for an Ollama server (default: OLLAMA_BASE_URL)"""
+    client = get_ollama_client(base_url)
+    registry = _registries.get(client.base_url)
+    if registry is None:
+        registry = _registries[client.base_url] = ModelRegistry(client)
+    return registry
+
+
+async def start_model_registries():
+    """Start background polling for the default server (app startup)"""
+    await get_model_registry().start()
+
+
+async def stop_model_registries():
+    for registry in list(_registries.values()):
+        await registry.stop()
@@ -0,0 +1,187 @@
+"""
+Residency of the primary Ollama models
+The primary vision model and the top prompt-optimizer model are preloaded at
+startup and re-sent on a schedule during residency hours, so the first request
+after a quiet period does not pay the model load; the keep-alive policy pins
+them while the window is open and lets them expire afterwards
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from app.config import OLLAMA_PRELOAD_MODELS, OLLAMA_RESIDENCY_REFRESH_SECONDS, OLLAMA_VISION_MODEL
+from app.services.keep_alive import KeepAlivePolicy, get_keep_alive_policy
+from app.services.model_registry import ModelRegistry, get_model_registry
+from app.services.model_selector import get_model_candidates
+from app.services.ollama_client import OllamaClient
+
+logger = logging.getLogger(__name__)
+
+
+class ModelResidency:
+    """
+    Preloads and refreshes the pinned models of one Ollama server
+
+    A preload is a chat request without messages: Ollama loads the model (or
+    just renews its expiry if it is loaded) and keeps it for the request's
+    keep_alive. Models that are not installed are skipped.
+    """
+
+    def __init__(
+        self,
+        registry: ModelRegistry,
+        models: str = OLLAMA_PRELOAD_MODELS,
+        refresh_seconds: int = OLLAMA_RESIDENCY_REFRESH_SECONDS,
+        policy: Optional[KeepAlivePolicy] = None
+    ):
+        """
+        Args:
+            registry: Shared model registry of the server (its client is used for preloads)
+            models: "auto", a comma-separated list of models, or empty to disable
+            refresh_seconds: Interval between refreshes during residency hours (0 disables them)
+            policy: Keep-alive policy (default: the process-wide one)
+        """
+        self.registry = registry
+        self.client: OllamaClient = registry.client
+        self.models_spec = (models or "").strip()
+        self.refresh_seconds = refresh_seconds
+        self.policy = policy or get_keep_alive_policy()
+        self._results: Dict[str, dict] = {}
+        self._preloads = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.models_spec) and self.models_spec.lower() not in ("none", "off", "false", "0")
+
+    def _installed_name(self, model: str) -> Optional[str]:
+        """Registry name of model (Ollama names are case-insensitive)"""
+        if model in self.registry:
+            return model
+        lowered = model.lower()
+        return next((name for name in self.registry.names() if name.lower() == lowered), None)
+
+    async def resolve_models(self) -> List[str]:
+        """Installed models to keep resident"""
+        if not self.enabled:
+            return []
+        await self.registry.ensure_fresh()
+        if self.models_spec.lower() == "auto":
+            requested = [OLLAMA_VISION_MODEL] + await get_model_candidates(self.registry.names(), count=1)
+        else:
+            requested = [name.strip() for name in self.models_spec.split(",") if name.strip()]
+
+        models = []
+        for model in requested:
+            name = self._installed_name(model)
+            if name is None:
+                logger.warning(f"Not preloading {model}: not installed on {self.client.base_url}")
+            elif name not in models:
+                models.append(name)
+        return models
+
+    async def preload(self) -> Dict[str, dict]:
+        """Load (or renew) every pinned model, one at a time so they do not compete for memory"""
+        models = await self.resolve_models()
+        self.policy.pin(models)
+        for model in models:
+            keep_alive = self.policy.for_model(model)
+            started = time.perf_counter()
+            try:
+                await self.client.preload(model, keep_alive=keep_alive)
+                seconds = time.perf_counter() - started
+                self._results[model] = {"at": time.time(), "seconds": round(seconds, 2), "error": None}
+                logger.info(f"Preloaded {model} (keep_alive={keep_alive}) in {seconds:.1f}s")
+            except Exception as e:
+                self._results[model] = {"at": time.time(), "seconds": None, "error": str(e) or type(e).__name__}
+                logger.warning(f"Could not preload {model}: {e}")
+        self._preloads += 1
+        if models:
+            await self.registry.refresh()
+        return {model: self._results[model] for model in models}
+
+    async def start(self):
+        """Preload now and keep refreshing during residency hours, from a background task"""
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        try:
+            await self.preload()
+        except Exception as e:
+            logger.warning(f"Startup preload failed: {e}")
+        if self.refresh_seconds <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            if not self.policy.hours.contains():
+                continue
+            try:
+                await self.preload()
+            except Exception as e:
+                logger.warning(f"Residency refresh failed: {e}")
+
+    def report(self) -> dict:
+        """Pinned models and what Ollama currently has loaded (as of the registry's last refresh)"""
+        loaded = self.registry.loaded()
+        return {
+            "enabled": self.enabled,
+            "models_setting": self.models_spec,
+            "refresh_seconds": self.refresh_seconds,
+            "refreshing": self._task is not None and not self._task.done(),
+            "preloads": self._preloads,
+            "keep_alive": self.policy.as_dict(),
+            "pinned": [
+                {
+                    "name": model,
+                    "resident": model in loaded,
+                    "keep_alive": self.policy.for_model(model),
+                    "last_preload": result,
+                }
+                for model, result in self._results.items()
+                if self.policy.is_pinned(model)
+            ],
+            "resident": [
+                {
+                    "name": model.name,
+                    "pinned": self.policy.is_pinned(model.name),
+                    "size_bytes": model.size_bytes,
+                    "size_vram_bytes": model.size_vram_bytes,
+                    "expires_at": model.expires_at,
+                }
+                for model in loaded.values()
+            ],
+        }
+
+
+_residencies: Dict[str, ModelResidency] = {}
+
+
+def get_model_residency(base_url: Optional[str] = None) -> ModelResidency:
+    """Process-wide residency manager for an Ollama server (default: OLLAMA_BASE_URL)"""
+    registry = get_model_registry(base_url)
+    residency = _residencies.get(registry.client.base_url)
+    if residency is None:
+        residency = _residencies[registry.client.base_url] = ModelResidency(registry)
+    return residency
+
+
+async def start_model_residency():
+    """Preload the primary models of the default server and schedule their refresh (app startup)"""
+    await get_model_residency().start()
+
+
+async def stop_model_residency():
+    for residency in list(_residencies.values()):
+        await residency.stop()
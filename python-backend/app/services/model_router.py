@@ -0,0 +1,342 @@
+"""
+Latency-aware routing across Ollama models
+Every model call reports its latency and outcome; candidates are then ordered
+by expected latency within their quality tier, models that keep failing or
+timing out are skipped behind an open circuit breaker, and per-attempt
+timeouts follow each model's observed p95 instead of a flat 300 s. Time to
+first token is tracked as well; its p95 decides when a slow call gets hedged
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+import httpx
+
+from app.config import (
+    MODEL_ROUTER_ERROR_RATE_PERCENT,
+    MODEL_ROUTER_FAILURE_THRESHOLD,
+    MODEL_ROUTER_MIN_SAMPLES,
+    MODEL_ROUTER_MIN_TIMEOUT_SECONDS,
+    MODEL_ROUTER_OPEN_SECONDS,
+    MODEL_ROUTER_TIMEOUT_MULTIPLIER,
+    MODEL_ROUTER_WINDOW,
+    OLLAMA_BASE_URL,
+    OLLAMA_HEDGE_DEFAULT_DELAY_SECONDS,
+    OLLAMA_HEDGE_MIN_DELAY_SECONDS,
+    OLLAMA_HEDGING_ENABLED,
+)
+from app.services.hedging import Attempt, HedgeBudget, race_candidates
+from app.services.model_registry import ModelInfo, ModelRegistry
+from app.services.ollama_client import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Parameter counts (billions) separating the quality tiers: 12B+ first, then the
+# 6-12B class, then small models
+_TIER_BOUNDS = (12.0, 6.0)
+
+
+def size_tier(info: Optional[ModelInfo]) -> int:
+    """Quality tier of a model from its parameter count (unknown sizes rank mid-tier)"""
+    if info is None or info.parameters_billions <= 0:
+        return 1
+    for tier, bound in enumerate(_TIER_BOUNDS):
+        if info.parameters_billions >= bound:
+            return tier
+    return len(_TIER_BOUNDS)
+
+
+def group_by_tier(models: Sequence[str], registry: ModelRegistry) -> List[List[str]]:
+    """Split candidates into size tiers (best first), keeping their order within each tier"""
+    tiers: Dict[int, List[str]] = {}
+    for model in models:
+        tiers.setdefault(size_tier(registry.get(model)), []).append(model)
+    return [tiers[tier] for tier in sorted(tiers)]
+
+
+class _ModelHealth:
+    """Rolling latency, outcomes and circuit state of one model"""
+
+    def __init__(self, window: int):
+        self.latency = LatencyStats(window)
+        self.first_token = LatencyStats(window)
+        self.outcomes: deque = deque(maxlen=window)
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.last_error: Optional[str] = None
+
+    @property
+    def error_rate(self) -> float:
+        return (self.outcomes.count(False) / len(self.outcomes)) if self.outcomes else 0.0
+
+    def expected_latency(self, min_samples: int) -> Optional[float]:
+        """Median latency scaled by the retries failures cost, None until measured"""
+        median = self.latency.percentile(0.5)
+        if median is None or len(self.latency) < min_samples:
+            return None
+        return median / max(1.0 - self.error_rate, 0.1)
+
+
+class ModelRouter:
+    """
+    Per-model health tracking and candidate ordering for one Ollama server
+
+    A circuit opens after failure_threshold consecutive failures, or when the
+    error rate over the window exceeds error_rate_percent (once min_samples
+    calls were seen). After open_seconds it is half-open: the next ranking
+    includes the model again for a single trial call, whose outcome closes or
+    re-opens it. Models not measured yet sort first within their tier, so new
+    models get explored; their order then follows the caller's preference.
+    """
+
+    def __init__(
+        self,
+        window: int = MODEL_ROUTER_WINDOW,
+        min_samples: int = MODEL_ROUTER_MIN_SAMPLES,
+        failure_threshold: int = MODEL_ROUTER_FAILURE_THRESHOLD,
+        error_rate_percent: int = MODEL_ROUTER_ERROR_RATE_PERCENT,
+        open_seconds: int = MODEL_ROUTER_OPEN_SECONDS,
+        timeout_multiplier: int = MODEL_ROUTER_TIMEOUT_MULTIPLIER,
+        min_timeout_seconds: int = MODEL_ROUTER_MIN_TIMEOUT_SECONDS,
+        hedging: bool = OLLAMA_HEDGING_ENABLED,
+        hedge_min_delay_seconds: int = OLLAMA_HEDGE_MIN_DELAY_SECONDS,
+        hedge_default_delay_seconds: int = OLLAMA_HEDGE_DEFAULT_DELAY_SECONDS,
+        hedge_budget: Optional[HedgeBudget] = None,
+        decisions_kept: int = 50
+    ):
+        self.window = window
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_percent / 100
+        self.open_seconds = open_seconds
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout_seconds = min_timeout_seconds
+        self.hedging = hedging
+        self.hedge_min_delay_seconds = hedge_min_delay_seconds
+        self.hedge_default_delay_seconds = hedge_default_delay_seconds
+        self.hedge_budget = hedge_budget or HedgeBudget()
+        self._models: Dict[str, _ModelHealth] = {}
+        self._decisions: deque = deque(maxlen=decisions_kept)
+        self._lock = threading.Lock()
+
+    def _health(self, model: str) -> _ModelHealth:
+        health = self._models.get(model)
+        if health is None:
+            health = self._models[model] = _ModelHealth(self.window)
+        return health
+
+    def _available(self, health: _ModelHealth, now: float) -> bool:
+        if health.state == OPEN and now - health.opened_at >= self.open_seconds:
+            health.state = HALF_OPEN
+            health.trial_in_flight = False
+        if health.state == HALF_OPEN:
+            return not health.trial_in_flight
+        return health.state == CLOSED
+
+    def rank(self, tiers: Sequence[Sequence[str]], purpose: str = "") -> List[str]:
+        """
+        Order candidates for a call
+
+        Args:
+            tiers: Candidate names grouped by quality, best tier first; within
+                a tier the given order is the preference among unmeasured models
+            purpose: Label for the decision log ("vision", "text", ...)
+
+        Returns:
+            Models to try in order; open circuits are left out unless every
+            candidate is open, in which case the longest-open ones are tried
+        """
+        now = time.monotonic()
+        ranked, skipped, seen = [], [], set()
+        with self._lock:
+            for tier in tiers:
+                members = []
+                for position, model in enumerate(tier):
+                    if not model or model in seen:
+                        continue
+                    seen.add(model)
+                    health = self._health(model)
+                    if not self._available(health, now):
+                        skipped.append(model)
+                        continue
+                    expected = health.expected_latency(self.min_samples)
+                    members.append((expected is not None, expected or 0.0, position, model))
+                ranked.extend(model for *_, model in sorted(members))
+            if not ranked and skipped:
+                ranked = sorted(skipped, key=lambda model: self._models[model].opened_at)
+            self._decisions.append({
+                "at": time.time(),
+                "purpose": purpose,
+                "ranked": ranked,
+                "skipped_open": skipped if ranked != skipped else [],
+            })
+        if skipped:
+            logger.info(f"Routing {purpose or 'call'}: skipping open circuits {skipped}, trying {ranked}")
+        return ranked
+
+    def timeout_for(self, model: str, default: float) -> float:
+        """Per-attempt timeout: timeout_multiplier x observed p95, within [min_timeout, default]"""
+        with self._lock:
+            health = self._models.get(model)
+        p95 = health.latency.percentile(0.95) if health else None
+        if p95 is None or len(health.latency) < self.min_samples:
+            return default
+        return min(default, max(self.min_timeout_seconds, p95 * self.timeout_multiplier))
+
+    def hedge_delay(self, model: str) -> float:
+        """Seconds without a first token before a call to model is hedged: its p95 time to first token"""
+        with self._lock:
+            health = self._models.get(model)
+        p95 = health.first_token.percentile(0.95) if health else None
+        if p95 is None or len(health.first_token) < self.min_samples:
+            return self.hedge_default_delay_seconds
+        return max(self.hedge_min_delay_seconds, p95)
+
+    def record_first_token(self, model: str, seconds: float):
+        with self._lock:
+            health = self._health(model)
+        health.first_token.record(seconds)
+
+    async def race(
+        self,
+        candidates: Sequence[str],
+        attempt: Attempt,
+        discard: Optional[Callable[[T], Awaitable[None]]] = None
+    ) -> Tuple[T, str]:
+        """
+        Run attempt over ranked candidates: sequential fallback, hedged by the
+        next candidate when hedging is enabled (see hedging.race_candidates)
+        """
+        if not self.hedging:
+            return await race_candidates(candidates, attempt, discard=discard)
+        return await race_candidates(candidates, attempt, self.hedge_delay, self.hedge_budget, discard)
+
+    @contextmanager
+    def track(self, model: str) -> Iterator[None]:
+        """
+        Record the call made inside the block: latency on success, a failure
+        for any exception; cancellations (client disconnects, a losing
+        request) are not counted either way
+        """
+        started = time.perf_counter()
+        with self._lock:
+            health = self._health(model)
+            if health.state == HALF_OPEN:
+                health.trial_in_flight = True
+        try:
+            yield
+        except Exception as e:
+            self.record_failure(model, e)
+            raise
+        except BaseException:
+            with self._lock:
+                health.trial_in_flight = False
+            raise
+        self.record_success(model, time.perf_counter() - started)
+
+    def record_success(self, model: str, seconds: float):
+        with self._lock:
+            health = self._health(model)
+            health.latency.record(seconds)
+            health.outcomes.append(True)
+            health.successes += 1
+            health.consecutive_failures = 0
+            health.trial_in_flight = False
+            if health.state != CLOSED:
+                logger.info(f"Closing circuit for {model} after a successful call")
+                health.state = CLOSED
+
+    def record_failure(self, model: str, error: BaseException):
+        with self._lock:
+            health = self._health(model)
+            health.outcomes.append(False)
+            health.failures += 1
+            health.consecutive_failures += 1
+            health.trial_in_flight = False
+            if isinstance(error, httpx.TimeoutException):
+                health.timeouts += 1
+            health.last_error = f"{type(error).__name__}: {error}"[:200]
+            tripped = (
+                health.state == HALF_OPEN
+                or health.consecutive_failures >= self.failure_threshold
+                or (len(health.outcomes) >= self.min_samples and health.error_rate > self.error_rate_threshold)
+            )
+            if tripped and health.state != OPEN:
+                logger.warning(
+                    f"Opening circuit for {model} for {self.open_seconds}s "
+                    f"({health.consecutive_failures} consecutive failures, error rate {health.error_rate:.0%})"
+                )
+                health.state = OPEN
+                health.opened_at = time.monotonic()
+
+    def get_stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            models = {}
+            for model, health in self._models.items():
+                self._available(health, now)
+                expected = health.expected_latency(self.min_samples)
+                models[model] = {
+                    "circuit": health.state,
+                    "retry_in_seconds": (
+                        round(max(self.open_seconds - (now - health.opened_at), 0), 1)
+                        if health.state == OPEN else None
+                    ),
+                    "latency": health.latency.as_dict(),
+                    "first_token": health.first_token.as_dict(),
+                    "expected_latency_ms": round(expected * 1000, 1) if expected is not None else None,
+                    "error_rate": round(health.error_rate, 3),
+                    "successes": health.successes,
+                    "failures": health.failures,
+                    "timeouts": health.timeouts,
+                    "consecutive_failures": health.consecutive_failures,
+                    "last_error": health.last_error,
+                }
+            return {
+                "settings": {
+                    "window": self.window,
+                    "min_samples": self.min_samples,
+                    "failure_threshold": self.failure_threshold,
+                    "error_rate_percent": round(self.error_rate_threshold * 100),
+                    "open_seconds": self.open_seconds,
+                    "timeout_multiplier": self.timeout_multiplier,
+                    "min_timeout_seconds": self.min_timeout_seconds,
+                },
+                "hedging": {
+                    "enabled": self.hedging,
+                    "min_delay_seconds": self.hedge_min_delay_seconds,
+                    "default_delay_seconds": self.hedge_default_delay_seconds,
+                    **self.hedge_budget.get_stats(),
+                },
+                "models": models,
+                "recent_decisions": list(self._decisions),
+            }
+
+
+_routers: Dict[str, ModelRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_model_router(base_url: Optional[str] = None) -> ModelRouter:
+    """Process-wide router for an Ollama server (default: OLLAMA_BASE_URL)"""
+    base_url = (base_url or OLLAMA_BASE_URL).rstrip("/")
+    with _routers_lock:
+        router = _routers.get(base_url)
+        if router is None:
+            router = _routers[base_url] = ModelRouter()
+        return router
@@ -7,9 +7,7 @@ basándose en calidad, tamaño y disponibilidad.
 import logging
 from typing import List
 
-import requests
-
-from app.config import OLLAMA_TAGS_URL
+from app.services.model_registry import get_model_registry
 
 logger = logging.getLogger(__name__)
 
@@ -27,33 +25,19 @@ MODEL_PRIORITY = [
 ]
 
 
-def get_available_models() -> List[str]:
+async def get_available_models() -> List[str]:
     """
     Obtiene la lista de modelos actualmente disponibles en Ollama.
 
+    Lee el registro compartido de modelos, que solo consulta /api/tags cuando
+    su copia ha caducado (o se invalidó por un error de conexión).
+
     Returns:
         Lista de nombres de modelos disponibles, o lista vacía si no se puede conectar.
     """
-    try:
-        response = requests.get(OLLAMA_TAGS_URL, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-
-        # Extraer nombres de modelos, removiendo etiquetas (:latest, etc)
-        models = []
-        for model in data.get("models", []):
-            model_name = model.get("name", "")
-            if model_name:
-                models.append(model_name)
-
-        logger.info(f"Available models in Ollama ({OLLAMA_TAGS_URL}): {models}")
-        return models
-    except requests.exceptions.ConnectionError as e:
-        logger.error(f"Cannot connect to Ollama at {OLLAMA_TAGS_URL}: {str(e)}")
-        return []
-    except Exception as e:
-        logger.warning(f"Could not fetch available models: {str(e)}")
-        return []
+    registry = get_model_registry()
+    await registry.ensure_fresh()
+    return registry.names()
 
 
 def select_best_models(available_models: List[str], count: int = 3) -> List[str]:
@@ -99,7 +83,7 @@ def select_best_models(available_models: List[str], count: int = 3) -> List[str]
     return available_models[:count]
 
 
-def get_model_candidates(available_models: List[str] | None = None, count: int = 3) -> List[str]:
+async def get_model_candidates(available_models: List[str] | None = None, count: int = 3) -> List[str]:
     """
     Obtiene dinámicamente los mejores modelos candidatos para usar.
 
@@ -111,6 +95,6 @@ def get_model_candidates(available_models: List[str] | None = None, count: int =
         Lista ordenada de los mejores modelos disponibles
     """
     if available_models is None:
-        available_models = get_available_models()
+        available_models = await get_available_models()
 
     return select_best_models(available_models, count)
@@ -0,0 +1,326 @@
+"""
+Shared async HTTP client for Ollama
+A single app-scoped httpx.AsyncClient with a keep-alive connection pool
+replaces per-call requests.get/post, so routes await model calls instead of
+blocking the event loop and one worker can hold many slow generations at once
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import weakref
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar, Union
+
+import httpx
+
+from app.config import (
+    OLLAMA_BASE_URL,
+    OLLAMA_CHAT_TIMEOUT_SECONDS,
+    OLLAMA_CONNECT_TIMEOUT_SECONDS,
+    OLLAMA_MAX_CONNECTIONS,
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+    OLLAMA_TAGS_TIMEOUT_SECONDS,
+)
+from app.services.keep_alive import get_keep_alive_policy
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ClientDisconnected(Exception):
+    """The HTTP client went away before its model call finished"""
+
+
+class LatencyStats:
+    """Count, mean and percentiles over the most recent latency samples"""
+
+    def __init__(self, window: int = 1000):
+        self._samples: deque = deque(maxlen=window)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q-quantile in seconds over the window, or None without samples"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self._count
+        if not samples:
+            return {"count": count, "avg_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0}
+
+        def percentile(q: float) -> float:
+            return round(samples[min(int(q * len(samples)), len(samples) - 1)] * 1000, 1)
+
+        return {
+            "count": count,
+            "avg_ms": round(sum(samples) / len(samples) * 1000, 1),
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+        }
+
+
+class OllamaClient:
+    """
+    Pooled async client for one Ollama server
+
+    httpx connection pools belong to the event loop that created them, so the
+    underlying AsyncClient is created lazily per running loop: the app's loop
+    gets one shared pool, and a script or background thread running its own
+    loop gets its own instead of reusing sockets across loops.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_BASE_URL,
+        max_connections: int = OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections: int = OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+        connect_timeout: float = OLLAMA_CONNECT_TIMEOUT_SECONDS
+    ):
+        """
+        Args:
+            base_url: Ollama server URL without trailing slash
+            max_connections: Upper bound on concurrent connections to the server
+            max_keepalive_connections: Idle connections kept open for reuse
+            connect_timeout: Seconds allowed to open a connection
+        """
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._failures = 0
+        self._in_flight = 0
+        self._connection_error_listeners: List[Callable[[], None]] = []
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(base_url=self.base_url, limits=self._limits)
+                self._clients[loop] = client
+            return client
+
+    def on_connection_error(self, listener: Callable[[], None]):
+        """Call listener whenever the server cannot be reached (e.g. to drop cached model lists)"""
+        self._connection_error_listeners.append(listener)
+
+    def _record_failure(self, error: Exception):
+        self._failures += 1
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+            for listener in self._connection_error_listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    logger.debug(f"Connection-error listener failed: {e}")
+
+    def _timeout(self, seconds: float) -> httpx.Timeout:
+        # read/write/pool share the operation's budget; connecting is always quick
+        return httpx.Timeout(seconds, connect=self.connect_timeout)
+
+    async def request(self, method: str, path: str, timeout: float, **kwargs) -> httpx.Response:
+        """Send a request and raise httpx.HTTPStatusError on 4xx/5xx"""
+        self._requests += 1
+        self._in_flight += 1
+        try:
+            response = await self._client().request(method, path, timeout=self._timeout(timeout), **kwargs)
+            response.raise_for_status()
+            return response
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        finally:
+            self._in_flight -= 1
+
+    @staticmethod
+    def _with_keep_alive(payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Add the model's keep_alive policy unless the caller set one"""
+        if "keep_alive" in payload:
+            return payload
+        keep_alive = get_keep_alive_policy().for_model(payload.get("model", ""))
+        return payload if keep_alive is None else {**payload, "keep_alive": keep_alive}
+
+    async def chat(self, payload: Dict[str, Any], timeout: float = OLLAMA_CHAT_TIMEOUT_SECONDS) -> Dict[str, Any]:
+        """POST /api/chat (non-streaming) and return the decoded response"""
+        response = await self.request("POST", "/api/chat", timeout, json=self._with_keep_alive(payload))
+        return response.json()
+
+    async def preload(
+        self,
+        model: str,
+        keep_alive: Optional[Union[str, int]] = None,
+        timeout: float = OLLAMA_CHAT_TIMEOUT_SECONDS
+    ) -> Dict[str, Any]:
+        """Load model into memory (a chat request without messages) and keep it for keep_alive"""
+        payload: Dict[str, Any] = {"model": model, "messages": [], "stream": False}
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return await self.chat(payload, timeout=timeout)
+
+    async def chat_stream(
+        self,
+        payload: Dict[str, Any],
+        timeout: float = OLLAMA_CHAT_TIMEOUT_SECONDS
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        POST /api/chat with streaming and yield each decoded chunk
+
+        The timeout bounds the wait for every chunk (including the first one,
+        which covers model load and image encoding), not the whole generation.
+        Closing the generator early closes the connection, which stops Ollama.
+        """
+        self._requests += 1
+        self._in_flight += 1
+        try:
+            async with self._client().stream(
+                "POST", "/api/chat", json={**self._with_keep_alive(payload), "stream": True},
+                timeout=self._timeout(timeout)
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise RuntimeError(f"Ollama error: {chunk['error']}")
+                    yield chunk
+                    if chunk.get("done"):
+                        return
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        finally:
+            self._in_flight -= 1
+
+    async def chat_collect(
+        self,
+        payload: Dict[str, Any],
+        timeout: float = OLLAMA_CHAT_TIMEOUT_SECONDS,
+        on_first_token: Optional[Callable[[], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Streamed /api/chat assembled into the non-streaming response shape
+
+        Same result as chat(), but on_first_token is called as soon as the
+        model starts answering (hedged calls need to know that).
+        """
+        parts: List[str] = []
+        last: Dict[str, Any] = {}
+        async for chunk in self.chat_stream(payload, timeout=timeout):
+            text = chunk.get("message", {}).get("content", "")
+            if text:
+                if not parts and on_first_token is not None:
+                    on_first_token()
+                parts.append(text)
+            last = chunk
+        message = {**last.get("message", {}), "role": "assistant", "content": "".join(parts)}
+        return {**last, "message": message}
+
+    async def tags(self, timeout: float = OLLAMA_TAGS_TIMEOUT_SECONDS) -> List[Dict[str, Any]]:
+        """Models installed on the server (GET /api/tags)"""
+        response = await self.request("GET", "/api/tags", timeout)
+        return response.json().get("models", [])
+
+    async def ps(self, timeout: float = OLLAMA_TAGS_TIMEOUT_SECONDS) -> List[Dict[str, Any]]:
+        """Models currently loaded in memory (GET /api/ps)"""
+        response = await self.request("GET", "/api/ps", timeout)
+        return response.json().get("models", [])
+
+    def get_stats(self) -> dict:
+        return {
+            "base_url": self.base_url,
+            "requests": self._requests,
+            "failures": self._failures,
+            "in_flight": self._in_flight,
+            "max_connections": self._limits.max_connections,
+            "max_keepalive_connections": self._limits.max_keepalive_connections,
+        }
+
+    async def aclose(self):
+        """Close the pool owned by the running loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+
+_clients: Dict[str, OllamaClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_ollama_client(base_url: Optional[str] = None) -> OllamaClient:
+    """Process-wide client for an Ollama server (default: OLLAMA_BASE_URL)"""
+    base_url = (base_url or OLLAMA_BASE_URL).rstrip("/")
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = _clients[base_url] = OllamaClient(base_url)
+        return client
+
+
+async def close_ollama_clients():
+    """Close the pools opened on the running loop (app shutdown)"""
+    for client in list(_clients.values()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.debug(f"Error closing Ollama client for {client.base_url}: {e}")
+
+
+async def run_until_disconnected(
+    awaitable: Awaitable[T],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    poll_interval: float = 0.5
+) -> T:
+    """
+    Await a model call, cancelling it if the HTTP client goes away
+
+    Starlette keeps running a handler after its client disconnects, which would
+    leave an abandoned generation holding a pooled connection until Ollama
+    finishes. Cancelling the task closes that connection instead.
+
+    Args:
+        awaitable: Work to run (e.g. an analysis or prompt optimization)
+        is_disconnected: Typically request.is_disconnected
+        poll_interval: Seconds between disconnect checks
+
+    Raises:
+        ClientDisconnected: When the client disconnected first
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await is_disconnected():
+                logger.info("Client disconnected; cancelling in-flight model call")
+                task.cancel()
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,167 @@
+"""
+Perceptual hashing for near-duplicate image lookup
+Computes 64-bit difference hashes (dHash) with vectorized NumPy and indexes
+them in a BK-tree for Hamming-distance search, so re-exported, resized or
+re-compressed copies of an image can be matched to an existing analysis
+"""
+
+import io
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+_UNSIGNED_MASK = (1 << HASH_BITS) - 1
+
+
+def compute_dhash(image_bytes: bytes, hash_size: int = 8) -> Optional[int]:
+    """
+    Compute the difference hash of an image
+
+    The image is reduced to a (hash_size + 1) x hash_size grayscale thumbnail and
+    each bit records whether a pixel is brighter than its right neighbour.
+
+    Args:
+        image_bytes: Raw image data
+        hash_size: Grid size; 8 yields a 64-bit hash
+
+    Returns:
+        Hash as an unsigned integer, or None if the image cannot be decoded
+    """
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        # JPEG draft mode decodes at a reduced scale, far cheaper than a full decode
+        image.draft("L", (hash_size * 8, hash_size * 8))
+        thumbnail = image.convert("L").resize(
+            (hash_size + 1, hash_size), Image.Resampling.LANCZOS
+        )
+    except Exception as e:
+        logger.debug(f"Could not compute perceptual hash: {e}")
+        return None
+
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count("1")
+
+
+def to_signed(value: int) -> int:
+    """Map an unsigned 64-bit hash into SQLite's signed INTEGER range"""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value: int) -> int:
+    """Inverse of to_signed"""
+    return value & _UNSIGNED_MASK
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance
+
+    Each node stores a hash and the keys that share it; children are indexed by
+    their distance to the parent, so a radius query only descends into children
+    whose edge distance lies within [d - radius, d + radius].
+    """
+
+    def __init__(self):
+        self._root: Optional[list] = None  # [hash, keys, children]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int, key: str):
+        """Insert key under hash value"""
+        self._size += 1
+        if self._root is None:
+            self._root = [value, [key], {}]
+            return
+
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(key)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [key], {}]
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, str]]:
+        """
+        Find all keys whose hash is within radius of value
+
+        Returns:
+            List of (distance, key) sorted by distance
+        """
+        if self._root is None:
+            return []
+
+        matches = []
+        stack = [self._root]
+        while stack:
+            node_value, keys, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= radius:
+                matches.extend((distance, key) for key in keys)
+            low, high = distance - radius, distance + radius
+            stack.extend(child for edge, child in children.items() if low <= edge <= high)
+
+        matches.sort()
+        return matches
+
+
+class PerceptualHashIndex:
+    """BK-tree index that tolerates removals by tracking live keys"""
+
+    def __init__(self):
+        self._tree = BKTree()
+        self._live: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def add(self, key: str, value: int):
+        """Index key under its perceptual hash"""
+        if self._live.get(key) == value:
+            return
+        self._live[key] = value
+        self._tree.add(value, key)
+
+    def remove(self, key: str):
+        """Forget key; stale tree nodes are filtered out on search"""
+        self._live.pop(key, None)
+
+    def within(self, value: int, max_distance: int) -> List[Tuple[int, str]]:
+        """
+        Live keys within max_distance
+
+        Returns:
+            List of (distance, key), closest first
+        """
+        return [
+            (distance, key)
+            for distance, key in self._tree.search(value, max_distance)
+            if self._live.get(key) is not None and hamming_distance(self._live[key], value) == distance
+        ]
+
+    def nearest(self, value: int, max_distance: int) -> Optional[Tuple[int, str]]:
+        """
+        Closest live key within max_distance
+
+        Returns:
+            Tuple of (distance, key) or None
+        """
+        matches = self.within(value, max_distance)
+        return matches[0] if matches else None
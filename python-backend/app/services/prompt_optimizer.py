@@ -5,15 +5,21 @@ Optimizador de prompts usando un LLM open source vía Ollama (Qwen2.5).
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
+import time
 from typing import List
 
-import requests
+import httpx
 from pydantic import BaseModel
 
-from app.config import OLLAMA_CHAT_URL
+from app.config import OLLAMA_CHAT_TIMEOUT_SECONDS, OLLAMA_CHAT_URL
+from app.services.hedging import AllCandidatesFailed
+from app.services.model_registry import get_model_registry
+from app.services.model_router import get_model_router, group_by_tier
 from app.services.model_selector import get_model_candidates
+from app.services.ollama_client import get_ollama_client
 
 logger = logging.getLogger(__name__)
 
@@ -164,7 +170,7 @@ PROMPT_ORIGINAL:
     ]
 
 
-def improve_prompt(
+async def improve_prompt(
     raw_prompt: str,
     deep_thinking: bool = False,
     better_prompt: bool = False,
@@ -185,112 +191,131 @@ def improve_prompt(
     if model:
         model_candidates = [model]
     else:
-        model_candidates = get_model_candidates(count=3)
+        model_candidates = await get_model_candidates(count=3)
         # get_model_candidates siempre retorna al menos una lista de modelos prioritarios como fallback
 
+    # Dentro de cada nivel de calidad (tamaño del modelo), primero el más rápido
+    # según las latencias observadas; los modelos con el circuito abierto se omiten
+    router = get_model_router()
+    model_candidates = router.rank(group_by_tier(model_candidates, get_model_registry()), purpose="text")
+
     logger.info(f"Model candidates for optimization: {model_candidates}")
     messages = build_optimizer_messages(raw_prompt, deep_thinking, better_prompt, language)
 
-    last_error = None
-
-    for attempt_model in model_candidates:
-        try:
-            logger.info(f"Attempting to optimize prompt with model: {attempt_model}")
-
-            # Hacer petición HTTP a Ollama
-            payload = {
-                "model": attempt_model,
-                "messages": messages,
-                "stream": False,
-                "options": {
-                    "temperature": 0.3,
-                }
+    # Cada intento devuelve un PromptImprovement válido o lanza una excepción;
+    # con OLLAMA_HEDGING_ENABLED, si un modelo no empieza a responder a tiempo
+    # se lanza también el siguiente candidato y gana la primera respuesta válida
+    async def attempt(attempt_model: str, first_token: asyncio.Event) -> PromptImprovement:
+        logger.info(f"Attempting to optimize prompt with model: {attempt_model}")
+
+        # Hacer petición HTTP a Ollama
+        payload = {
+            "model": attempt_model,
+            "messages": messages,
+            "stream": False,
+            "options": {
+                "temperature": 0.3,
             }
+        }
+
+        logger.debug(f"Payload: {json.dumps(payload, indent=2, ensure_ascii=False)[:200]}...")
+
+        # El último candidato dispone del timeout completo; los demás, de
+        # uno acorde a su p95 para pasar antes al siguiente
+        timeout = (
+            OLLAMA_CHAT_TIMEOUT_SECONDS if attempt_model == model_candidates[-1]
+            else router.timeout_for(attempt_model, OLLAMA_CHAT_TIMEOUT_SECONDS)
+        )
+        started = time.perf_counter()
+
+        def on_first_token():
+            router.record_first_token(attempt_model, time.perf_counter() - started)
+            first_token.set()
+
+        with router.track(attempt_model):
+            if router.hedging:
+                # En streaming, para saber cuándo llega el primer token y
+                # lanzar la petición de cobertura si tarda demasiado
+                response_data = await get_ollama_client().chat_collect(
+                    payload, timeout=timeout, on_first_token=on_first_token
+                )
+            else:
+                response_data = await get_ollama_client().chat(payload, timeout=timeout)
+        logger.debug(f"Response data keys: {response_data.keys()}")
+
+        # Extraer el contenido de la respuesta
+        if "message" not in response_data:
+            raise ValueError(f"La respuesta no contiene 'message': {response_data}")
+
+        message = response_data["message"]
+        if "content" not in message:
+            raise ValueError(f"El message no contiene 'content': {message}")
+
+        content = message["content"]
+        logger.debug(f"Raw content from Ollama:\n{content[:200]}...")
+
+        # Parsear el JSON de la respuesta
+        json_data = None
+        try:
+            json_data = json.loads(content)
+        except json.JSONDecodeError as e:
+            # Si falla, intentar sanitizar de varias formas
+            logger.warning(f"First JSON parse failed: {str(e)}. Attempting to sanitize...")
 
-            logger.debug(f"Payload: {json.dumps(payload, indent=2, ensure_ascii=False)[:200]}...")
-
-            response = requests.post(OLLAMA_CHAT_URL, json=payload, timeout=300)
-            response.raise_for_status()
-
-            response_data = response.json()
-            logger.debug(f"Response status: {response.status_code}")
-            logger.debug(f"Response data keys: {response_data.keys()}")
-
-            # Extraer el contenido de la respuesta
-            if "message" not in response_data:
-                raise ValueError(f"La respuesta no contiene 'message': {response_data}")
-
-            message = response_data["message"]
-            if "content" not in message:
-                raise ValueError(f"El message no contiene 'content': {message}")
-
-            content = message["content"]
-            logger.debug(f"Raw content from Ollama:\n{content[:200]}...")
-
-            # Parsear el JSON de la respuesta
-            json_data = None
+            # Intento 1: Reemplazar saltos de línea literales por espacios dentro de strings
             try:
-                json_data = json.loads(content)
-            except json.JSONDecodeError as e:
-                # Si falla, intentar sanitizar de varias formas
-                logger.warning(f"First JSON parse failed: {str(e)}. Attempting to sanitize...")
+                sanitized_content = content.replace('\n', ' ').replace('\r', ' ')
+                json_data = json.loads(sanitized_content)
+                logger.info("Successfully parsed JSON after newline sanitization")
+            except json.JSONDecodeError as e2:
+                logger.warning(f"Newline sanitization failed: {str(e2)}")
 
-                # Intento 1: Reemplazar saltos de línea literales por espacios dentro de strings
+                # Intento 2: Extraer el JSON válido si está embebido en texto
                 try:
-                    sanitized_content = content.replace('\n', ' ').replace('\r', ' ')
-                    json_data = json.loads(sanitized_content)
-                    logger.info("Successfully parsed JSON after newline sanitization")
-                except json.JSONDecodeError as e2:
-                    logger.warning(f"Newline sanitization failed: {str(e2)}")
-
-                    # Intento 2: Extraer el JSON válido si está embebido en texto
-                    try:
-                        import re
-                        # Buscar el JSON entre { ... }
-                        json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                        if json_match:
-                            potential_json = json_match.group(0)
-                            # Sanitizar también este
-                            potential_json = potential_json.replace('\n', ' ').replace('\r', ' ')
-                            json_data = json.loads(potential_json)
-                            logger.info("Successfully parsed JSON after extraction and sanitization")
-                    except Exception as e3:
-                        logger.warning(f"JSON extraction failed: {str(e3)}")
-
-                if not json_data:
-                    logger.error(f"Could not parse JSON after all attempts. First 500 chars: {content[:500]}")
-                    raise ValueError(f"La respuesta no es un JSON válido después de intentar sanitizar")
-
-            # Validar que tiene los campos requeridos
-            improved_prompt = json_data.get("improved_prompt", "")
-            rationale = json_data.get("rationale", "")
-            checklist = json_data.get("checklist", [])
-
-            if not improved_prompt:
-                raise ValueError("El JSON no contiene 'improved_prompt' o está vacío")
-
-            logger.info(f"Successfully parsed improved prompt ({len(improved_prompt)} chars) with model {attempt_model}")
-
-            return PromptImprovement(
-                improved_prompt=improved_prompt,
-                rationale=rationale,
-                checklist=checklist if isinstance(checklist, list) else []
-            )
-
-        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, ValueError) as e:
-            last_error = e
-            logger.warning(f"Failed with model {attempt_model}: {str(e)}. Trying next model...")
-            continue
-        except Exception as e:
-            last_error = e
-            logger.warning(f"Unexpected error with model {attempt_model}: {str(e)}. Trying next model...")
-            continue
+                    import re
+                    # Buscar el JSON entre { ... }
+                    json_match = re.search(r'\{.*\}', content, re.DOTALL)
+                    if json_match:
+                        potential_json = json_match.group(0)
+                        # Sanitizar también este
+                        potential_json = potential_json.replace('\n', ' ').replace('\r', ' ')
+                        json_data = json.loads(potential_json)
+                        logger.info("Successfully parsed JSON after extraction and sanitization")
+                except Exception as e3:
+                    logger.warning(f"JSON extraction failed: {str(e3)}")
+
+            if not json_data:
+                logger.error(f"Could not parse JSON after all attempts. First 500 chars: {content[:500]}")
+                raise ValueError(f"La respuesta no es un JSON válido después de intentar sanitizar")
+
+        # Validar que tiene los campos requeridos
+        improved_prompt = json_data.get("improved_prompt", "")
+        rationale = json_data.get("rationale", "")
+        checklist = json_data.get("checklist", [])
+
+        if not improved_prompt:
+            raise ValueError("El JSON no contiene 'improved_prompt' o está vacío")
+
+        logger.info(f"Successfully parsed improved prompt ({len(improved_prompt)} chars) with model {attempt_model}")
+
+        return PromptImprovement(
+            improved_prompt=improved_prompt,
+            rationale=rationale,
+            checklist=checklist if isinstance(checklist, list) else []
+        )
+
+    last_error = None
+    try:
+        result, _ = await router.race(model_candidates, attempt)
+        return result
+    except AllCandidatesFailed as e:
+        last_error = list(e.errors.values())[-1] if e.errors else None
 
     # Si llegamos aquí, ningún modelo funcionó
-    if isinstance(last_error, requests.exceptions.ConnectionError):
+    if isinstance(last_error, httpx.ConnectError):
         logger.error(f"Cannot connect to Ollama at {OLLAMA_CHAT_URL}")
         raise ValueError(f"No se puede conectar a Ollama. ¿Está ejecutándose en {OLLAMA_CHAT_URL}?")
-    elif isinstance(last_error, requests.exceptions.Timeout):
+    elif isinstance(last_error, httpx.TimeoutException):
         logger.error("All models timed out")
         raise ValueError("Todos los modelos tardaron demasiado. Intenta con un modelo más pequeño.")
     else:
@@ -317,7 +342,7 @@ def build_fallback_improvement(raw_prompt: str) -> PromptImprovement:
 if __name__ == "__main__":
     original = input("Escribe el prompt original:\n\n> ")
     deep = input("\n¿Pensamiento profundo? (s/n): ").lower() == 's'
-    result = improve_prompt(original, deep_thinking=deep)
+    result = asyncio.run(improve_prompt(original, deep_thinking=deep))
 
     print("\n=== PROMPT MEJORADO ===\n")
     print(result.improved_prompt)
@@ -0,0 +1,281 @@
+"""
+Redis-protocol storage for the image analysis cache
+Lets several backend nodes share one set of analyses. Entries are Redis hashes
+whose key TTL covers the entry's own TTL plus the stale-while-revalidate
+window, batch reads/writes are pipelined, and size bounds are left to the
+server's maxmemory-policy (allkeys-lru or allkeys-lfu)
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Sequence, Set, Tuple
+
+from app.services.cache_backend import AnalysisCacheBackend, StoredAnalysis, StoredDescription
+
+try:
+    import redis
+except ImportError:  # optional dependency, only needed for IMAGE_CACHE_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+_ENTRY_FIELDS = (
+    b"image_hash", b"variant_key", b"image_context", b"metadata", b"codec", b"phash", b"expires_at", b"created_at"
+)
+_DESCRIPTION_FIELDS = (b"image_hash", b"description", b"model_used", b"model_fallback_used", b"created_at")
+
+# Check-and-update of one entry in a single atomic step: a key that expired
+# between a separate EXISTS and HINCRBY would come back as a hash with no TTL
+_RECORD_ACCESS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBY', KEYS[1], 'access_count', ARGV[1])
+    redis.call('HSET', KEYS[1], 'accessed_at', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+def _now() -> str:
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _seconds_until(timestamp: str) -> int:
+    return int((datetime.fromisoformat(timestamp) - datetime.utcnow()).total_seconds())
+
+
+class RedisCacheBackend(AnalysisCacheBackend):
+    """
+    Shared key-value storage speaking the Redis protocol
+
+    Key layout under prefix:
+        <prefix>:entry:<cache_key>          hash with the encoded analysis
+        <prefix>:description:<key>          hash with a shared description
+        <prefix>:variants:<image_hash>      set of cache keys stored for an image
+        <prefix>:phash                      hash image_hash -> perceptual hash
+
+    Any client exposing the redis-py API works, including an in-process
+    stand-in such as fakeredis.FakeRedis() (installed with its "lua" extra, for
+    the access-count script), which makes the backend testable without a
+    server. The client must return bytes (decode_responses=False).
+    """
+
+    name = "redis"
+    enforces_limits = True
+
+    def __init__(
+        self,
+        client,
+        ttl_seconds: int,
+        stale_seconds: int = 0,
+        prefix: str = "anclora:image-cache"
+    ):
+        """
+        Args:
+            client: redis.Redis-compatible client
+            ttl_seconds: Lifetime of shared descriptions, and of entries written
+                without an explicit expires_at
+            stale_seconds: How long entries outlive their TTL so they can still be
+                served stale while a refresh runs
+            prefix: Namespace for all keys
+        """
+        self._client = client
+        self.ttl_seconds = int(ttl_seconds)
+        self.stale_seconds = int(stale_seconds)
+        self.prefix = prefix
+        self._record_access = client.register_script(_RECORD_ACCESS_SCRIPT)
+
+    @classmethod
+    def from_url(
+        cls,
+        url: str,
+        ttl_seconds: int,
+        stale_seconds: int = 0,
+        prefix: str = "anclora:image-cache"
+    ) -> "RedisCacheBackend":
+        """Connect to a server and check it answers"""
+        if redis is None:
+            raise RuntimeError("The redis package is required for the redis cache backend")
+        client = redis.Redis.from_url(url, decode_responses=False, socket_timeout=2.0)
+        client.ping()
+        return cls(client, ttl_seconds=ttl_seconds, stale_seconds=stale_seconds, prefix=prefix)
+
+    @property
+    def location(self) -> str:
+        kwargs = getattr(getattr(self._client, "connection_pool", None), "connection_kwargs", {})
+        host = kwargs.get("host", "in-process")
+        port = kwargs.get("port")
+        return f"redis://{host}{f':{port}' if port else ''}/{kwargs.get('db', 0)} ({self.prefix})"
+
+    def _entry_key(self, cache_key: str) -> str:
+        return f"{self.prefix}:entry:{cache_key}"
+
+    def _description_key(self, description_key: str) -> str:
+        return f"{self.prefix}:description:{description_key}"
+
+    def _variants_key(self, image_hash: str) -> str:
+        return f"{self.prefix}:variants:{image_hash}"
+
+    @property
+    def _phash_key(self) -> str:
+        return f"{self.prefix}:phash"
+
+    def get_many(self, cache_keys: Sequence[str]) -> Dict[str, StoredAnalysis]:
+        pipe = self._client.pipeline(transaction=False)
+        for cache_key in cache_keys:
+            pipe.hmget(self._entry_key(cache_key), _ENTRY_FIELDS)
+        found = {}
+        for cache_key, values in zip(cache_keys, pipe.execute()):
+            if not values or values[2] is None:
+                continue
+            image_hash, variant_key, image_context, metadata, codec, phash, expires_at, created_at = values
+            found[cache_key] = StoredAnalysis(
+                cache_key=cache_key,
+                image_hash=image_hash.decode(),
+                variant_key=variant_key.decode(),
+                image_context=image_context,
+                metadata=metadata,
+                codec=int(codec),
+                phash=int(phash) if phash else None,
+                expires_at=expires_at.decode() if expires_at else None,
+                created_at=created_at.decode(),
+            )
+        return found
+
+    def set_many(self, entries: Sequence[StoredAnalysis]):
+        created_at = _now()
+        pipe = self._client.pipeline(transaction=False)
+        for entry in entries:
+            key = self._entry_key(entry.cache_key)
+            ttl = _seconds_until(entry.expires_at) if entry.expires_at else self.ttl_seconds
+            key_ttl = max(ttl + self.stale_seconds, 1)
+            pipe.delete(key)
+            pipe.hset(key, mapping={
+                "image_hash": entry.image_hash,
+                "variant_key": entry.variant_key,
+                "image_context": entry.image_context,
+                "metadata": entry.metadata,
+                "codec": entry.codec,
+                "phash": entry.phash if entry.phash is not None else "",
+                "size_bytes": entry.size_bytes,
+                "expires_at": entry.expires_at or "",
+                "created_at": created_at,
+                "accessed_at": created_at,
+                "access_count": 1,
+            })
+            pipe.expire(key, key_ttl)
+            pipe.sadd(self._variants_key(entry.image_hash), entry.cache_key)
+            pipe.expire(self._variants_key(entry.image_hash), max(key_ttl, self.ttl_seconds))
+            if entry.phash is not None:
+                pipe.hset(self._phash_key, entry.image_hash, entry.phash)
+        pipe.execute()
+
+    def delete_many(self, rows: Sequence[Tuple[str, str]]) -> Set[str]:
+        pipe = self._client.pipeline(transaction=False)
+        for cache_key, image_hash in rows:
+            pipe.delete(self._entry_key(cache_key))
+            pipe.srem(self._variants_key(image_hash), cache_key)
+        image_hashes = sorted({image_hash for _, image_hash in rows})
+        for image_hash in image_hashes:
+            pipe.scard(self._variants_key(image_hash))
+        counts = pipe.execute()[-len(image_hashes):] if image_hashes else []
+
+        orphaned = {image_hash for image_hash, count in zip(image_hashes, counts) if not count}
+        if orphaned:
+            self._client.hdel(self._phash_key, *orphaned)
+        return orphaned
+
+    def get_description(self, description_key: str) -> Optional[StoredDescription]:
+        values = self._client.hmget(self._description_key(description_key), _DESCRIPTION_FIELDS)
+        if not values or values[1] is None:
+            return None
+        image_hash, description, model_used, model_fallback_used, created_at = values
+        return StoredDescription(
+            description_key=description_key,
+            image_hash=image_hash.decode(),
+            description=description.decode(),
+            model_used=model_used.decode(),
+            model_fallback_used=model_fallback_used == b"1",
+            created_at=created_at.decode(),
+        )
+
+    def set_description(self, description: StoredDescription):
+        key = self._description_key(description.description_key)
+        pipe = self._client.pipeline(transaction=False)
+        pipe.hset(key, mapping={
+            "image_hash": description.image_hash,
+            "description": description.description,
+            "model_used": description.model_used,
+            "model_fallback_used": int(description.model_fallback_used),
+            "created_at": _now(),
+        })
+        pipe.expire(key, self.ttl_seconds)
+        pipe.execute()
+
+    def record_access(self, rows: Sequence[Tuple[str, int, str]]):
+        # Only touch keys that still exist so hits never resurrect an expired entry
+        pipe = self._client.pipeline(transaction=False)
+        for accessed_at, count, cache_key in rows:
+            self._record_access(keys=[self._entry_key(cache_key)], args=[count, accessed_at], client=pipe)
+        pipe.execute()
+
+    def _scan_entries(self) -> Iterator[str]:
+        """Cache keys of all stored entries"""
+        prefix = self._entry_key("")
+        for key in self._client.scan_iter(match=f"{prefix}*", count=500):
+            yield key.decode()[len(prefix):]
+
+    def image_hashes(self, variant_key: str, fresh_at: str) -> Set[str]:
+        cache_keys = [key for key in self._scan_entries() if key.endswith(f":{variant_key}")]
+        pipe = self._client.pipeline(transaction=False)
+        for cache_key in cache_keys:
+            pipe.hget(self._entry_key(cache_key), "expires_at")
+        return {
+            cache_key.split(":", 1)[0]
+            for cache_key, expires_at in zip(cache_keys, pipe.execute())
+            if expires_at and expires_at.decode() > fresh_at
+        }
+
+    def phashes(self) -> Iterator[Tuple[str, int]]:
+        """Stored perceptual hashes, pruning images whose entries all expired"""
+        stored = {
+            image_hash.decode(): int(phash)
+            for image_hash, phash in self._client.hgetall(self._phash_key).items()
+        }
+        image_hashes = list(stored)
+        pipe = self._client.pipeline(transaction=False)
+        for image_hash in image_hashes:
+            pipe.exists(self._variants_key(image_hash))
+        live = pipe.execute()
+
+        stale = [image_hash for image_hash, exists in zip(image_hashes, live) if not exists]
+        if stale:
+            self._client.hdel(self._phash_key, *stale)
+        for image_hash, exists in zip(image_hashes, live):
+            if exists:
+                yield image_hash, stored[image_hash]
+
+    def stats(self) -> dict:
+        cache_keys = list(self._scan_entries())
+        pipe = self._client.pipeline(transaction=False)
+        for cache_key in cache_keys:
+            pipe.hmget(self._entry_key(cache_key), ("access_count", "size_bytes", "created_at", "accessed_at"))
+        rows = [row for row in pipe.execute() if row and row[0] is not None]
+        created = [row[2].decode() for row in rows if row[2]]
+        accessed = [row[3].decode() for row in rows if row[3]]
+        descriptions = sum(1 for _ in self._client.scan_iter(match=self._description_key("*"), count=500))
+        return {
+            "total_entries": len(rows),
+            "total_accesses": sum(int(row[0]) for row in rows),
+            "oldest_entry": min(created) if created else None,
+            "most_recent_access": max(accessed) if accessed else None,
+            "total_bytes": sum(int(row[1] or 0) for row in rows),
+            "distinct_images": len({cache_key.split(":", 1)[0] for cache_key in cache_keys}),
+            "shared_descriptions": descriptions,
+        }
+
+    def close(self):
+        try:
+            self._client.close()
+        except Exception as e:
+            logger.debug(f"Error closing redis client: {e}")
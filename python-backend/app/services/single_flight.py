@@ -0,0 +1,79 @@
+"""
+Single-flight coalescing of identical concurrent async calls
+The first caller for a key (the leader) runs the work; callers arriving while
+it is in flight (followers) await the same result instead of repeating it
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Flight(Generic[T]):
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task[T]"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    """
+    Per-key deduplication of in-flight coroutines (event-loop local)
+
+    The shared work runs as its own task, so a caller that goes away (e.g. a
+    cancelled request) does not abort it for the others; it is cancelled only
+    when every caller waiting on it has left. Exceptions reach all callers.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight[T]] = {}
+        self._leaders = 0
+        self._coalesced = 0
+
+    async def run(self, key: str, work: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await work() for key, sharing a call already in flight
+
+        Args:
+            key: Identity of the work (e.g. the analysis cache key)
+            work: Zero-argument coroutine function, only called by the leader
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(work()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self._leaders += 1
+        else:
+            self._coalesced += 1
+            logger.info(f"Coalesced request for {key[:8]} with the call already in flight")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: str, flight: _Flight[T]):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            # Mark a failure as retrieved: waiters re-raise it through shield(),
+            # and with none left asyncio would log it as never retrieved
+            flight.task.exception()
+
+    def get_stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self._leaders,
+            "coalesced": self._coalesced,
+        }
@@ -0,0 +1,627 @@
+"""
+SQLite storage for the image analysis cache
+Entries live in one local database file, or are spread over N files by
+image-hash prefix so that writers on different shards never wait on the same
+lock; every row of an image (all variants and its shared description) lands
+in the same shard
+"""
+
+import heapq
+import logging
+import re
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from app.services.cache_backend import (
+    SEARCH_FIELDS,
+    AnalysisCacheBackend,
+    SearchHit,
+    StoredAnalysis,
+    StoredDescription,
+    search_fields,
+)
+from app.services.cache_codec import decode_payload
+from app.services.perceptual_hash import to_signed, to_unsigned
+from app.services.sqlite_pool import SQLiteConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the table layout changes; see SQLiteCacheBackend._migrate
+SCHEMA_VERSION = 7
+
+# Statements are module constants so each pooled connection's statement cache
+# can reuse the prepared form across calls
+_SELECT_ENTRY_SQL = """
+    SELECT cache_key, image_hash, variant_key, image_context, metadata, codec, phash, expires_at, created_at
+    FROM analysis_cache WHERE cache_key = ?
+"""
+# A real upsert rather than INSERT OR REPLACE: REPLACE deletes the old row
+# without firing the delete trigger that keeps the search index in sync
+_UPSERT_ENTRY_SQL = """
+    INSERT INTO analysis_cache
+    (cache_key, image_hash, variant_key, image_context, metadata, codec, phash, size_bytes,
+     expires_at, brief_caption, semantic_tags, mood, style, created_at, accessed_at, access_count)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 1)
+    ON CONFLICT(cache_key) DO UPDATE SET
+        image_hash = excluded.image_hash,
+        variant_key = excluded.variant_key,
+        image_context = excluded.image_context,
+        metadata = excluded.metadata,
+        codec = excluded.codec,
+        phash = excluded.phash,
+        size_bytes = excluded.size_bytes,
+        expires_at = excluded.expires_at,
+        brief_caption = excluded.brief_caption,
+        semantic_tags = excluded.semantic_tags,
+        mood = excluded.mood,
+        style = excluded.style,
+        created_at = CURRENT_TIMESTAMP,
+        accessed_at = CURRENT_TIMESTAMP,
+        access_count = 1
+"""
+_FLUSH_ACCESS_SQL = """
+    UPDATE analysis_cache
+    SET accessed_at = MAX(accessed_at, ?),
+        access_count = access_count + ?
+    WHERE cache_key = ?
+"""
+_SELECT_VARIANT_HASHES_SQL = "SELECT image_hash FROM analysis_cache WHERE variant_key = ? AND expires_at > ?"
+_SELECT_PHASHES_SQL = "SELECT DISTINCT image_hash, phash FROM analysis_cache WHERE phash IS NOT NULL"
+_DELETE_ENTRY_SQL = "DELETE FROM analysis_cache WHERE cache_key = ?"
+_SELECT_EXPIRED_BATCH_SQL = """
+    SELECT cache_key, image_hash FROM analysis_cache
+    WHERE expires_at < ? ORDER BY expires_at LIMIT ?
+"""
+# Victim selection per eviction policy; each ORDER BY is served by an index.
+# Candidates from several shards are merged with the matching sort key.
+_EVICTION_ORDER_SQL = {
+    "lru": (
+        "SELECT cache_key, image_hash, size_bytes, accessed_at, access_count FROM analysis_cache "
+        "ORDER BY accessed_at LIMIT ?"
+    ),
+    "lfu": (
+        "SELECT cache_key, image_hash, size_bytes, accessed_at, access_count FROM analysis_cache "
+        "ORDER BY access_count, accessed_at LIMIT ?"
+    ),
+}
+_EVICTION_SORT_KEY = {
+    "lru": lambda row: row[3],
+    "lfu": lambda row: (row[4], row[3]),
+}
+_TOTALS_SQL = "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM analysis_cache"
+_IMAGE_HAS_ROWS_SQL = "SELECT 1 FROM analysis_cache WHERE image_hash = ? LIMIT 1"
+_DELETE_IMAGE_DESCRIPTIONS_SQL = "DELETE FROM analysis_descriptions WHERE image_hash = ?"
+_SELECT_DESCRIPTION_SQL = """
+    SELECT description_key, image_hash, description, model_used, model_fallback_used, created_at
+    FROM analysis_descriptions WHERE description_key = ?
+"""
+_UPSERT_DESCRIPTION_SQL = """
+    INSERT OR REPLACE INTO analysis_descriptions
+    (description_key, image_hash, description, model_used, model_fallback_used, created_at)
+    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+"""
+_DELETE_EXPIRED_DESCRIPTIONS_SQL = "DELETE FROM analysis_descriptions WHERE created_at < ?"
+# External-content FTS5 index over the searchable columns of analysis_cache,
+# kept in sync by triggers so every write, eviction and expiry updates it in
+# the same transaction. The update trigger only fires for the indexed columns,
+# not for access-time bookkeeping.
+_SEARCH_SCHEMA_SQL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS analysis_search USING fts5(
+        brief_caption, semantic_tags, mood, style,
+        content = 'analysis_cache', content_rowid = 'rowid',
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS analysis_search_insert AFTER INSERT ON analysis_cache BEGIN
+        INSERT INTO analysis_search (rowid, brief_caption, semantic_tags, mood, style)
+        VALUES (new.rowid, new.brief_caption, new.semantic_tags, new.mood, new.style);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS analysis_search_delete AFTER DELETE ON analysis_cache BEGIN
+        INSERT INTO analysis_search (analysis_search, rowid, brief_caption, semantic_tags, mood, style)
+        VALUES ('delete', old.rowid, old.brief_caption, old.semantic_tags, old.mood, old.style);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS analysis_search_update
+    AFTER UPDATE OF brief_caption, semantic_tags, mood, style ON analysis_cache BEGIN
+        INSERT INTO analysis_search (analysis_search, rowid, brief_caption, semantic_tags, mood, style)
+        VALUES ('delete', old.rowid, old.brief_caption, old.semantic_tags, old.mood, old.style);
+        INSERT INTO analysis_search (rowid, brief_caption, semantic_tags, mood, style)
+        VALUES (new.rowid, new.brief_caption, new.semantic_tags, new.mood, new.style);
+    END
+    """,
+)
+# Column weights for bm25(), in SEARCH_FIELDS order: captions and tags say more
+# about an asset than the one-word mood/style labels
+_SEARCH_WEIGHTS = (3.0, 2.0, 1.0, 1.0)
+# Best-ranked variant per image; SQLite fills the bare column (id) from the row
+# that produced MIN(rank). bm25() is not allowed inside an aggregate, so matches
+# are materialized first (a plain subquery would be flattened back into one),
+# keeping only rowid and hash so the text columns are read for the page alone.
+# The window count returns the number of matching images in the same pass.
+_SEARCH_SQL = """
+    WITH matches AS MATERIALIZED (
+        SELECT c.rowid AS id, c.image_hash, bm25(analysis_search, {weights}) AS rank
+        FROM analysis_search JOIN analysis_cache c ON c.rowid = analysis_search.rowid
+        WHERE analysis_search MATCH ? AND c.expires_at > ? {variant_filter}
+    ),
+    page AS (
+        SELECT id, MIN(rank) AS rank, COUNT(*) OVER () AS total
+        FROM matches
+        GROUP BY image_hash
+        ORDER BY rank
+        LIMIT ? OFFSET ?
+    )
+    SELECT c.cache_key, c.image_hash, c.variant_key, page.rank,
+           c.brief_caption, c.semantic_tags, c.mood, c.style, c.created_at, page.total
+    FROM page JOIN analysis_cache c ON c.rowid = page.id
+    ORDER BY page.rank
+"""
+_SEARCH_COUNT_SQL = """
+    SELECT COUNT(DISTINCT c.image_hash)
+    FROM analysis_search JOIN analysis_cache c ON c.rowid = analysis_search.rowid
+    WHERE analysis_search MATCH ? AND c.expires_at > ? {variant_filter}
+"""
+
+
+def _fts_query(text: str, fields: Optional[Sequence[str]] = None) -> Optional[str]:
+    """
+    Turn user input into a safe FTS5 expression: every word as a quoted prefix
+    term (so FTS syntax in the input is never interpreted), optionally limited
+    to some columns
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    expression = " ".join(f'"{word}"*' for word in words)
+    columns = [name for name in (fields or ()) if name in SEARCH_FIELDS]
+    if columns:
+        expression = f"{{{' '.join(columns)}}} : ({expression})"
+    return expression
+
+
+_STATS_SQL = """
+    SELECT
+        COUNT(*) as total_entries,
+        SUM(access_count) as total_accesses,
+        MIN(created_at) as oldest_entry,
+        MAX(accessed_at) as most_recent_access,
+        SUM(size_bytes) as total_bytes,
+        COUNT(DISTINCT image_hash) as distinct_images,
+        (SELECT COUNT(*) FROM analysis_descriptions) as shared_descriptions
+    FROM analysis_cache
+"""
+
+
+class SQLiteCacheBackend(AnalysisCacheBackend):
+    """Local SQLite files, optionally sharded by image-hash prefix"""
+
+    name = "sqlite"
+    supports_search = True
+
+    def __init__(self, cache_dir: Path, shards: int = 1, default_ttl_seconds: int = 30 * 86400):
+        """
+        Args:
+            cache_dir: Directory holding the database file(s)
+            shards: Number of SQLite files entries are spread over by image hash
+                prefix; each has its own writer lock and connection pool. Rows of
+                the single-file cache are moved into the shards on first open;
+                changing between shard counts starts from empty shard files.
+            default_ttl_seconds: TTL given to rows that predate per-entry expiry
+        """
+        self.default_ttl_seconds = default_ttl_seconds
+        self.shards = max(int(shards), 1)
+        if self.shards == 1:
+            self.db_paths = [cache_dir / "image_analysis_cache.db"]
+        else:
+            self.db_paths = [
+                cache_dir / f"image_analysis_cache.{index:02d}-of-{self.shards:02d}.db"
+                for index in range(self.shards)
+            ]
+        self._pools = [SQLiteConnectionPool(db_path) for db_path in self.db_paths]
+        self._init_db()
+        legacy_path = cache_dir / "image_analysis_cache.db"
+        if self.shards > 1 and legacy_path.exists():
+            self._import_legacy(legacy_path)
+
+    @property
+    def location(self) -> str:
+        if self.shards == 1:
+            return str(self.db_paths[0])
+        return f"{self.db_paths[0].parent} ({self.shards} shards)"
+
+    def _init_db(self):
+        """Create database tables if they don't exist, migrating older layouts"""
+        try:
+            for pool in self._pools:
+                self._init_shard(pool)
+            logger.debug("Cache database initialized")
+        except Exception as e:
+            logger.error(f"Error initializing cache database: {e}")
+            raise
+
+    def _init_shard(self, pool: SQLiteConnectionPool):
+        """Create or migrate the tables of one shard file"""
+        with pool.transaction() as conn:
+            migrated_from = self._migrate(conn, self.default_ttl_seconds)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    image_hash TEXT NOT NULL,
+                    variant_key TEXT NOT NULL,
+                    image_context BLOB NOT NULL,
+                    metadata BLOB NOT NULL,
+                    codec INTEGER DEFAULT 0,
+                    phash INTEGER,
+                    size_bytes INTEGER DEFAULT 0,
+                    expires_at TIMESTAMP,
+                    brief_caption TEXT,
+                    semantic_tags TEXT,
+                    mood TEXT,
+                    style TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    accessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    access_count INTEGER DEFAULT 1
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analysis_cache_image_hash ON analysis_cache (image_hash)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analysis_cache_created_at ON analysis_cache (created_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analysis_cache_accessed_at ON analysis_cache (accessed_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analysis_cache_expires_at ON analysis_cache (expires_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analysis_cache_lfu "
+                "ON analysis_cache (access_count, accessed_at)"
+            )
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_descriptions (
+                    description_key TEXT PRIMARY KEY,
+                    image_hash TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    model_used TEXT NOT NULL,
+                    model_fallback_used INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            for statement in _SEARCH_SCHEMA_SQL:
+                conn.execute(statement)
+            if migrated_from is not None and migrated_from < 7:
+                # Index the rows back-filled by _migrate
+                conn.execute("INSERT INTO analysis_search (analysis_search) VALUES ('rebuild')")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _import_legacy(self, legacy_path: Path, batch_size: int = 500):
+        """
+        Move the rows of the single-file cache into their shards
+
+        Runs under the legacy file's write lock and copies with INSERT OR IGNORE
+        before emptying it, so concurrent workers import once and an interrupted
+        import is simply resumed on the next open. The emptied file is left in place.
+        """
+        legacy = SQLiteConnectionPool(legacy_path)
+        try:
+            self._init_shard(legacy)
+            with legacy.transaction() as conn:
+                moved = 0
+                for table in ("analysis_cache", "analysis_descriptions"):
+                    cursor = conn.execute(f"SELECT * FROM {table}")
+                    columns = [column[0] for column in cursor.description]
+                    hash_index = columns.index("image_hash")
+                    insert_sql = (
+                        f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join('?' for _ in columns)})"
+                    )
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        for pool, shard_rows in self._group_by_shard(rows, lambda row: row[hash_index]).items():
+                            with pool.transaction() as shard_conn:
+                                shard_conn.executemany(insert_sql, shard_rows)
+                        if table == "analysis_cache":
+                            moved += len(rows)
+                    conn.execute(f"DELETE FROM {table}")
+            if moved:
+                logger.info(f"Moved {moved} cached analyses from {legacy_path.name} into {self.shards} shards")
+        except Exception as e:
+            logger.warning(f"Could not import the single-file cache {legacy_path}: {e}")
+        finally:
+            legacy.close_all()
+
+    @staticmethod
+    def _migrate(conn, default_ttl_seconds: int) -> Optional[int]:
+        """
+        Bring an existing database up to the current schema (tracked in user_version)
+
+        Returns:
+            The version migrated from, or None if there was nothing to migrate
+        """
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        table_exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'analysis_cache'"
+        ).fetchone()
+        if not table_exists or version >= SCHEMA_VERSION:
+            return None
+
+        if version < 2:
+            # Rows before v2 were keyed by image bytes only, so the language, deep
+            # thinking and user prompt they were produced for is unknown
+            legacy_rows = conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+            conn.execute("DROP TABLE analysis_cache")
+            logger.warning(f"Discarded {legacy_rows} legacy cache rows without analysis variant")
+            return None
+
+        if version < 3:
+            conn.execute("ALTER TABLE analysis_cache ADD COLUMN size_bytes INTEGER DEFAULT 0")
+            conn.execute("UPDATE analysis_cache SET size_bytes = length(image_context) + length(metadata)")
+
+        if version < 4:
+            # Existing rows keep codec 0 (pretty JSON) and are validated on read
+            conn.execute("ALTER TABLE analysis_cache ADD COLUMN codec INTEGER DEFAULT 0")
+
+        if version < 5:
+            # Per-entry TTLs; existing rows keep the cache-wide max age
+            conn.execute("ALTER TABLE analysis_cache ADD COLUMN expires_at TIMESTAMP")
+            conn.execute(
+                "UPDATE analysis_cache SET expires_at = datetime(created_at, ?)",
+                (f"+{int(default_ttl_seconds)} seconds",),
+            )
+
+        if version < 6:
+            # Searchable text is copied out of the encoded blobs once; new rows
+            # carry it from the write path
+            for column in SEARCH_FIELDS:
+                conn.execute(f"ALTER TABLE analysis_cache ADD COLUMN {column} TEXT")
+
+        if version < 7:
+            # v6 indexed the analyzer's placeholder mood/style/tags; re-derive
+            # the searchable text without them
+            rows = conn.execute("SELECT rowid, image_context, codec FROM analysis_cache").fetchall()
+            updates = []
+            for rowid, image_context, codec in rows:
+                try:
+                    fields = search_fields(decode_payload(image_context, codec))
+                except Exception as e:
+                    logger.warning(f"Could not index cache row {rowid} for search: {e}")
+                    continue
+                updates.append((*(fields[name] for name in SEARCH_FIELDS), rowid))
+            conn.executemany(
+                f"UPDATE analysis_cache SET {', '.join(f'{name} = ?' for name in SEARCH_FIELDS)} WHERE rowid = ?",
+                updates,
+            )
+            logger.info(f"Indexed {len(updates)} cached analyses for full-text search")
+
+        return version
+
+    def _pool_for(self, image_hash: str) -> SQLiteConnectionPool:
+        """Shard holding every row (all variants and descriptions) of an image"""
+        if self.shards == 1:
+            return self._pools[0]
+        return self._pools[int(image_hash[:8], 16) % self.shards]
+
+    def _pool_for_key(self, key: str) -> SQLiteConnectionPool:
+        """Shard for a cache or description key ("<image_hash>:<suffix>")"""
+        return self._pool_for(key.split(":", 1)[0])
+
+    def _group_by_shard(self, items: Iterable, image_hash_of: Callable) -> Dict[SQLiteConnectionPool, list]:
+        """Split items into per-shard lists so each shard gets one transaction"""
+        groups: Dict[SQLiteConnectionPool, list] = {}
+        for item in items:
+            groups.setdefault(self._pool_for(image_hash_of(item)), []).append(item)
+        return groups
+
+    def get_many(self, cache_keys: Sequence[str]) -> Dict[str, StoredAnalysis]:
+        found = {}
+        for cache_key in cache_keys:
+            row = self._pool_for_key(cache_key).connection().execute(_SELECT_ENTRY_SQL, (cache_key,)).fetchone()
+            if row:
+                cache_key, image_hash, variant_key, image_context, metadata, codec, phash, expires_at, created_at = row
+                found[cache_key] = StoredAnalysis(
+                    cache_key=cache_key,
+                    image_hash=image_hash,
+                    variant_key=variant_key,
+                    image_context=image_context,
+                    metadata=metadata,
+                    codec=codec,
+                    phash=to_unsigned(phash) if phash is not None else None,
+                    expires_at=expires_at,
+                    created_at=created_at,
+                )
+        return found
+
+    def set_many(self, entries: Sequence[StoredAnalysis]):
+        rows = [
+            (
+                entry.cache_key,
+                entry.image_hash,
+                entry.variant_key,
+                entry.image_context,
+                entry.metadata,
+                entry.codec,
+                to_signed(entry.phash) if entry.phash is not None else None,
+                entry.size_bytes,
+                entry.expires_at,
+                *(
+                    (entry.search_fields or {}).get(name)
+                    for name in SEARCH_FIELDS
+                ),
+            )
+            for entry in entries
+        ]
+        for pool, shard_rows in self._group_by_shard(rows, lambda row: row[1]).items():
+            with pool.transaction() as conn:
+                conn.executemany(_UPSERT_ENTRY_SQL, shard_rows)
+
+    def delete_many(self, rows: Sequence[Tuple[str, str]]) -> Set[str]:
+        """Delete rows in one short transaction per shard, with orphaned descriptions"""
+        orphaned = set()
+        for pool, shard_rows in self._group_by_shard(rows, lambda row: row[1]).items():
+            with pool.transaction() as conn:
+                conn.executemany(_DELETE_ENTRY_SQL, [(cache_key,) for cache_key, _ in shard_rows])
+                shard_orphaned = {
+                    image_hash for _, image_hash in shard_rows
+                    if conn.execute(_IMAGE_HAS_ROWS_SQL, (image_hash,)).fetchone() is None
+                }
+                conn.executemany(
+                    _DELETE_IMAGE_DESCRIPTIONS_SQL, [(image_hash,) for image_hash in shard_orphaned]
+                )
+            orphaned |= shard_orphaned
+        return orphaned
+
+    def get_description(self, description_key: str) -> Optional[StoredDescription]:
+        row = self._pool_for_key(description_key).connection().execute(
+            _SELECT_DESCRIPTION_SQL, (description_key,)
+        ).fetchone()
+        if not row:
+            return None
+        return StoredDescription(
+            description_key=row[0],
+            image_hash=row[1],
+            description=row[2],
+            model_used=row[3],
+            model_fallback_used=bool(row[4]),
+            created_at=row[5],
+        )
+
+    def set_description(self, description: StoredDescription):
+        with self._pool_for(description.image_hash).transaction() as conn:
+            conn.execute(
+                _UPSERT_DESCRIPTION_SQL,
+                (
+                    description.description_key,
+                    description.image_hash,
+                    description.description,
+                    description.model_used,
+                    int(description.model_fallback_used),
+                )
+            )
+
+    def record_access(self, rows: Sequence[Tuple[str, int, str]]):
+        """Persist buffered hits in one transaction per shard"""
+        for pool, shard_rows in self._group_by_shard(rows, lambda row: row[2].split(":", 1)[0]).items():
+            with pool.transaction() as conn:
+                conn.executemany(_FLUSH_ACCESS_SQL, shard_rows)
+
+    def image_hashes(self, variant_key: str, fresh_at: str) -> Set[str]:
+        return {
+            row[0]
+            for pool in self._pools
+            for row in pool.connection().execute(_SELECT_VARIANT_HASHES_SQL, (variant_key, fresh_at))
+        }
+
+    def phashes(self) -> Iterator[Tuple[str, int]]:
+        for pool in self._pools:
+            for image_hash, phash in pool.connection().execute(_SELECT_PHASHES_SQL):
+                yield image_hash, to_unsigned(phash)
+
+    def expired_batch(self, cutoff: str, limit: int) -> List[Tuple[str, str]]:
+        rows = []
+        for pool in self._pools:
+            rows.extend(pool.connection().execute(_SELECT_EXPIRED_BATCH_SQL, (cutoff, limit - len(rows))))
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def delete_expired_descriptions(self, cutoff: str):
+        for pool in self._pools:
+            with pool.transaction() as conn:
+                conn.execute(_DELETE_EXPIRED_DESCRIPTIONS_SQL, (cutoff,))
+
+    def search(
+        self,
+        query: str,
+        live_after: str,
+        limit: int,
+        offset: int = 0,
+        variant_key: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None
+    ) -> Tuple[int, List[SearchHit]]:
+        """
+        FTS5 search ranked by bm25, entirely in SQL
+
+        With several shards each one returns its top offset + limit hits and the
+        pages are merged by rank; bm25 statistics are per shard, so rankings
+        across shards are approximate.
+        """
+        expression = _fts_query(query, fields)
+        if expression is None:
+            return 0, []
+
+        variant_filter = "AND c.variant_key = ?" if variant_key else ""
+        params = (expression, live_after, *((variant_key,) if variant_key else ()))
+        search_sql = _SEARCH_SQL.format(
+            weights=", ".join(str(weight) for weight in _SEARCH_WEIGHTS), variant_filter=variant_filter
+        )
+        count_sql = _SEARCH_COUNT_SQL.format(variant_filter=variant_filter)
+
+        total = 0
+        shard_rows = []
+        for pool in self._pools:
+            conn = pool.connection()
+            if self.shards == 1:
+                rows = conn.execute(search_sql, (*params, limit, offset)).fetchall()
+            else:
+                rows = conn.execute(search_sql, (*params, offset + limit, 0)).fetchall()
+            # A page past the end carries no window total; count separately
+            total += rows[0][9] if rows else conn.execute(count_sql, params).fetchone()[0] if offset else 0
+            shard_rows.append(rows)
+
+        rows = shard_rows[0] if self.shards == 1 else list(
+            heapq.merge(*shard_rows, key=lambda row: row[3])
+        )[offset:offset + limit]
+        return total, [
+            SearchHit(
+                cache_key=row[0],
+                image_hash=row[1],
+                variant_key=row[2],
+                score=-row[3],
+                fields=dict(zip(SEARCH_FIELDS, (value or "" for value in row[4:8]))),
+                created_at=row[8],
+            )
+            for row in rows
+        ]
+
+    def totals(self) -> Tuple[int, int]:
+        totals = [pool.connection().execute(_TOTALS_SQL).fetchone() for pool in self._pools]
+        return sum(row[0] for row in totals), sum(row[1] for row in totals)
+
+    def eviction_candidates(self, policy: str, limit: int) -> List[Tuple[str, str, int]]:
+        """Each shard's best candidates, merged into one global victim order"""
+        candidates = [
+            row
+            for pool in self._pools
+            for row in pool.connection().execute(_EVICTION_ORDER_SQL[policy], (limit,))
+        ]
+        candidates.sort(key=_EVICTION_SORT_KEY[policy])
+        return [(cache_key, image_hash, size_bytes or 0) for cache_key, image_hash, size_bytes, _, _ in candidates[:limit]]
+
+    def stats(self) -> dict:
+        rows = [pool.connection().execute(_STATS_SQL).fetchone() for pool in self._pools]
+        oldest = [row[2] for row in rows if row[2]]
+        recent = [row[3] for row in rows if row[3]]
+        return {
+            "total_entries": sum(row[0] or 0 for row in rows),
+            "total_accesses": sum(row[1] or 0 for row in rows),
+            "oldest_entry": min(oldest) if oldest else None,
+            "most_recent_access": max(recent) if recent else None,
+            "total_bytes": sum(row[4] or 0 for row in rows),
+            # Every row of an image lives in the same shard, so per-shard counts add up
+            "distinct_images": sum(row[5] or 0 for row in rows),
+            "shared_descriptions": sum(row[6] or 0 for row in rows),
+            "shards": self.shards,
+        }
+
+    def close(self):
+        for pool in self._pools:
+            pool.close_all()
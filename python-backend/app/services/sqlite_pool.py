@@ -0,0 +1,108 @@
+"""
+Per-thread SQLite connection layer for the backend caches
+Keeps one tuned connection per thread (WAL journal, relaxed fsync, larger page
+cache and memory-mapped reads) instead of opening a connection per operation
+"""
+
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteConnectionPool:
+    """Hands out one reusable, WAL-mode connection per thread for a database file"""
+
+    def __init__(
+        self,
+        db_path: Path,
+        synchronous: str = "NORMAL",
+        cache_size_kib: int = 16 * 1024,
+        mmap_size_bytes: int = 128 * 1024 * 1024,
+        busy_timeout_ms: int = 5000,
+        cached_statements: int = 128
+    ):
+        """
+        Initialize the connection pool
+
+        Args:
+            db_path: SQLite database file
+            synchronous: PRAGMA synchronous level (NORMAL is durable enough with WAL)
+            cache_size_kib: Page cache size per connection in KiB
+            mmap_size_bytes: Bytes of the database file memory-mapped for reads
+            busy_timeout_ms: How long a writer waits for the lock before failing
+            cached_statements: Prepared statements kept per connection
+        """
+        self.db_path = Path(db_path)
+        self.synchronous = synchronous
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size_bytes = mmap_size_bytes
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._registry_lock = threading.Lock()
+
+        # WAL is persistent in the database file, so switching once is enough
+        journal_mode = self.connection().execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        logger.debug(f"SQLite pool ready for {self.db_path} (journal_mode={journal_mode})")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open and tune a new connection"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,  # explicit transactions via transaction()
+            check_same_thread=False,  # only so close_all() can run from another thread
+            cached_statements=self.cached_statements,
+        )
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size_bytes)}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._registry_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run a write transaction on the thread's connection
+
+        BEGIN IMMEDIATE takes the write lock up front so concurrent writers queue
+        on busy_timeout instead of failing with SQLITE_BUSY on upgrade.
+        """
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def close_all(self):
+        """Close every connection handed out by this pool"""
+        with self._registry_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Error closing SQLite connection: {e}")
+        self._local = threading.local()
@@ -0,0 +1,265 @@
+"""
+Speech-to-text transcription cache
+Stores and retrieves Faster-Whisper results keyed by a hash of the decoded PCM
+plus the decoding/transcription parameters, so re-uploads of the same audio
+(retries, re-encoded voice-overs) skip the model entirely
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.services.sqlite_pool import SQLiteConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionCache:
+    """SQLite-based cache for speech-to-text results"""
+
+    def __init__(
+        self,
+        cache_dir: Path = None,
+        max_age_days: int = 30,
+        max_entries: int = 5000
+    ):
+        """
+        Initialize the transcription cache
+
+        Args:
+            cache_dir: Directory to store cache database (default: ./cache)
+            max_age_days: Maximum age of cached results before expiration
+            max_entries: Maximum number of rows kept; least recently used rows are evicted beyond it
+        """
+        self.cache_dir = cache_dir or Path(__file__).parent.parent.parent / "cache"
+        self.cache_dir.mkdir(exist_ok=True)
+        self.db_path = self.cache_dir / "transcription_cache.db"
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        self._pool = SQLiteConnectionPool(self.db_path)
+        self._hits = 0
+        self._misses = 0
+
+        self._init_db()
+        logger.info(f"TranscriptionCache initialized at {self.db_path}")
+
+    def _init_db(self):
+        """Create database tables if they don't exist"""
+        try:
+            with self._pool.transaction() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS transcription_cache (
+                        audio_hash TEXT PRIMARY KEY,
+                        result JSON NOT NULL,
+                        audio_seconds REAL DEFAULT 0,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        accessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        access_count INTEGER DEFAULT 1
+                    )
+                """)
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_transcription_accessed_at "
+                    "ON transcription_cache (accessed_at)"
+                )
+            logger.debug("Transcription cache database initialized")
+        except Exception as e:
+            logger.error(f"Error initializing transcription cache database: {e}")
+            raise
+
+    @staticmethod
+    def compute_audio_hash(pcm_bytes: bytes, params: Dict[str, Any]) -> str:
+        """
+        Compute SHA-256 of decoded PCM samples plus decoding parameters
+
+        Hashing the decoded samples (instead of the uploaded file) makes the key
+        independent of container/codec metadata, while the parameters keep results
+        from different models or beam sizes apart.
+
+        Args:
+            pcm_bytes: Raw decoded PCM samples
+            params: Decoding and transcription parameters that affect the result
+
+        Returns:
+            Hex string of the SHA-256 digest
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+        digest.update(pcm_bytes)
+        return digest.hexdigest()
+
+    def get(self, audio_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve cached transcription
+
+        Args:
+            audio_hash: Key produced by compute_audio_hash
+
+        Returns:
+            Transcription dict (text, language, probability) or None if not found/expired
+        """
+        try:
+            row = self._pool.connection().execute(
+                "SELECT result, created_at FROM transcription_cache WHERE audio_hash = ?",
+                (audio_hash,)
+            ).fetchone()
+
+            if not row:
+                self._misses += 1
+                return None
+
+            result_data, created_at = row
+            created_dt = datetime.fromisoformat(created_at)
+            if datetime.utcnow() - created_dt > timedelta(days=self.max_age_days):
+                self._delete(audio_hash)
+                self._misses += 1
+                logger.info(f"Transcription cache expired for hash {audio_hash[:8]}")
+                return None
+
+            self._update_access(audio_hash)
+            self._hits += 1
+            logger.info(f"Transcription cache hit for hash {audio_hash[:8]}")
+            return json.loads(result_data)
+
+        except Exception as e:
+            logger.error(f"Error retrieving transcription cache: {e}")
+            return None
+
+    def set(self, audio_hash: str, result: Dict[str, Any], audio_seconds: float = 0.0) -> bool:
+        """
+        Store transcription in cache and evict beyond max_entries
+
+        Args:
+            audio_hash: Key produced by compute_audio_hash
+            result: Transcription dict returned to the client
+            audio_seconds: Duration of the decoded audio, for stats
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            with self._pool.transaction() as conn:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO transcription_cache
+                    (audio_hash, result, audio_seconds, created_at, accessed_at, access_count)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 1)
+                    """,
+                    (audio_hash, json.dumps(result, ensure_ascii=False), audio_seconds)
+                )
+                self._evict_overflow(conn)
+
+            logger.info(f"Cached transcription for hash {audio_hash[:8]}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error storing transcription cache: {e}")
+            return False
+
+    def _evict_overflow(self, conn: sqlite3.Connection):
+        """Delete least recently used rows beyond max_entries"""
+        if self.max_entries <= 0:
+            return
+        cursor = conn.execute(
+            """
+            DELETE FROM transcription_cache WHERE audio_hash IN (
+                SELECT audio_hash FROM transcription_cache
+                ORDER BY accessed_at DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,)
+        )
+        if cursor.rowcount:
+            logger.info(f"Evicted {cursor.rowcount} transcription cache entries over limit")
+
+    def _update_access(self, audio_hash: str):
+        """Update access metadata when cache is hit"""
+        try:
+            with self._pool.transaction() as conn:
+                conn.execute(
+                    """
+                    UPDATE transcription_cache
+                    SET accessed_at = CURRENT_TIMESTAMP,
+                        access_count = access_count + 1
+                    WHERE audio_hash = ?
+                    """,
+                    (audio_hash,)
+                )
+        except Exception as e:
+            logger.warning(f"Error updating transcription cache access metadata: {e}")
+
+    def _delete(self, audio_hash: str):
+        """Delete a cache entry"""
+        try:
+            with self._pool.transaction() as conn:
+                conn.execute("DELETE FROM transcription_cache WHERE audio_hash = ?", (audio_hash,))
+        except Exception as e:
+            logger.warning(f"Error deleting transcription cache entry: {e}")
+
+    def clear_expired(self) -> int:
+        """
+        Remove all expired cache entries
+
+        Returns:
+            Number of entries deleted
+        """
+        try:
+            cutoff_date = (datetime.utcnow() - timedelta(days=self.max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+
+            with self._pool.transaction() as conn:
+                deleted = conn.execute(
+                    "DELETE FROM transcription_cache WHERE created_at < ?",
+                    (cutoff_date,)
+                ).rowcount
+
+            logger.info(f"Cleaned {deleted} expired transcription cache entries")
+            return deleted
+
+        except Exception as e:
+            logger.error(f"Error clearing expired transcription cache: {e}")
+            return 0
+
+    def get_stats(self) -> dict:
+        """Get cache statistics"""
+        lookups = self._hits + self._misses
+        session_stats = {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+            "max_entries": self.max_entries,
+            "max_age_days": self.max_age_days,
+        }
+
+        try:
+            row = self._pool.connection().execute(
+                """
+                SELECT
+                    COUNT(*) as total_entries,
+                    SUM(access_count) as total_accesses,
+                    SUM(audio_seconds) as cached_audio_seconds,
+                    MIN(created_at) as oldest_entry,
+                    MAX(accessed_at) as most_recent_access
+                FROM transcription_cache
+                """
+            ).fetchone()
+
+            return {
+                "total_entries": row[0] or 0,
+                "total_accesses": row[1] or 0,
+                "cached_audio_seconds": round(row[2] or 0, 1),
+                "oldest_entry": row[3],
+                "most_recent_access": row[4],
+                **session_stats,
+            }
+
+        except Exception as e:
+            logger.error(f"Error getting transcription cache stats: {e}")
+            return session_stats
+
+    def close(self):
+        """Close pooled database connections"""
+        self._pool.close_all()
@@ -60,6 +60,7 @@ if hf_hub_download is None:
     print("⚠️ Advertencia: huggingface_hub no disponible.")
 
 WhisperModel = _import_attr("faster_whisper", "WhisperModel")
+decode_audio = _import_attr("faster_whisper", "decode_audio")
 if WhisperModel is None:
     print("⚠️ Advertencia: Faster-Whisper no encontrado.")
 
@@ -68,10 +69,11 @@ if Kokoro is None:
     print("⚠️ Advertencia: Kokoro-ONNX no encontrado.")
 
 try:
-    from app.routes.image_analysis import router as image_analyzer_router
+    from app.routes.image_analysis import router as image_analyzer_router, shutdown_analyzer
 except ImportError:
     print("⚠️ Advertencia: Image Analyzer no disponible (faltan dependencias CLIP/Ollama).")
     image_analyzer_router = None
+    shutdown_analyzer = None
 
 try:
     from app.routes.prompt_optimization import router as prompt_optimizer_router
@@ -79,6 +81,17 @@ except ImportError:
     print("⚠️ Advertencia: Prompt Optimizer no disponible (faltan dependencias Ollama/Pydantic).")
     prompt_optimizer_router = None
 
+try:
+    from app.routes.models import router as models_router
+except ImportError:
+    print("⚠️ Advertencia: Rutas de modelos no disponibles (faltan dependencias Ollama).")
+    models_router = None
+
+from app.services.model_registry import start_model_registries, stop_model_registries
+from app.services.model_residency import start_model_residency, stop_model_residency
+from app.services.ollama_client import close_ollama_clients
+from app.services.transcription_cache import TranscriptionCache
+
 # --- Configuración de Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -107,6 +120,10 @@ DEFAULT_VOICES = [
     {"id": "am_adam", "name": "Adam (EN)", "languages": ["en-US"], "gender": "male"},
 ]
 
+STT_MODEL_NAME = "large-v3-turbo"
+STT_SAMPLE_RATE = 16000
+STT_BEAM_SIZE = 5
+
 class ModelManager:
     def __init__(self):
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -177,7 +194,7 @@ class ModelManager:
             logger.info("👂 Cargando Faster-Whisper Large-v3-Turbo...")
             try:
                 # Usamos int8 para velocidad en la RTX 3050
-                self.stt_model = WhisperModel("large-v3-turbo", device=self.device, compute_type="int8")
+                self.stt_model = WhisperModel(STT_MODEL_NAME, device=self.device, compute_type="int8")
                 logger.info("✓ Faster-Whisper cargado correctamente")
             except Exception as e:
                 logger.error(f"Error cargando Whisper: {e}")
@@ -299,15 +316,24 @@ class ModelManager:
         return normalized or DEFAULT_VOICES
 
 model_manager = ModelManager()
+transcription_cache = TranscriptionCache(Path(__file__).parent / "cache")
 
 # --- Definición de la API FastAPI ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Inicio
     logger.info("🚀 Servidor Anclora Backend iniciado")
+    await start_model_registries()
+    await start_model_residency()
     yield
     # Cierre
     logger.info("🛑 Apagando servidor...")
+    if shutdown_analyzer:
+        shutdown_analyzer()
+    await stop_model_residency()
+    await stop_model_registries()
+    await close_ollama_clients()
+    transcription_cache.close()
 
 app = FastAPI(title="Anclora Local Backend", lifespan=lifespan)
 
@@ -332,6 +358,11 @@ if prompt_optimizer_router:
     app.include_router(prompt_optimizer_router)
     logger.info("✓ Prompt Optimizer router registrado")
 
+# Registrar router de modelos (registro de Ollama y enrutado)
+if models_router:
+    app.include_router(models_router)
+    logger.info("✓ Models router registrado")
+
 # --- Modelos de Datos (Pydantic) ---
 class TTSRequest(BaseModel):
     inputs: str
@@ -355,12 +386,16 @@ async def root():
         "capabilities": "/api/system/capabilities",
         "tts": "/api/tts",
         "stt": "/api/stt",
+        "stt_cache_stats": "/api/stt/cache-stats",
         "image": "/api/image"
     }
     if image_analyzer_router:
         endpoints.update({
             "image_analyze": "/api/images/analyze",
             "image_analyze_stream": "/api/images/analyze-stream",
+            "image_analyze_batch": "/api/images/analyze-batch",
+            "image_similar": "/api/images/similar",
+            "image_search": "/api/images/search",
             "image_health": "/api/images/health"
         })
     return {
@@ -428,24 +463,64 @@ async def transcribe_audio(file: UploadFile = File(...)):
 
         logger.info(f"👂 Transcribiendo audio ({len(contents)} bytes)...")
 
+        # Decodificar a PCM antes de cargar el modelo: la clave de caché depende
+        # del audio real, no del contenedor, y un acierto evita cargar Whisper
+        audio_input: Any = audio_file
+        audio_hash = None
+        audio_seconds = 0.0
+        if decode_audio is not None:
+            audio_input = decode_audio(audio_file, sampling_rate=STT_SAMPLE_RATE)
+            audio_seconds = len(audio_input) / STT_SAMPLE_RATE
+            audio_hash = TranscriptionCache.compute_audio_hash(
+                audio_input.tobytes(),
+                {
+                    "model": STT_MODEL_NAME,
+                    "sampling_rate": STT_SAMPLE_RATE,
+                    "beam_size": STT_BEAM_SIZE,
+                },
+            )
+            cached = transcription_cache.get(audio_hash)
+            if cached is not None:
+                logger.info("✓ Transcripción servida desde caché")
+                return {**cached, "cached": True}
+
         model = model_manager.load_stt()
 
-        segments, info = model.transcribe(audio_file, beam_size=5)
+        segments, info = model.transcribe(audio_input, beam_size=STT_BEAM_SIZE)
 
         text = "".join([segment.text for segment in segments])
 
         logger.info(f"✓ Transcripción completa: {len(text)} caracteres")
 
-        return {
+        result = {
             "text": text.strip(),
             "language": info.language,
             "probability": info.language_probability
         }
+        if audio_hash:
+            transcription_cache.set(audio_hash, result, audio_seconds)
 
+        return {**result, "cached": False}
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error STT: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/stt/cache-stats")
+async def get_stt_cache_stats():
+    """Estadísticas de la caché de transcripciones"""
+    try:
+        return {
+            "status": "ok",
+            "cache_stats": transcription_cache.get_stats(),
+            "cache_location": str(transcription_cache.db_path)
+        }
+    except Exception as e:
+        logger.error(f"Error obteniendo estadísticas de caché STT: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/image")
 async def generate_image(req: ImageRequest):
     """Genera imagen usando SDXL Lightning (4-step)"""
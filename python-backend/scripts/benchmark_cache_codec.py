@@ -0,0 +1,98 @@
+"""
+Row size and decode-time benchmark for the image analysis cache codec.
+
+Compares the legacy storage format (pretty JSON from model_dump_json(),
+validated through Pydantic on every read) with the current codec
+(compact JSON + zlib, trusted decode).
+
+Usage:
+    python benchmark_cache_codec.py --iterations 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.models.image_context import AnalysisMetadata, ImageContext  # noqa: E402
+from app.services.cache_codec import (  # noqa: E402
+  CURRENT_CODEC,
+  LEGACY_CODEC,
+  decode_entry,
+  encode_model,
+)
+
+logger = logging.getLogger("benchmark_cache_codec")
+
+
+def build_sample() -> tuple[ImageContext, AnalysisMetadata]:
+  description = (
+    "Cinematic wide shot of a minimalist coastal villa at golden hour, warm sunlight "
+    "raking across white stucco walls, infinity pool reflecting a pastel sky, "
+    "35mm lens, shallow depth of field, soft film grain, muted teal and amber palette. "
+  ) * 3
+  context = ImageContext(
+    brief_caption="Villa costera minimalista al atardecer",
+    detailed_description=description,
+    objects=["villa", "pool", "palm trees", "sun loungers"],
+    setting="exterior, coastal",
+    mood="serene, aspirational",
+    style="photorealistic, architectural photography",
+    colors=["blanco", "turquesa", "ámbar"],
+    composition="rule of thirds, leading lines from the pool edge",
+    lighting="golden hour backlighting",
+    technical_details={"lens": "35mm", "depth_of_field": "shallow"},
+    palette_hex=["#F5F1E8", "#3FA7A3", "#E0A458"],
+    semantic_tags=["architecture", "real-estate", "photography"],
+    generative_prompt=description,
+    adapted_prompts={
+      mode: f"{description}\n\n[{mode.upper()} MODE]: adapt for {mode}"
+      for mode in ("campaign", "recycle", "intelligent", "basic")
+    },
+  )
+  metadata = AnalysisMetadata(model_used="qwen3-vl:8b", processing_time_seconds=6.4)
+  return context, metadata
+
+
+def time_decode(context_data, metadata_data, codec: int, iterations: int) -> float:
+  started = time.perf_counter()
+  for _ in range(iterations):
+    decode_entry(context_data, metadata_data, codec)
+  return (time.perf_counter() - started) / iterations * 1e6
+
+
+def parse_args() -> argparse.Namespace:
+  parser = argparse.ArgumentParser(description="Benchmark cache storage codecs")
+  parser.add_argument("--iterations", type=int, default=5000, help="Decodes per codec (default: 5000)")
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  logging.basicConfig(level=logging.INFO, format="%(message)s")
+  context, metadata = build_sample()
+
+  legacy = (context.model_dump_json(indent=2), metadata.model_dump_json(indent=2))
+  current = (encode_model(context), encode_model(metadata))
+
+  # Sanity check: both formats round-trip to the same data
+  assert json.loads(legacy[0]) == decode_entry(*current, CURRENT_CODEC)[0].model_dump(mode="json")
+
+  for name, (context_data, metadata_data), codec in (
+    ("legacy", legacy, LEGACY_CODEC),
+    ("current", current, CURRENT_CODEC),
+  ):
+    row_bytes = len(context_data) + len(metadata_data)
+    decode_us = time_decode(context_data, metadata_data, codec, args.iterations)
+    logger.info("%-8s row=%6d bytes  decode=%7.1f us", name, row_bytes, decode_us)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,164 @@
+"""
+Concurrency benchmark for the image analysis cache.
+
+Compares the pooled WAL-mode ImageAnalysisCache against the previous access
+pattern (a fresh sqlite3 connection per operation, default journal, writes
+serialized behind a process-wide lock) under a mixed read/write workload,
+plus the hash-sharded layout (one SQLite file and writer lock per shard).
+
+Usage:
+    python benchmark_image_cache.py --threads 8 --ops 2000 --read-ratio 0.9 --shards 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.models.image_context import AnalysisMetadata, ImageContext  # noqa: E402
+from app.services.image_cache import AnalysisVariant, ImageAnalysisCache  # noqa: E402
+
+logger = logging.getLogger("benchmark_image_cache")
+
+
+class LegacyImageCache:
+  """Replica of the per-call-connection cache used as the baseline."""
+
+  def __init__(self, cache_dir: Path):
+    self.db_path = cache_dir / "image_analysis_cache.db"
+    self._lock = threading.Lock()
+    with sqlite3.connect(self.db_path) as conn:
+      conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+          image_hash TEXT PRIMARY KEY,
+          image_context JSON NOT NULL,
+          metadata JSON NOT NULL,
+          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+          accessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+          access_count INTEGER DEFAULT 1
+        )
+        """
+      )
+
+  def get(self, image_bytes: bytes, variant: AnalysisVariant):
+    image_hash = ImageAnalysisCache.compute_image_hash(image_bytes)
+    with sqlite3.connect(self.db_path) as conn:
+      row = conn.execute(
+        "SELECT image_context, metadata, created_at FROM analysis_cache WHERE image_hash = ?",
+        (image_hash,),
+      ).fetchone()
+    if not row:
+      return None
+    with self._lock:
+      with sqlite3.connect(self.db_path) as conn:
+        conn.execute(
+          "UPDATE analysis_cache SET accessed_at = CURRENT_TIMESTAMP, "
+          "access_count = access_count + 1 WHERE image_hash = ?",
+          (image_hash,),
+        )
+    return ImageContext(**json.loads(row[0])), AnalysisMetadata(**json.loads(row[1]))
+
+  def set(self, image_bytes: bytes, variant: AnalysisVariant, image_context: ImageContext, metadata: AnalysisMetadata):
+    image_hash = ImageAnalysisCache.compute_image_hash(image_bytes)
+    with self._lock:
+      with sqlite3.connect(self.db_path) as conn:
+        conn.execute(
+          "INSERT OR REPLACE INTO analysis_cache (image_hash, image_context, metadata) VALUES (?, ?, ?)",
+          (image_hash, image_context.model_dump_json(), metadata.model_dump_json()),
+        )
+    return True
+
+  def close(self):
+    pass
+
+
+def build_sample() -> tuple[ImageContext, AnalysisMetadata]:
+  description = "A detailed product shot on a marble table with soft window light. " * 20
+  context = ImageContext(
+    brief_caption="Product shot on marble",
+    detailed_description=description,
+    setting="interior",
+    mood="calm",
+    style="photorealistic",
+    composition="rule of thirds",
+    lighting="soft natural light",
+    generative_prompt=description,
+    adapted_prompts={mode: description for mode in ("campaign", "recycle", "intelligent", "basic")},
+  )
+  metadata = AnalysisMetadata(model_used="qwen3-vl:8b", processing_time_seconds=4.2)
+  return context, metadata
+
+
+def run_workload(cache, keys: list[bytes], threads: int, ops: int, read_ratio: float) -> float:
+  context, metadata = build_sample()
+  variant = AnalysisVariant()
+  for key in keys:
+    cache.set(key, variant, context, metadata)
+
+  def worker(seed: int) -> None:
+    rng = random.Random(seed)
+    for _ in range(ops // threads):
+      key = rng.choice(keys)
+      if rng.random() < read_ratio:
+        cache.get(key, variant)
+      else:
+        cache.set(key, variant, context, metadata)
+
+  started = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=threads) as pool:
+    list(pool.map(worker, range(threads)))
+  return time.perf_counter() - started
+
+
+def parse_args() -> argparse.Namespace:
+  parser = argparse.ArgumentParser(description="Benchmark ImageAnalysisCache under concurrency")
+  parser.add_argument("--threads", type=int, default=8, help="Concurrent worker threads (default: 8)")
+  parser.add_argument("--ops", type=int, default=2000, help="Total operations per run (default: 2000)")
+  parser.add_argument("--keys", type=int, default=200, help="Distinct cached images (default: 200)")
+  parser.add_argument("--read-ratio", type=float, default=0.9, help="Fraction of reads (default: 0.9)")
+  parser.add_argument("--shards", type=int, default=4, help="Shards for the sharded run (default: 4)")
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  logging.basicConfig(level=logging.WARNING, format="%(message)s")
+  logger.setLevel(logging.INFO)
+  keys = [os.urandom(256) for _ in range(args.keys)]
+
+  results = {}
+  contenders = (
+    ("legacy", LegacyImageCache),
+    ("pooled", partial(ImageAnalysisCache, shards=1)),
+    ("sharded", partial(ImageAnalysisCache, shards=args.shards)),
+  )
+  for name, factory in contenders:
+    with tempfile.TemporaryDirectory() as tmp:
+      cache = factory(Path(tmp))
+      try:
+        elapsed = run_workload(cache, keys, args.threads, args.ops, args.read_ratio)
+      finally:
+        cache.close()
+    results[name] = args.ops / elapsed
+    logger.info("%-8s %8.0f ops/s (%.2fs)", name, results[name], elapsed)
+
+  logger.info("Speedup: %.1fx pooled, %.1fx sharded", results["pooled"] / results["legacy"], results["sharded"] / results["legacy"])
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,129 @@
+"""
+Payload-size and latency benchmark for vision-model input preparation.
+
+For each image and model, compares sending the original upload (base64 in the
+JSON body) with the prepared one (draft decode, resize to the model's input
+size, JPEG re-encode, base64). Client-side timings cover everything up to the
+serialized request body. With --ollama, both payloads are also sent to the
+model (one output token) to time the server-side image processing.
+
+Usage:
+    python benchmark_vision_preprocess.py photos/*.jpg --model llava:latest --model qwen3-vl:8b
+    python benchmark_vision_preprocess.py --ollama --model llava:latest
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import io
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import requests
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.config import OLLAMA_CHAT_URL  # noqa: E402
+from app.services.image_preprocess import max_side_for_model, prepare_image  # noqa: E402
+
+logger = logging.getLogger("benchmark_vision_preprocess")
+
+
+def synthetic_images() -> dict[str, bytes]:
+  """A 12 MP camera-style JPEG and a large PNG screenshot."""
+  rng = np.random.default_rng(0)
+  y, x = np.mgrid[0:3000, 0:4000]
+  photo = np.stack([(x / 16) % 256, (y / 12) % 256, ((x + y) / 28) % 256], axis=-1)
+  photo = (photo + rng.normal(0, 4, photo.shape)).clip(0, 255).astype(np.uint8)
+  photo_jpeg = io.BytesIO()
+  Image.fromarray(photo).save(photo_jpeg, format="JPEG", quality=92)
+
+  screenshot = np.full((1600, 2560, 3), 245, dtype=np.uint8)
+  screenshot[100:1500:40, 200:2300] = 30
+  screenshot[:, 180:190] = (40, 90, 200)
+  screenshot_png = io.BytesIO()
+  Image.fromarray(screenshot).save(screenshot_png, format="PNG")
+  return {"photo-12mp.jpg": photo_jpeg.getvalue(), "screenshot-2560.png": screenshot_png.getvalue()}
+
+
+def request_body(model: str, image_bytes: bytes) -> bytes:
+  payload = {
+    "model": model,
+    "messages": [{
+      "role": "user",
+      "content": "Describe the image.",
+      "images": [base64.b64encode(image_bytes).decode("utf-8")],
+    }],
+    "stream": False,
+    "options": {"num_predict": 1},
+  }
+  return json.dumps(payload).encode("utf-8")
+
+
+def time_ollama(body: bytes) -> float:
+  started = time.perf_counter()
+  response = requests.post(OLLAMA_CHAT_URL, data=body, headers={"Content-Type": "application/json"}, timeout=600)
+  response.raise_for_status()
+  return time.perf_counter() - started
+
+
+def benchmark(name: str, image_bytes: bytes, model: str, repeat: int, ollama: bool):
+  max_side = max_side_for_model(model)
+
+  def original():
+    return request_body(model, image_bytes)
+
+  def prepared():
+    return request_body(model, prepare_image(image_bytes, max_side).data)
+
+  results = {}
+  for label, build in (("original", original), ("prepared", prepared)):
+    timings = []
+    for _ in range(repeat):
+      started = time.perf_counter()
+      body = build()
+      timings.append(time.perf_counter() - started)
+    results[label] = (body, min(timings))
+
+  prepared_image = prepare_image(image_bytes, max_side)
+  logger.info(
+    "%s -> %s (max side %d, sent %dx%d)", name, model, max_side, prepared_image.width, prepared_image.height
+  )
+  for label, (body, seconds) in results.items():
+    line = f"  {label:9s} body={len(body) / 1024:9.1f} KB  client={seconds * 1000:7.1f} ms"
+    if ollama:
+      time_ollama(body)  # warm the model so load time is not measured
+      line += f"  ollama={time_ollama(body) * 1000:8.1f} ms"
+    logger.info(line)
+  saved = 1 - len(results["prepared"][0]) / len(results["original"][0])
+  logger.info("  body size reduced by %.1f%%", saved * 100)
+
+
+def parse_args() -> argparse.Namespace:
+  parser = argparse.ArgumentParser(description="Benchmark vision-model image preparation")
+  parser.add_argument("images", nargs="*", type=Path, help="Images to test (default: synthetic photo and screenshot)")
+  parser.add_argument("--model", action="append", help="Target model, repeatable (default: llava:latest, qwen3-vl:8b)")
+  parser.add_argument("--repeat", type=int, default=5, help="Client-side runs per case, best is kept (default: 5)")
+  parser.add_argument("--ollama", action="store_true", help="Also time both payloads against Ollama")
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+  images = {path.name: path.read_bytes() for path in args.images} if args.images else synthetic_images()
+  for name, image_bytes in images.items():
+    for model in args.model or ["llava:latest", "qwen3-vl:8b"]:
+      benchmark(name, image_bytes, model, max(args.repeat, 1), args.ollama)
+
+
+if __name__ == "__main__":
+  main()
@@ -19,6 +19,7 @@ ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
 
 from app.services.image_cache import ImageAnalysisCache  # noqa: E402
+from app.services.transcription_cache import TranscriptionCache  # noqa: E402
 
 logger = logging.getLogger("cache_cleanup")
 
@@ -86,10 +87,20 @@ def main():
   image_cache = ImageAnalysisCache(cache_root)
   deleted_entries = image_cache.clear_expired()
   logger.info("Expired cache rows deleted: %s", deleted_entries)
+  evicted_entries = image_cache.evict()
+  logger.info(
+    "Rows evicted over size limits (%s): %s", image_cache.eviction_policy, evicted_entries
+  )
+
+  logger.info("Clearing expired entries from transcription cache ...")
+  transcription_cache = TranscriptionCache(cache_root)
+  deleted_transcriptions = transcription_cache.clear_expired()
+  logger.info("Expired transcription rows deleted: %s", deleted_transcriptions)
 
   if args.vacuum:
-    logger.info("Running VACUUM on %s ...", image_cache.db_path)
-    vacuum_sqlite(image_cache.db_path)
+    for db_path in (*image_cache.db_paths, transcription_cache.db_path):
+      logger.info("Running VACUUM on %s ...", db_path)
+      vacuum_sqlite(db_path)
 
   logger.info("Cache maintenance completed.")
 
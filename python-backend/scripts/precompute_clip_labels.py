@@ -0,0 +1,71 @@
+"""
+Precompute the label-bank text embeddings of the CLIP fallback.
+
+The image analyzer's last-resort fallback ranks an image against a bank of
+labels. Their text embeddings are computed once and stored as
+<cache-dir>/<model>.npz, so running this at deploy time (or after changing
+CLIP_FALLBACK_MODEL / CLIP_FALLBACK_LABELS_DIR) keeps that cost off the first
+request that needs the fallback. Re-running with an up-to-date bank only
+validates it.
+
+Usage:
+    python precompute_clip_labels.py
+    python precompute_clip_labels.py --labels-dir ./labels --device cuda
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.config import CLIP_FALLBACK_DEVICE, CLIP_FALLBACK_LABELS_DIR, CLIP_FALLBACK_MODEL  # noqa: E402
+from app.services.clip_fallback import ClipLabelFallback  # noqa: E402
+
+logger = logging.getLogger("precompute_clip_labels")
+
+
+def parse_args() -> argparse.Namespace:
+  parser = argparse.ArgumentParser(description="Precompute CLIP fallback label embeddings")
+  parser.add_argument(
+    "--cache-dir",
+    type=Path,
+    default=ROOT / "cache" / "clip_labels",
+    help="Where the label bank is stored (default: cache/clip_labels, as used by the image analyzer)",
+  )
+  parser.add_argument("--model", default=CLIP_FALLBACK_MODEL, help="Hugging Face CLIP checkpoint")
+  parser.add_argument("--device", default=CLIP_FALLBACK_DEVICE, help="torch device (cpu, cuda)")
+  parser.add_argument(
+    "--labels-dir", default=CLIP_FALLBACK_LABELS_DIR, help="Directory of <category>.txt label lists"
+  )
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+  fallback = ClipLabelFallback(
+    args.cache_dir, model_name=args.model, device=args.device, idle_seconds=0, labels_dir=args.labels_dir
+  )
+  if not fallback.available:
+    logger.error("torch and transformers are required")
+    sys.exit(1)
+
+  started = time.perf_counter()
+  counts = fallback.precompute()
+  stats = fallback.get_stats()
+  for category, count in counts.items():
+    logger.info("  %-10s %d labels", category, count)
+  logger.info(
+    "Label bank %s (%s) ready in %.1fs", stats["label_bank"], stats["label_bank_source"], time.perf_counter() - started
+  )
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,288 @@
+"""
+Offline cache warming for the image analysis cache.
+
+Walks a directory of images, skips those that already have a fresh
+analysis for the requested variant, analyzes the rest against Ollama with
+bounded concurrency and stores the results in batched transactions.
+
+Finished batches are committed as the run progresses (and the pending batch
+is flushed on Ctrl+C), so re-running the same command resumes where the
+previous run stopped.
+
+With --embed, every image (cached or not) that is missing from the CLIP
+embedding index is embedded too, so /api/images/similar can find it.
+
+Usage:
+    python warm_image_cache.py ./assets --language es --concurrency 2 --batch-size 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import mimetypes
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.config import IMAGE_CACHE_FALLBACK_TTL_SECONDS  # noqa: E402
+from app.services.image_analyzer import ImageAnalyzer  # noqa: E402
+from app.services.image_cache import AnalysisVariant, ImageAnalysisCache  # noqa: E402
+from app.services.image_embeddings import ImageEmbeddingService  # noqa: E402
+
+logger = logging.getLogger("warm_image_cache")
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+
+
+def collect_pending(
+  image_dir: Path, cache: ImageAnalysisCache, variant: AnalysisVariant
+) -> tuple[list[Path], int, int]:
+  """
+  Return images still to analyze, plus counts of cached and duplicate files.
+
+  Files are deduplicated by content hash so identical copies are analyzed once.
+  """
+  cached_hashes = cache.cached_image_hashes(variant)
+  seen: set[str] = set()
+  pending: list[Path] = []
+  cached = duplicates = 0
+
+  for path in image_files(image_dir):
+    image_hash = ImageAnalysisCache.compute_image_hash(path.read_bytes())
+    if image_hash in cached_hashes:
+      cached += 1
+    elif image_hash in seen:
+      duplicates += 1
+    else:
+      seen.add(image_hash)
+      pending.append(path)
+
+  return pending, cached, duplicates
+
+
+async def analyze_file(analyzer: ImageAnalyzer, path: Path, variant: AnalysisVariant):
+  image_bytes = path.read_bytes()
+  content_type = mimetypes.guess_type(path.name)[0] or "image/jpeg"
+  result = await analyzer.analyze_image(
+    image_bytes=image_bytes,
+    content_type=content_type,
+    user_prompt=variant.user_prompt,
+    deep_thinking=variant.deep_thinking,
+    language=variant.language,
+  )
+  return image_bytes, result
+
+
+def image_files(image_dir: Path) -> list[Path]:
+  return [
+    path for path in sorted(image_dir.rglob("*"))
+    if path.is_file() and path.suffix.lower() in IMAGE_SUFFIXES
+  ]
+
+
+def embed_missing(service: ImageEmbeddingService, paths: list[Path], batch_size: int) -> int:
+  """Embed the images not yet in the index; returns how many were added."""
+  batch: list[tuple[str, bytes]] = []
+  queued: set[str] = set()
+  added = 0
+  for path in paths:
+    image_bytes = path.read_bytes()
+    image_hash = ImageAnalysisCache.compute_image_hash(image_bytes)
+    if image_hash in service.index or image_hash in queued:
+      continue
+    queued.add(image_hash)
+    batch.append((image_hash, image_bytes))
+    if len(batch) >= batch_size:
+      added += service.index_many(batch)
+      batch = []
+      logger.info("Embedded %d images", added)
+  added += service.index_many(batch)
+  return added
+
+
+def log_progress(done: int, failed: int, total: int, started: float):
+  elapsed = time.perf_counter() - started
+  rate = done / elapsed if elapsed > 0 else 0.0
+  remaining = (total - done) / rate if rate > 0 else float("inf")
+  logger.info(
+    "[%d/%d] %.2f images/s, %d failed, elapsed %.0fs, ETA %s",
+    done,
+    total,
+    rate,
+    failed,
+    elapsed,
+    f"{remaining:.0f}s" if remaining != float("inf") else "n/a",
+  )
+
+
+async def warm(
+  analyzer: ImageAnalyzer,
+  cache: ImageAnalysisCache,
+  paths: list[Path],
+  variant: AnalysisVariant,
+  concurrency: int,
+  batch_size: int,
+  progress_every: int,
+) -> tuple[int, int]:
+  """Analyze paths and store the results; returns (stored, failed)."""
+  batch = []
+  stored = failed = done = 0
+  started = time.perf_counter()
+
+  def flush():
+    nonlocal stored, batch
+    if batch:
+      stored += cache.set_many(batch)
+      batch = []
+
+  queue = iter(paths)
+  in_flight = {}
+  try:
+    while True:
+      # Keep at most `concurrency` analyses in flight so files are read lazily;
+      # they share one pooled connection set to Ollama
+      while len(in_flight) < concurrency:
+        path = next(queue, None)
+        if path is None:
+          break
+        in_flight[asyncio.ensure_future(analyze_file(analyzer, path, variant))] = path
+      if not in_flight:
+        break
+
+      finished, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+      for task in finished:
+        path = in_flight.pop(task)
+        done += 1
+        try:
+          image_bytes, result = task.result()
+        except Exception as e:
+          result, error = None, str(e)
+        else:
+          error = result.error
+        if result is None or not result.success:
+          failed += 1
+          logger.warning("Failed to analyze %s: %s", path, error)
+        elif result.metadata.model_fallback_used:
+          # Fallback-model results get the shorter TTL, so they bypass the batch
+          stored += cache.set(
+            image_bytes,
+            variant,
+            result.image_context,
+            result.metadata,
+            ttl_seconds=IMAGE_CACHE_FALLBACK_TTL_SECONDS,
+          )
+        else:
+          batch.append((image_bytes, variant, result.image_context, result.metadata))
+
+        if len(batch) >= batch_size:
+          flush()
+        if done % progress_every == 0 or done == len(paths):
+          log_progress(done, failed, len(paths), started)
+  except asyncio.CancelledError:
+    # Ctrl+C cancels this task; drop unfinished analyses and keep the finished ones
+    logger.warning("Interrupted; saving finished results ...")
+    for task in in_flight:
+      task.cancel()
+    raise
+  finally:
+    flush()
+
+  return stored, failed
+
+
+def parse_args() -> argparse.Namespace:
+  parser = argparse.ArgumentParser(description="Pre-fill the image analysis cache from a directory")
+  parser.add_argument("image_dir", type=Path, help="Directory scanned recursively for images")
+  parser.add_argument("--language", default="es", help="Output language code (default: es)")
+  parser.add_argument("--deep-thinking", action="store_true", help="Warm the deep-thinking variant")
+  parser.add_argument("--user-prompt", default=None, help="User prompt the analyses are produced with")
+  parser.add_argument("--vision-model", default=None, help="Ollama vision model (default: analyzer default)")
+  parser.add_argument("--concurrency", type=int, default=2, help="Concurrent Ollama requests (default: 2)")
+  parser.add_argument("--batch-size", type=int, default=20, help="Results per write transaction (default: 20)")
+  parser.add_argument("--progress-every", type=int, default=10, help="Log progress every N images (default: 10)")
+  parser.add_argument("--embed", action="store_true", help="Also fill the CLIP embedding index for similarity search")
+  parser.add_argument("--dry-run", action="store_true", help="Only report how many images would be analyzed")
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  logging.basicConfig(level=logging.WARNING, format="%(message)s")
+  logger.setLevel(logging.INFO)
+
+  if not args.image_dir.is_dir():
+    logger.error("Not a directory: %s", args.image_dir)
+    sys.exit(1)
+
+  variant = AnalysisVariant(
+    language=args.language,
+    deep_thinking=args.deep_thinking,
+    user_prompt=args.user_prompt.strip() if args.user_prompt else None,
+  )
+  cache = ImageAnalysisCache(ROOT / "cache")
+  try:
+    pending, cached, duplicates = collect_pending(args.image_dir, cache, variant)
+    logger.info(
+      "%d images to analyze (%d already cached, %d duplicate files skipped)",
+      len(pending),
+      cached,
+      duplicates,
+    )
+    if args.dry_run:
+      return
+    if not pending:
+      embed_library(args)
+      return
+
+    # The analyzer runs uncached; results are written here in batches instead
+    analyzer_kwargs = {"enable_cache": False}
+    if args.vision_model:
+      analyzer_kwargs["vision_model"] = args.vision_model
+    analyzer = ImageAnalyzer(**analyzer_kwargs)
+
+    started = time.perf_counter()
+    try:
+      stored, failed = asyncio.run(warm(
+        analyzer,
+        cache,
+        pending,
+        variant,
+        concurrency=max(args.concurrency, 1),
+        batch_size=max(args.batch_size, 1),
+        progress_every=max(args.progress_every, 1),
+      ))
+    except KeyboardInterrupt:
+      logger.warning("Stopped early; re-run the same command to resume.")
+      sys.exit(130)
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+      "Stored %d analyses, %d failed, in %.1fs (%.2f images/s)",
+      stored,
+      failed,
+      elapsed,
+      (stored + failed) / elapsed if elapsed > 0 else 0.0,
+    )
+    embed_library(args)
+  finally:
+    cache.close()
+
+
+def embed_library(args: argparse.Namespace):
+  if not args.embed:
+    return
+  service = ImageEmbeddingService(ROOT / "cache")
+  try:
+    added = embed_missing(service, image_files(args.image_dir), max(args.batch_size, 1))
+    logger.info("Embedding index: %d new, %d total", added, len(service.index))
+  finally:
+    service.close()
+
+
+if __name__ == "__main__":
+  main()
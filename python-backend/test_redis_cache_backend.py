@@ -0,0 +1,58 @@
+"""
+Pruebas del backend Redis de la caché de análisis contra un servidor en proceso
+(fakeredis[lua]); se omiten si no está instalado.
+
+    pip install "fakeredis[lua]" pytest
+    python -m pytest test_redis_cache_backend.py
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from app.services.cache_backend import StoredAnalysis  # noqa: E402
+from app.services.redis_cache_backend import RedisCacheBackend  # noqa: E402
+
+
+def _entry(cache_key: str = "abc:es:fast") -> StoredAnalysis:
+    expires_at = (datetime.utcnow() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+    return StoredAnalysis(
+        cache_key=cache_key,
+        image_hash=cache_key.split(":", 1)[0],
+        variant_key=cache_key.split(":", 1)[1],
+        image_context=b"{}",
+        metadata=b"{}",
+        codec=0,
+        expires_at=expires_at,
+    )
+
+
+@pytest.fixture
+def backend():
+    return RedisCacheBackend(fakeredis.FakeRedis(), ttl_seconds=3600, stale_seconds=600)
+
+
+def test_record_access_updates_live_entry_and_keeps_ttl(backend):
+    backend.set_many([_entry()])
+    key = backend._entry_key("abc:es:fast")
+    ttl_before = backend._client.ttl(key)
+
+    backend.record_access([("2030-01-01 00:00:00", 3, "abc:es:fast")])
+
+    assert int(backend._client.hget(key, "access_count")) == 4
+    assert backend._client.hget(key, "accessed_at") == b"2030-01-01 00:00:00"
+    assert 0 < backend._client.ttl(key) <= ttl_before
+
+
+def test_record_access_never_recreates_expired_entry(backend):
+    backend.set_many([_entry()])
+    backend._client.delete(backend._entry_key("abc:es:fast"))  # expired meanwhile
+
+    backend.record_access([("2030-01-01 00:00:00", 1, "abc:es:fast")])
+
+    assert not backend._client.exists(backend._entry_key("abc:es:fast"))
+    assert backend.get_many(["abc:es:fast"]) == {}
+    assert backend.image_hashes("es:fast", "2000-01-01 00:00:00") == set()